@@ -1,25 +1,143 @@
-import gradio as gr
+from __future__ import annotations
+
+from utils.startup import lazy_import, run_in_background, startup_profile
+
 import os
+import re
+import json
+import hashlib
 import subprocess
 import uuid
 import shutil
 import argparse
-from typing import List, Optional
-from services.f5tts_service import F5TTSService
-from services.wav2lip_service import Wav2LipService
+import threading
+import functools
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+import numpy as np
+from services.engines import LIPSYNC_ENGINES, TTS_ENGINES, create_lipsync_engine, create_tts_engine
 from pathlib import Path
-from utils.text_to_audio import generate_audio_for_text_chunks  # Import the utility function
-from utils.video_processor import preprocess_video_for_audio
+from utils.audio_conditioning import condition_audio, load_lipsync_audio
+from utils.audio_features import cached_mel_windows
+from utils.face_crop import FACE_CROP, OUTPUT_TIERS, face_region, output_size
+from utils.hls import HlsPlaylist
+from utils.job_manifest import JobManifest, is_retryable
+from utils.job_store import JobStore
+from utils.job_queue import JobQueue, open_queue, wait_for_job
+from utils.long_form import segment_script
+from utils.media_info import probe_media
+from utils.memory_profile import JobMemoryProfile, memory_profiling_enabled
+from utils.process_runner import CancelToken, ProcessCancelled
+from utils.profiling import JobProfiler, profiling_enabled
+from utils.shared_buffers import job_buffers, sweep_stale_arenas
+from utils.silence import SKIP_SILENCE, cut_audio, cut_speech, merge_speech, silent_frames, speech_spans
+from utils.still_image import StillFrameSource, avatar_fps, avatar_size, is_still_image
+from utils.video_processor import concat_videos, mux_audio, required_frame_count
+from utils.warmup import run_warmup
+
+# gradio is only needed once the UI is built
+gr = lazy_import("gradio")
+
+startup_profile.mark("imports")
+
+def tracked_job(method):
+    """
+    Record every call of a TalkingAvatarService job method in the durable job
+    store (inputs, settings, outcome), so interrupted jobs can be resumed.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = bound.arguments
+        arguments["job_id"] = arguments.get("job_id") or str(uuid.uuid4())
+        job_id = arguments["job_id"]
+
+        # Gradio file objects are recorded by path; callbacks and tokens are not recorded
+        recorded = {}
+        for name, value in arguments.items():
+            if name in ("self", "job_id") or name in _UNRECORDED_ARGUMENTS:
+                continue
+            if isinstance(value, list):
+                value = [getattr(v, 'name', v) for v in value]
+            recorded[name] = getattr(value, 'name', value)
+        inputs = {k: v for k, v in recorded.items() if k in _INPUT_ARGUMENTS}
+        settings = {
+            "arguments": {k: v for k, v in recorded.items() if k not in _INPUT_ARGUMENTS},
+            "lipsync": self._lipsync_settings(
+                arguments.get("quality"), arguments.get("draft", False), arguments.get("resolution")
+            ),
+        }
+
+        self.job_store.start_job(job_id, method.__name__, inputs, settings)
+        try:
+            result = method(*bound.args, **bound.kwargs)
+        except ProcessCancelled as e:
+            self.job_store.finish_job(job_id, "cancelled", error=str(e))
+            raise
+        except Exception as e:
+            self.job_store.finish_job(job_id, "failed", error=str(e))
+            raise
+        self.job_store.finish_job(job_id, "done", result=result)
+        return result
+
+    return wrapper
+
+# Arguments of job methods that are the job's inputs, and ones that are not recorded
+_INPUT_ARGUMENTS = ("text", "avatar_image", "avatar_images")
+_UNRECORDED_ARGUMENTS = ("progress_callback", "cancel_token", "on_segment")
 
 class TalkingAvatarService:
-    def __init__(self):
+    # Lip-sync settings used for real requests (and mirrored by the warm-up)
+    LIPSYNC_DEFAULTS = dict(
+        quality="Enhanced",  # Use faster processing to reduce potential face detection issues
+        wav2lip_version="Wav2Lip",  # Use standard Wav2Lip instead of GAN version
+        nosmooth=True,  # Keep nosmooth for better frame-by-frame sync
+        pad_up=10,      # Add some padding to help with face detection
+        pad_down=10,
+        pad_left=10,
+        pad_right=10,
+        resolution="Full",   # Output resolution tier (see OUTPUT_TIERS)
+        face_crop=FACE_CROP  # Lip-sync the face crop only and paste it back
+    )
+
+    # Draft renders: fewer flow-matching steps, half-height output, no enhancer.
+    # A final render of the same job id upgrades it, re-running only what changed
+    DRAFT_NFE_STEP = int(os.environ.get("ABICO_DRAFT_NFE_STEP", 16))
+    DRAFT_LIPSYNC = dict(quality="Fast", resolution="Half")
+
+    # Stage order of a job; each stage is checkpointed in the job manifest
+    STAGES = ("tts", "condition", "mel", "preprocess", "lipsync", "mux")
+
+    def __init__(
+        self,
+        defer_checks: bool = False,
+        warmup_avatar: Optional[str] = None,
+        artifact_dir: Optional[str] = None,
+        stand_in: bool = False,
+        tts_engine: Optional[str] = None,
+        lipsync_engine: Optional[str] = None
+    ):
+        # Job artifacts (checkpoints, mel cache, outputs) go to temp/ unless a shared
+        # artifact directory is given; it must be mounted at the same path on every
+        # worker, since manifests record absolute paths
+        self.artifact_dir = Path(artifact_dir).absolute() if artifact_dir else Path("temp")
+
         # Initialize output directory first
-        self.output_dir = Path("temp/output")
+        self.output_dir = self.artifact_dir / "output"
         self.output_dir.mkdir(exist_ok=True, parents=True)
         
-        # Then initialize the models
-        self.tts_model = F5TTSService()
-        self.wav2lip_model = Wav2LipService()
+        # Then initialize the models; engines are picked by name (or ABICO_TTS_ENGINE /
+        # ABICO_LIPSYNC_ENGINE), and stand_in selects the model-free fakes for both
+        if stand_in:
+            tts_engine, lipsync_engine = "fake", "fake"
+        self.tts_model = create_tts_engine(tts_engine)
+        self.wav2lip_model = create_lipsync_engine(lipsync_engine)
+        print(f"Engines: TTS {type(self.tts_model).__name__}, lip-sync {type(self.wav2lip_model).__name__}")
         
         # Create fixed temp directory
         self.temp_dir = Path("temp")
@@ -30,21 +148,133 @@ class TalkingAvatarService:
         self.audio_dir.mkdir(exist_ok=True, parents=True)
         self.audio_path = self.audio_dir / "generated_audio.wav"
         
-        # Verify F5TTS installation
+        # Per-job directories holding the stage manifest and intermediate files
+        self.jobs_dir = self.artifact_dir / "jobs"
+        self.jobs_dir.mkdir(exist_ok=True, parents=True)
+        self.mel_cache_dir = self.artifact_dir / "cache" / "mel"
+
+        # Durable record of every job (survives restarts; see recover_unfinished_jobs)
+        self.job_store = JobStore(self.artifact_dir / "jobs.db")
+        # Arenas of jobs that are still marked running are kept: they are resumed
+        sweep_stale_arenas(job["job_id"] for job in self.job_store.unfinished())
+        
+        # Readiness is signalled once self-checks (and the optional warm-up) are done
+        self.ready = threading.Event()
+        self.ready_marker = self.temp_dir / "READY"
+        self.ready_marker.unlink(missing_ok=True)
+        self.warmup_avatar = warmup_avatar
+        self._startup_error: Optional[Exception] = None
+        self._startup_thread: Optional[threading.Thread] = None
+        self._startup_lock = threading.Lock()
+        
+        # Installation self-checks spawn the F5TTS CLI (which imports torch) and
+        # ffmpeg; in fast-startup mode they run in the background instead
+        if not defer_checks:
+            self._startup()
+            if self._startup_error is not None:
+                raise self._startup_error
+
+    def recover_unfinished_jobs(self) -> List[str]:
+        """
+        Resume jobs that were still running when the process stopped.
+
+        Each job is re-run with its recorded inputs and settings under the same
+        job id, so it picks up from its last stage checkpoint. Jobs run one at a
+        time; their results are available through the job store.
+        """
+        recovered = []
+        for job in self.job_store.unfinished():
+            job_id = job["job_id"]
+            inputs = job["inputs"] or {}
+            avatars = inputs.get("avatar_images") or [inputs.get("avatar_image")]
+            missing = [a for a in avatars if not a or not Path(a).exists()]
+            if missing:
+                print(f"Cannot recover job {job_id}: input no longer available ({missing[0]})")
+                self.job_store.finish_job(job_id, "failed", error="Input no longer available after restart")
+                continue
+
+            print(f"\nRecovering job {job_id} (last stage: {job['stage'] or 'none'})")
+            try:
+                getattr(self, job["kind"])(**inputs, **job["settings"]["arguments"], job_id=job_id)
+                recovered.append(job_id)
+            except Exception as e:
+                print(f"Recovery of job {job_id} failed: {str(e)}")
+        return recovered
+
+    def start_background_startup(self):
+        """Run the deferred self-checks and warm-up on a background thread (once)"""
+        with self._startup_lock:
+            if self._startup_thread is None and not self.ready.is_set():
+                self._startup_thread = run_in_background(self._startup, name="startup")
+
+    def _startup(self):
+        try:
+            self._run_checks()
+            if self.warmup_avatar:
+                self._warm_up()
+        except Exception as e:
+            self._startup_error = e
+        finally:
+            startup_profile.mark("ready")
+            if self._startup_error is None:
+                self.ready_marker.touch()
+                print("Service ready")
+            self.ready.set()
+
+    def _run_checks(self):
+        """Verify the F5TTS and ffmpeg installations"""
+        self.wav2lip_model.verify_installation()
         if not self.tts_model.verify_installation():
             print("F5TTS verification failed. Please check your installation.")
             raise RuntimeError("F5TTS is not properly installed or accessible")
+        startup_profile.mark("install_checks")
+
+    def _warm_up(self):
+        """Push a short sentence and a few avatar frames through both models"""
+        try:
+            timings = run_warmup(self, self.warmup_avatar)
+            print(f"Warm-up finished: {timings}")
+        except Exception as e:
+            print(f"Warning: warm-up failed, first request may be slow: {e}")
+        startup_profile.mark("warmup")
 
+    def ensure_ready(self):
+        """Wait for self-checks and warm-up, and raise if the checks failed"""
+        self.start_background_startup()
+        self.ready.wait()
+        if self._startup_error is not None:
+            raise self._startup_error
+
+    @tracked_job
     def generate_talking_avatar(
         self, 
         text: str, 
         avatar_image, 
-        progress_callback: Optional[gr.Progress] = None
+        progress_callback: Optional[gr.Progress] = None,
+        cancel_token: Optional[CancelToken] = None,
+        job_id: Optional[str] = None,
+        profile: bool = False,
+        speed: float = 1.0,
+        retime: bool = False,
+        draft: bool = False,
+        quality: Optional[str] = None,
+        resolution: Optional[str] = None
     ) -> str:
         """
-        Comprehensive method to generate a talking avatar
+        Comprehensive method to generate a talking avatar.
+
+        `speed` is the speech tempo; with `retime` it is applied by
+        time-stretching cached natural-speed sentences instead of re-synthesizing.
+        A `draft` render is fast and rough; rendering the same job_id again
+        without `draft` upgrades it to the final `quality` and `resolution`
+        (a tier of OUTPUT_TIERS).
+
+        Every stage is checkpointed in a per-job manifest, so a retry resumes
+        from the stage that failed; fatal errors are not retried.
         """
         try:
+            self.ensure_ready()
+
             print("\nProcessing talking avatar request:")
             print(f"Text: {text}")
             print(f"Avatar Input: {avatar_image}")
@@ -53,172 +283,798 @@ class TalkingAvatarService:
             if hasattr(avatar_image, 'name'):
                 avatar_image = avatar_image.name
 
-            # Step 1: Generate audio using F5TTS
-            if progress_callback is not None:
-                progress_callback(0.3, desc="Generating audio...")
-            
-            audio_path = self._generate_audio(
+            job_id = job_id or str(uuid.uuid4())
+            manifest = JobManifest(self.jobs_dir / job_id, job_id, store=self.job_store)
+
+            video = self._run_with_retries(
+                manifest=manifest,
                 text=text,
-                speed=1.0
+                avatar_path=avatar_image,
+                progress_callback=progress_callback,
+                cancel_token=cancel_token,
+                profile=profile,
+                speed=speed,
+                retime=retime,
+                draft=draft,
+                quality=quality,
+                resolution=resolution
             )
             
-            if not audio_path:
-                raise Exception("Audio generation failed")
-
-            # Step 2: Generate talking avatar using Wav2Lip
+            print(f"Video generated successfully: {video}")
             if progress_callback is not None:
-                progress_callback(0.6, desc="Synchronizing lips...")
-                
-            # Add retry logic for Wav2Lip
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    video = self._synchronize_lips(
-                        avatar_path=avatar_image,
-                        audio_path=audio_path,
-                        job_id=str(uuid.uuid4()),
-                        quality="Enhanced",  # Use faster processing to reduce potential face detection issues
-                        wav2lip_version="Wav2Lip",  # Use standard Wav2Lip instead of GAN version
-                        nosmooth=True,  # Keep nosmooth for better frame-by-frame sync
-                        pad_up=10,      # Add some padding to help with face detection
-                        pad_down=10,
-                        pad_left=10,
-                        pad_right=10
-                    )
-                    
-                    if video:
-                        print(f"Video generated successfully: {video}")
-                        if progress_callback is not None:
-                            progress_callback(1.0, desc="Processing complete!")
-                        return video
-                    
-                except Exception as e:
-                    print(f"Attempt {attempt + 1} failed: {str(e)}")
-                    if attempt < max_retries - 1:
-                        print("Retrying...")
-                        continue
-                    else:
-                        raise Exception(f"Failed after {max_retries} attempts")
-
-            raise Exception("Failed to generate video")
+                progress_callback(1.0, desc="Processing complete!")
+            return video
 
         except Exception as e:
             error_msg = f"Error in processing: {str(e)}"
             print(error_msg)
             raise
+
+    def _run_with_retries(
+        self,
+        manifest: JobManifest,
+        max_retries: int = 3,
+        profile: bool = False,
+        **kwargs
+    ) -> str:
+        """Run a job, resuming from the first incomplete stage on retryable errors"""
+        # Opt-in instrumentation, attached as stage observers (nothing runs when off)
+        memory = JobMemoryProfile(manifest.job_id) if memory_profiling_enabled() else None
+        profiler = JobProfiler(manifest.job_id, manifest.job_dir / "profile") if profiling_enabled(profile) else None
+        observers = [o for o in (memory, profiler) if o is not None]
+        manifest.observers.extend(observers)
+        try:
+            # Arrays handed between processes live in this job's shared-memory arena
+            with job_buffers(manifest.job_id):
+                return self._run_attempts(manifest, max_retries, **kwargs)
+        finally:
+            for observer in observers:
+                manifest.observers.remove(observer)
+            if memory is not None:
+                memory.finish(output_dir=manifest.job_dir)
+            if profiler is not None:
+                # Scenes and fan-out avatars have no job row: keyed under their parent job
+                name = f"profile/{manifest.label}" if manifest.label else "profile"
+                self.job_store.attach_artifacts(manifest.store_job_id, {name: profiler.finish()})
+
+    def _run_attempts(self, manifest: JobManifest, max_retries: int, **kwargs) -> str:
+        for attempt in range(max_retries):
+            try:
+                return self._run_job(manifest=manifest, **kwargs)
+                
+            except Exception as e:
+                if not is_retryable(e):
+                    # Deterministic failures (no face, bad input, cancelled) fail fast
+                    print(f"Attempt {attempt + 1} failed with a fatal error: {str(e)}")
+                    raise
+                print(f"Attempt {attempt + 1} failed: {str(e)}")
+                if attempt < max_retries - 1:
+                    stage = manifest.first_incomplete_stage(self.STAGES)
+                    print(f"Retrying from stage '{stage}'...")
+                    continue
+                else:
+                    raise Exception(f"Failed after {max_retries} attempts: {str(e)}") from e
+
+        raise Exception("Failed to generate video")
+
+    def _run_job(
+        self,
+        manifest: JobManifest,
+        text: str,
+        avatar_path: str,
+        progress_callback=None,
+        cancel_token: Optional[CancelToken] = None,
+        loop_start: Optional[int] = None,
+        speed: float = 1.0,
+        retime: bool = False,
+        draft: bool = False,
+        quality: Optional[str] = None,
+        resolution: Optional[str] = None,
+        uniform_encoding: bool = False
+    ) -> str:
+        """
+        Run (or resume) the stages of one job, in STAGES order. With
+        `uniform_encoding` the output is always encoded by this pipeline
+        (long-form scenes are joined with a stream copy, so they must match).
+        """
+        job_dir = manifest.job_dir.absolute()
+
+        # Inputs and settings the checkpoints depend on: a draft upgraded to a final
+        # render re-runs the audio and lip-sync stages; edited text or a different
+        # avatar re-runs the stages that use them
+        lipsync_settings = self._lipsync_settings(quality, draft, resolution)
+        audio_key = self._audio_key(text, speed, retime, draft)
+        avatar_key = self._avatar_key(avatar_path)
+        video_key = f"{audio_key} {avatar_key} {json.dumps(lipsync_settings, sort_keys=True)}"
+
+        # The intermediate lip-sync video is deleted once the job succeeds, so an
+        # identical re-run must stop at the final video instead of resuming there
+        if manifest.is_done("mux", video_key):
+            print(f"Job {manifest.job_id}: reusing the finished video")
+            return manifest.outputs("mux")["video_path"]
+
+        # Step 1: Generate audio using F5TTS
+        if progress_callback is not None:
+            progress_callback(0.3, desc="Generating audio...")
+        tts = manifest.run_stage("tts", lambda: {
+            "audio_path": self._generate_audio(
+                text=text,
+                speed=speed,
+                retime=retime,
+                nfe_step=self.DRAFT_NFE_STEP if draft else None,
+                output_dir=job_dir,
+                cancel_token=cancel_token,
+                progress_callback=self._stage_progress(progress_callback, 0.3, 0.5, "Generating audio")
+            )
+        }, key=audio_key)
+
+        # Step 2: Condition audio - one in-memory polyphase resample to the lip-sync
+        # rate; the TTS-rate original is kept for the final mux
+        conditioned_audio = {}
+        def condition_stage():
+            wav, sample_rate = self.tts_model.get_waveform(tts["audio_path"])
+            conditioned_audio["audio"] = condition_audio(wav, sample_rate)
+            return {"lipsync_audio_path": conditioned_audio["audio"].save_lipsync(job_dir / "audio_16k.wav")}
+        conditioned = manifest.run_stage("condition", condition_stage, key=audio_key)
+
+        # Step 3: Frame-aligned mel windows, computed once per (audio, fps) and cached;
+        # skipped for lip-sync engines that compute their own
+        def mel_stage():
+            if not self.wav2lip_model.uses_mel_windows:
+                return {"mel_path": None}
+            if "audio" in conditioned_audio:
+                audio = conditioned_audio["audio"]
+                wav, sample_rate = audio.lipsync_wav, audio.lipsync_rate
+            else:
+                wav, sample_rate = load_lipsync_audio(conditioned["lipsync_audio_path"])
+            return {"mel_path": self._compute_mel(wav, sample_rate, avatar_path)}
+        features = manifest.run_stage("mel", mel_stage, key=f"{audio_key} {avatar_key}")
+
+        # Step 4: Plan the avatar loop that covers the audio
+        if progress_callback is not None:
+            progress_callback(0.5, desc="Preparing avatar...")
+        preprocess = manifest.run_stage("preprocess", lambda: self._preprocess_avatar(
+            avatar_path=avatar_path,
+            audio_path=tts["audio_path"],
+            start_frame=loop_start
+        ), key=f"{avatar_key} loop_frames={required_frame_count(avatar_path, tts['audio_path'])} start={loop_start}")
+
+        # Step 5: Generate talking avatar using Wav2Lip on the 16 kHz audio
+        if progress_callback is not None:
+            progress_callback(0.6, desc="Synchronizing lips...")
+        lipsync = manifest.run_stage("lipsync", lambda: {
+            "video_path": self._run_face_lipsync(
+                video_path=preprocess["video_path"],
+                audio_path=conditioned["lipsync_audio_path"],
+                output_path=job_dir / "lipsync.mp4",
+                frame_count=preprocess["frame_count"],
+                start_frame=preprocess["start_frame"],
+                mel_windows=np.load(features["mel_path"], mmap_mode="r") if features["mel_path"] else None,
+                face_box=preprocess.get("face_box"),
+                cancel_token=cancel_token,
+                progress_callback=self._stage_progress(progress_callback, 0.6, 0.98, "Synchronizing lips"),
+                uniform_encoding=uniform_encoding,
+                **lipsync_settings
+            )
+        }, key=video_key)
+
+        # Step 6: Mux the full-rate TTS audio back onto the lip-synced video
+        final = manifest.run_stage("mux", lambda: {
+            "video_path": mux_audio(
+                video_path=lipsync["video_path"],
+                audio_path=tts["audio_path"],
+                output_path=str(self._output_path(manifest.job_id, draft))
+            )
+        }, key=video_key)
+
+        # The lip-synced video is only needed until the job succeeds
+        Path(lipsync["video_path"]).unlink(missing_ok=True)
+        return final["video_path"]
     
+    @tracked_job
+    def generate_long_form(
+        self,
+        text: str,
+        avatar_image,
+        target_scene_seconds: float = 30.0,
+        max_workers: int = 2,
+        progress_callback: Optional[gr.Progress] = None,
+        cancel_token: Optional[CancelToken] = None,
+        job_id: Optional[str] = None,
+        progressive: bool = False,
+        on_segment: Optional[Callable[[str, int], None]] = None,
+        profile: bool = False,
+        speed: float = 1.0,
+        retime: bool = False,
+        draft: bool = False,
+        quality: Optional[str] = None,
+        resolution: Optional[str] = None
+    ) -> str:
+        """
+        Render a long script as independent scenes and stitch them together.
+
+        The script is split at paragraph/sentence boundaries into scenes of about
+        `target_scene_seconds`. Each scene is its own checkpointed job, so a failed
+        scene is retried (or the whole call re-run with the same job_id) without
+        redoing finished scenes. Audio for all scenes is synthesized first so the
+        avatar loop phase can continue seamlessly from scene to scene; the scenes
+        are then rendered in parallel and joined with a stream-copy concat.
+
+        With `progressive`, every finished scene is also published to an HLS
+        playlist (output_dir/<job_id>/index.m3u8) in scene order, so playback can
+        start after the first scene; `on_segment(playlist_path, published_count)`
+        is called each time the playlist grows.
+        """
+        self.ensure_ready()
+
+        if hasattr(avatar_image, 'name'):
+            avatar_image = avatar_image.name
+
+        job_id = job_id or str(uuid.uuid4())
+        scenes = segment_script(text, target_seconds=target_scene_seconds)
+        if not scenes:
+            raise ValueError("No text to render")
+        print(f"\nLong-form job {job_id}: {len(scenes)} scenes")
+
+        manifests = [
+            JobManifest(
+                self.jobs_dir / job_id / f"scene_{i:03d}", f"{job_id}_scene_{i:03d}",
+                store=self.job_store, parent_job_id=job_id, label=f"scene_{i:03d}"
+            )
+            for i in range(len(scenes))
+        ]
+
+        # Phase 1: synthesize every scene's audio (in parallel) to learn its length
+        if progress_callback is not None:
+            progress_callback(0.1, desc=f"Generating audio for {len(scenes)} scenes...")
+
+        def synthesize(index: int) -> str:
+            manifest = manifests[index]
+            with job_buffers(manifest.job_id):
+                return manifest.run_stage("tts", lambda: {
+                    "audio_path": self._generate_audio(
+                        text=scenes[index],
+                        speed=speed,
+                        retime=retime,
+                        nfe_step=self.DRAFT_NFE_STEP if draft else None,
+                        output_dir=manifest.job_dir.absolute(),
+                        cancel_token=cancel_token
+                    )
+                }, key=self._audio_key(scenes[index], speed, retime, draft))["audio_path"]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            audio_paths = list(executor.map(synthesize, range(len(scenes))))
+
+        # Continuous loop phase: each scene starts where the previous one ended
+        loop_starts, offset = [], 0
+        for audio_path in audio_paths:
+            loop_starts.append(offset)
+            offset += required_frame_count(avatar_image, audio_path)
+
+        # Phase 2: render scenes in parallel, each resuming from its own checkpoints
+        if progress_callback is not None:
+            progress_callback(0.3, desc="Rendering scenes...")
+        done = []
+        # The scene lengths are known now, which fixes the playlist's target duration
+        playlist = None
+        if progressive:
+            playlist = HlsPlaylist(
+                self.output_dir / job_id,
+                target_duration=max(probe_media(path).duration for path in audio_paths)
+            )
+        if playlist is not None:
+            print(f"Progressive output: {playlist.path}")
+
+        def render(index: int) -> str:
+            video = self._run_with_retries(
+                manifest=manifests[index],
+                text=scenes[index],
+                avatar_path=avatar_image,
+                cancel_token=cancel_token,
+                loop_start=loop_starts[index],
+                profile=profile,
+                speed=speed,
+                retime=retime,
+                draft=draft,
+                quality=quality,
+                resolution=resolution,
+                uniform_encoding=True
+            )
+            if playlist is not None:
+                published = playlist.add(index, video)
+                if on_segment is not None:
+                    on_segment(str(playlist.path), published)
+            done.append(index)
+            if progress_callback is not None:
+                desc = f"Rendered {len(done)}/{len(scenes)} scenes"
+                if playlist is not None:
+                    desc += f", {playlist.published} playable at {playlist.path}"
+                progress_callback(0.3 + 0.65 * len(done) / len(scenes), desc=desc)
+            return video
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                scene_videos = list(executor.map(render, range(len(scenes))))
+        finally:
+            # Ended even when a scene fails, so players stop polling
+            if playlist is not None:
+                playlist.close()
+
+        # Phase 3: frame-accurate stitching without re-encoding
+        output_path = self._output_path(job_id, draft)
+        concat_videos(scene_videos, str(output_path))
+        for video in scene_videos:
+            Path(video).unlink(missing_ok=True)
+
+        if progress_callback is not None:
+            progress_callback(1.0, desc="Processing complete!")
+        print(f"Long-form video generated at: {output_path}")
+        return str(output_path)
+
+    @tracked_job
+    def generate_fan_out(
+        self,
+        text: str,
+        avatar_images: List,
+        max_workers: int = 2,
+        progress_callback: Optional[gr.Progress] = None,
+        cancel_token: Optional[CancelToken] = None,
+        job_id: Optional[str] = None,
+        profile: bool = False,
+        speed: float = 1.0,
+        retime: bool = False,
+        draft: bool = False,
+        quality: Optional[str] = None,
+        resolution: Optional[str] = None
+    ) -> dict:
+        """
+        Render one script onto several avatars.
+
+        The audio is synthesized and conditioned once; every avatar job starts
+        from those checkpoints (mel windows are cached per audio and fps, so
+        avatars with the same frame rate share them too). Avatar jobs run in
+        parallel and a failing avatar does not stop the others.
+
+        Returns:
+            dict: Shared audio timing and, per avatar in input order, the output
+                  video path (or error) and its render time in seconds
+        """
+        self.ensure_ready()
+
+        avatar_paths = [a.name if hasattr(a, 'name') else a for a in avatar_images]
+        if not avatar_paths:
+            raise ValueError("No avatars given")
+
+        job_id = job_id or str(uuid.uuid4())
+        print(f"\nFan-out job {job_id}: {len(avatar_paths)} avatars")
+
+        # Shared stages: TTS and audio conditioning, once for all avatars
+        if progress_callback is not None:
+            progress_callback(0.1, desc="Generating audio...")
+        shared = JobManifest(
+            self.jobs_dir / job_id / "shared", f"{job_id}_shared",
+            store=self.job_store, parent_job_id=job_id, label="shared"
+        )
+        shared_dir = shared.job_dir.absolute()
+        t0 = time.perf_counter()
+        audio_key = self._audio_key(text, speed, retime, draft)
+        with job_buffers(shared.job_id):
+            tts = shared.run_stage("tts", lambda: {
+                "audio_path": self._generate_audio(
+                    text=text,
+                    speed=speed,
+                    retime=retime,
+                    nfe_step=self.DRAFT_NFE_STEP if draft else None,
+                    output_dir=shared_dir,
+                    cancel_token=cancel_token,
+                    progress_callback=self._stage_progress(progress_callback, 0.1, 0.3, "Generating audio")
+                )
+            }, key=audio_key)
+            def condition_stage():
+                wav, sample_rate = self.tts_model.get_waveform(tts["audio_path"])
+                return {"lipsync_audio_path": condition_audio(wav, sample_rate).save_lipsync(shared_dir / "audio_16k.wav")}
+            conditioned = shared.run_stage("condition", condition_stage, key=audio_key)
+        audio_seconds = time.perf_counter() - t0
+
+        # Per-avatar jobs start from the shared checkpoints
+        if progress_callback is not None:
+            progress_callback(0.3, desc=f"Rendering {len(avatar_paths)} avatars...")
+        done = []
+
+        def render(index: int) -> dict:
+            manifest = JobManifest(
+                self.jobs_dir / job_id / f"avatar_{index:03d}", f"{job_id}_avatar_{index:03d}",
+                store=self.job_store, parent_job_id=job_id, label=f"avatar_{index:03d}"
+            )
+            manifest.run_stage("tts", lambda: dict(tts), key=audio_key)
+            manifest.run_stage("condition", lambda: dict(conditioned), key=audio_key)
+            result = {"avatar": avatar_paths[index], "video_path": None, "error": None}
+            start = time.perf_counter()
+            try:
+                result["video_path"] = self._run_with_retries(
+                    manifest=manifest,
+                    text=text,
+                    avatar_path=avatar_paths[index],
+                    cancel_token=cancel_token,
+                    profile=profile,
+                    speed=speed,
+                    retime=retime,
+                    draft=draft,
+                    quality=quality,
+                    resolution=resolution
+                )
+            except Exception as e:
+                print(f"Avatar {avatar_paths[index]} failed: {str(e)}")
+                result["error"] = str(e)
+            result["seconds"] = time.perf_counter() - start
+            done.append(index)
+            if progress_callback is not None:
+                progress_callback(0.3 + 0.7 * len(done) / len(avatar_paths), desc=f"Rendered {len(done)}/{len(avatar_paths)} avatars")
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(render, range(len(avatar_paths))))
+
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+        for result in results:
+            status = result["video_path"] or f"failed ({result['error']})"
+            print(f"  {result['avatar']}: {result['seconds']:.1f}s -> {status}")
+        return {"job_id": job_id, "audio_seconds": audio_seconds, "results": results}
+
+    def _lipsync_settings(
+        self,
+        quality: Optional[str] = None,
+        draft: bool = False,
+        resolution: Optional[str] = None
+    ) -> dict:
+        """Lip-sync options of a job: the defaults, the requested quality and resolution, then draft overrides"""
+        settings = dict(self.LIPSYNC_DEFAULTS)
+        if quality:
+            settings["quality"] = quality
+        if resolution:
+            settings["resolution"] = resolution
+        if draft:
+            settings.update(self.DRAFT_LIPSYNC)
+        return settings
+
+    def _audio_key(self, text: str, speed: float, retime: bool, draft: bool) -> str:
+        """Checkpoint key of the audio stages: the sentences synthesized and how"""
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?]) +', text) if s.strip()]
+        digest = hashlib.sha1(json.dumps(sentences, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+        nfe_step = self.DRAFT_NFE_STEP if draft else "default"
+        return f"text={digest} speed={speed:g} retime={retime} nfe={nfe_step}"
+
+    @staticmethod
+    def _avatar_key(avatar_path: str) -> str:
+        """Checkpoint key part of the avatar: a replaced or edited file re-runs the video stages"""
+        path = Path(avatar_path).absolute()
+        return f"avatar={path} mtime={path.stat().st_mtime_ns}"
+
+    def _output_path(self, job_id: str, draft: bool = False) -> Path:
+        return (self.output_dir / f"output_{job_id}{'_draft' if draft else ''}.mp4").absolute()
+
+    @staticmethod
+    def _stage_progress(progress_callback, start: float, end: float, desc: str):
+        """Map a stage's (done, total) counter onto a slice of the overall progress bar"""
+        if progress_callback is None:
+            return None
+
+        def report(done: int, total: int, *_):
+            fraction = done / total if total else 0.0
+            progress_callback(start + (end - start) * fraction, desc=f"{desc} ({done}/{total})...")
+
+        return report
+
     def _generate_audio(
         self, 
         text: str,
-        speed: float = 1.0
-    ) -> Optional[str]:
+        speed: float = 1.0,
+        output_dir: Optional[Path] = None,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback=None,
+        retime: bool = False,
+        nfe_step: Optional[int] = None
+    ) -> str:
         """
         Advanced audio generation with F5TTS using smart reference selection
         """
         try:
+            output_dir = output_dir or self.audio_dir
             print("\nGenerating audio with F5TTS:")
             print(f"Text: {text}")
-            print(f"Output Directory: {self.audio_dir}")
+            print(f"Speed: {speed}{' (re-timed)' if retime else ''}")
+            print(f"Output Directory: {output_dir}")
 
             # Generate audio using smart reference selection
             output_path = self.tts_model.generate_audio(
                 text=text,
-                output_path=str(self.audio_dir),
-                speed=speed
+                output_path=str(output_dir),
+                speed=speed,
+                cancel_token=cancel_token,
+                progress_callback=progress_callback,
+                retime=retime,
+                nfe_step=nfe_step
             )
 
             if not output_path or not Path(output_path).exists():
                 raise Exception("Audio file not generated")
 
-            return output_path
+            return str(Path(output_path).absolute())
 
         except Exception as e:
             print(f"Audio generation error: {str(e)}")
-            return None
+            raise
     
-    def _synchronize_lips(
+    def _compute_mel(self, wav: np.ndarray, sample_rate: int, avatar_path: str) -> str:
+        """Mel windows aligned to the avatar's frame rate; returns the cached .npy path"""
+        fps = avatar_fps(avatar_path)
+        _, cache_file = cached_mel_windows(wav, sample_rate, fps, cache_dir=self.mel_cache_dir)
+        return str(cache_file.absolute())
+
+    def _preprocess_avatar(
         self,
         avatar_path: str,
         audio_path: str,
-        job_id: str,
+        start_frame: Optional[int] = None
+    ) -> dict:
+        """
+        Plan the avatar loop that covers the whole audio.
+
+        Nothing is encoded here: lip-sync reads the ping-pong loop straight
+        from the avatar, so only the frames Wav2Lip needs are ever written.
+        The face of a still image is detected once here and reused for
+        every frame.
+
+        Returns:
+            dict: The avatar's "video_path", the loop's "frame_count" and
+                "start_frame", and a still image's "face_box" (None when
+                lip-sync has to detect it)
+        """
+        abs_audio_path = str(Path(audio_path).absolute())
+        abs_avatar_path = str(Path(avatar_path).absolute())
+        
+        if not Path(abs_audio_path).exists():
+            raise FileNotFoundError(f"Audio file not found: {abs_audio_path}")
+        if not Path(abs_avatar_path).exists():
+            raise FileNotFoundError(f"Avatar file not found: {abs_avatar_path}")
+
+        print(f"Using audio file (absolute path): {abs_audio_path}")
+        print(f"Using avatar file (absolute path): {abs_avatar_path}")
+
+        box = None
+        if is_still_image(abs_avatar_path):
+            box = StillFrameSource(abs_avatar_path).detect_face()
+            print(f"Still image avatar (face: {box or 'detected by lip-sync'}), no looped video needed")
+
+        frame_count = required_frame_count(abs_avatar_path, abs_audio_path)
+        return {
+            "video_path": abs_avatar_path,
+            "frame_count": frame_count,
+            "start_frame": start_frame or 0,
+            "face_box": [int(v) for v in box] if box is not None else None
+        }
+
+    def _run_face_lipsync(
+        self,
+        video_path: str,
+        audio_path: str,
+        output_path: Path,
+        frame_count: int,
+        start_frame: int = 0,
+        mel_windows=None,
+        resolution: str = "Full",
+        face_crop: bool = FACE_CROP,
+        face_box=None,
+        uniform_encoding: bool = False,
         **kwargs
     ) -> str:
-        try:
-            # Convert paths to absolute paths
-            abs_audio_path = str(Path(audio_path).absolute())
-            abs_avatar_path = str(Path(avatar_path).absolute())
-            
-            if not Path(abs_audio_path).exists():
-                raise FileNotFoundError(f"Audio file not found: {abs_audio_path}")
-            if not Path(abs_avatar_path).exists():
-                raise FileNotFoundError(f"Avatar file not found: {abs_avatar_path}")
+        """
+        Lip-sync `frame_count` frames of the avatar loop (from loop phase
+        `start_frame`) at the job's output resolution tier.
 
-            print(f"Using audio file (absolute path): {abs_audio_path}")
-            print(f"Using avatar file (absolute path): {abs_avatar_path}")
-            
-            # Create preprocessed video path with absolute path
-            preprocessed_video = self.temp_dir / f"preprocessed_{job_id}.mp4"
-            preprocessed_video = preprocessed_video.absolute()
-            
-            # Ensure temp directory exists
-            preprocessed_video.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Preprocess video
-            processed_avatar_path = preprocess_video_for_audio(
-                video_path=abs_avatar_path,
-                audio_path=abs_audio_path,
-                output_path=str(preprocessed_video)
+        Only frames with speech under them go through Wav2Lip: they are cut
+        from the loop into one clip, and with `face_crop` only a fixed window
+        around the face, so the per-frame cost follows the face size rather
+        than the frame size. The output is then assembled in one pass that
+        splices in the untouched avatar frames for silent spans, blends the
+        seams, pastes the face back with a feathered edge and scales to the
+        tier. That clip and the output are the only encodes besides Wav2Lip's
+        own; when every frame is lip-synced without a crop, Wav2Lip's clip is
+        the output unless `uniform_encoding` asks for this pipeline's encoding.
+        `face_box` is a face already detected on a still image, so it is not
+        searched for again.
+        """
+        output_path = Path(output_path).absolute()
+        fps = avatar_fps(video_path)
+        source_size = avatar_size(video_path)
+        size = output_size(resolution, source_size)
+
+        wav, sample_rate = load_lipsync_audio(audio_path)
+        if SKIP_SILENCE:
+            mask = silent_frames(wav, sample_rate, fps, frame_count)
+        else:
+            mask = np.zeros(frame_count, dtype=bool)
+        spans = speech_spans(mask)
+        print(f"Skipping lip-sync for {int(mask.sum())}/{frame_count} silent frames ({len(spans)} speech spans)")
+        if not spans:
+            return merge_speech(video_path, None, mask, str(output_path), fps, size=size, start_frame=start_frame)
+
+        box = face_region(video_path, face_box=face_box) if face_crop else None
+        if box is not None:
+            print(f"Lip-syncing the face crop {box} of {source_size} frames")
+            output_height = "full resolution"
+            if face_box is not None:
+                # The face in crop coordinates
+                face_box = [face_box[0] - box[0], face_box[1] - box[1], face_box[2] - box[0], face_box[3] - box[1]]
+        else:
+            # Height of the tier for this avatar: sources are never upscaled
+            output_height = "full resolution" if size == source_size else size[1]
+
+        temporary = []
+        try:
+            speech_video = cut_speech(
+                video_path, spans, str(output_path.with_name("speech.mp4")), fps,
+                start_frame=start_frame, box=box
             )
-            
-            if not Path(processed_avatar_path).exists():
-                raise FileNotFoundError(f"Preprocessed video not found: {processed_avatar_path}")
-            
-            # Generate output path for this job
-            output_video = self.output_dir / f"output_{job_id}.mp4"
-            output_video = output_video.absolute()
-            
-            # Generate the talking avatar using preprocessed video
-            result_path = self.wav2lip_model.generate_talking_avatar(
-                video_path=processed_avatar_path,
-                audio_path=abs_audio_path,
-                output_path=str(output_video),
-                **kwargs
+            if speech_video != str(Path(video_path).absolute()):
+                temporary.append(speech_video)
+            speech_audio = audio_path
+            if mask.any():
+                speech_audio = cut_audio(wav, sample_rate, fps, spans, str(output_path.with_name("speech_16k.wav")))
+                temporary.append(speech_audio)
+                if mel_windows is not None:
+                    keep = np.concatenate([np.arange(a, min(b, len(mel_windows))) for a, b in spans])
+                    mel_windows = mel_windows[keep]
+            synced = self._run_lipsync(
+                speech_video, speech_audio, output_path.with_name("speech_lipsync.mp4"),
+                mel_windows=mel_windows, face_box=face_box, output_height=output_height, **kwargs
             )
-            
-            # Clean up preprocessed video
-            try:
-                if Path(processed_avatar_path).exists():
-                    Path(processed_avatar_path).unlink()
-            except Exception as e:
-                print(f"Warning: Failed to clean up preprocessed video: {e}")
-            
-            if not result_path or not Path(result_path).exists():
-                raise FileNotFoundError(f"Wav2Lip failed to generate output video: {result_path}")
-            
-            print(f"Wav2Lip output video generated at: {result_path}")
-            return str(result_path)
-            
-        except Exception as e:
-            print(f"Lip synchronization error: {str(e)}")
-            raise
+            temporary.append(synced)
+            if box is None and not mask.any() and not uniform_encoding and probe_media(synced).resolution == size:
+                # Every frame is lip-synced at the output size: nothing to merge or re-encode
+                return str(Path(synced).replace(output_path))
+            return merge_speech(
+                video_path, synced, mask, str(output_path), fps,
+                size=size, box=box, start_frame=start_frame
+            )
+        finally:
+            for path in temporary:
+                Path(path).unlink(missing_ok=True)
+
+    def _run_lipsync(self, video_path: str, audio_path: str, output_path: Path, **kwargs) -> str:
+        """Run Wav2Lip on an already looped avatar video"""
+        output_path = Path(output_path).absolute()
+        result_path = self.wav2lip_model.generate_talking_avatar(
+            video_path=video_path,
+            audio_path=str(Path(audio_path).absolute()),
+            output_path=str(output_path),
+            **kwargs
+        )
+        
+        if not result_path or not Path(result_path).exists():
+            raise FileNotFoundError(f"Wav2Lip failed to generate output video: {result_path}")
+        
+        print(f"Wav2Lip output video generated at: {result_path}")
+        return str(result_path)
+
+_avatar_service: Optional[TalkingAvatarService] = None
+_avatar_service_lock = threading.Lock()
+
+def get_avatar_service(
+    defer_checks: bool = False,
+    warmup_avatar: Optional[str] = None,
+    stand_in: bool = False,
+    tts_engine: Optional[str] = None,
+    lipsync_engine: Optional[str] = None
+) -> TalkingAvatarService:
+    """Return the shared service, creating it on first use"""
+    global _avatar_service
+    with _avatar_service_lock:
+        if _avatar_service is None:
+            _avatar_service = TalkingAvatarService(
+                defer_checks=defer_checks,
+                warmup_avatar=warmup_avatar,
+                stand_in=stand_in,
+                tts_engine=tts_engine,
+                lipsync_engine=lipsync_engine
+            )
+        return _avatar_service
+
+# Distributed mode: jobs go on a queue and are rendered by worker.py processes
+_job_queue: Optional[JobQueue] = None
+_artifact_dir: Optional[Path] = None
+
+def configure_job_queue(queue_url: str, artifact_dir: str):
+    """Send jobs to render workers instead of rendering in this process"""
+    global _job_queue, _artifact_dir
+    _job_queue = open_queue(queue_url)
+    _artifact_dir = Path(artifact_dir).absolute()
+    print(f"Distributed mode: queue {queue_url}, artifacts in {_artifact_dir}")
+
+def submit_to_queue(
+    text: str,
+    avatar_path: str,
+    long_form: bool = False,
+    progress_callback=None,
+    cancel_token: Optional[CancelToken] = None,
+    profile: bool = False,
+    speed: float = 1.0,
+    retime: bool = False,
+    draft: bool = False,
+    quality: Optional[str] = None,
+    resolution: Optional[str] = None,
+    render_job_id: Optional[str] = None,
+    progressive: bool = False
+) -> str:
+    """
+    Enqueue a job for the workers and wait for its video. `render_job_id`
+    re-renders an earlier job (e.g. a draft upgraded to the final render)
+    from its checkpoints; by default the queue id is the render job id.
+    With `progressive`, long-form scenes are also published to an HLS
+    playlist in the shared artifact directory as they finish.
+    """
+    job_id = str(uuid.uuid4())
+
+    # Workers only see the shared artifact directory, so the avatar is staged there
+    input_dir = _artifact_dir / "inputs" / job_id
+    input_dir.mkdir(parents=True, exist_ok=True)
+    staged_avatar = input_dir / Path(avatar_path).name
+    shutil.copy2(avatar_path, staged_avatar)
+
+    _job_queue.put({
+        "text": text,
+        "avatar_path": str(staged_avatar),
+        "long_form": long_form,
+        "profile": profile,
+        "speed": speed,
+        "retime": retime,
+        "draft": draft,
+        "quality": quality,
+        "resolution": resolution,
+        "job_id": render_job_id,
+        "progressive": progressive
+    }, job_id=job_id)
+    print(f"Queued job {job_id}")
+
+    # Workers write the playlist where generate_long_form puts it: output/<job_id>/index.m3u8
+    playlist_path = _artifact_dir / "output" / (render_job_id or job_id) / "index.m3u8"
+
+    def on_progress(job):
+        if progress_callback is not None:
+            desc = "Waiting for a worker..." if job.status == "queued" else "Rendering..."
+            if progressive and long_form and playlist_path.exists():
+                desc += f" (playable at {playlist_path})"
+            progress_callback(job.progress, desc=desc)
+
+    job = wait_for_job(_job_queue, job_id, cancel_token=cancel_token, on_progress=on_progress)
+    if job.status != "done":
+        raise Exception(f"Job {job.status}: {job.error}")
+    return job.result["video_path"]
 
 def process_talking_avatar(
     text: str, 
     avatar_input,  # Remove type annotation to handle any input type
     speed: float = 1.0,
-    quality: str = "Improved",
+    quality: Optional[str] = None,
     wav2lip_version: str = "Wav2Lip",
     nosmooth: bool = True,
     pad_up: int = 0,
     pad_down: int = 0,
     pad_left: int = 0,
     pad_right: int = 0,
-    progress: gr.Progress = gr.Progress()
+    progress: Optional[gr.Progress] = None,
+    cancel_token: Optional[CancelToken] = None,
+    long_form: bool = False,
+    profile: bool = False,
+    retime: bool = False,
+    draft: bool = False,
+    job_id: Optional[str] = None,
+    resolution: Optional[str] = None,
+    progressive: bool = False
 ):
     try:
-        # Initialize service if not already initialized
-        avatar_service = TalkingAvatarService()
-        
         # Input validation
         if not text:
             return None, "Please provide input text"
@@ -235,17 +1091,52 @@ def process_talking_avatar(
         print("\nStarting avatar generation:")
         print(f"Input text: {text}")
         print(f"Avatar input: {avatar_input}")
-        print(f"Speed: {speed}")
-        print(f"Quality: {quality}")
+        print(f"Speed: {speed}{' (re-timed)' if retime else ''}")
+        print(f"Quality: {quality or 'default'}, resolution: {resolution or 'default'}{' (draft)' if draft else ''}")
         
-        video = avatar_service.generate_talking_avatar(
-            text=text,
-            avatar_image=avatar_path,  # Pass the extracted path
-            progress_callback=progress
-        )
+        if _job_queue is not None:
+            video = submit_to_queue(
+                text=text,
+                avatar_path=avatar_path,
+                long_form=long_form,
+                progress_callback=progress,
+                cancel_token=cancel_token,
+                profile=profile,
+                speed=speed,
+                retime=retime,
+                draft=draft,
+                quality=quality,
+                resolution=resolution,
+                render_job_id=job_id,
+                progressive=progressive
+            )
+        else:
+            # Initialize service if not already initialized
+            avatar_service = get_avatar_service()
+
+            # Long scripts are rendered as parallel scenes and stitched together
+            if long_form:
+                generate = functools.partial(avatar_service.generate_long_form, progressive=progressive)
+            else:
+                generate = avatar_service.generate_talking_avatar
+            video = generate(
+                text=text,
+                avatar_image=avatar_path,  # Pass the extracted path
+                progress_callback=progress,
+                cancel_token=cancel_token,
+                profile=profile,
+                speed=speed,
+                retime=retime,
+                draft=draft,
+                quality=quality,
+                resolution=resolution,
+                job_id=job_id
+            )
         
         if video:
             print(f"Successfully generated video at: {video}")
+            if draft:
+                return video, "Draft generated - use 'Render final' to upgrade it"
             return video, "Talking avatar generated successfully!"
         else:
             return None, "Failed to generate video"
@@ -258,9 +1149,53 @@ def process_talking_avatar(
         print(traceback.format_exc())
         return None, error_msg
 
-def create_gradio_interface():
-    # Initialize service
-    avatar_service = TalkingAvatarService()
+def get_job_store() -> JobStore:
+    """The job store of this process, or the workers' shared one in distributed mode"""
+    if _job_queue is not None:
+        return JobStore(_artifact_dir / "jobs.db")
+    return get_avatar_service().job_store
+
+def job_history_view(limit: int = 50):
+    """Recent jobs as table rows, plus throughput statistics for the last 24 hours"""
+    store = get_job_store()
+    rows = []
+    for job in store.history(limit=limit):
+        seconds = job["finished"] - job["started"] if job["finished"] and job["started"] else None
+        rows.append([
+            job["job_id"],
+            job["kind"],
+            job["status"],
+            job["stage"] or "",
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["created"])),
+            round(seconds, 1) if seconds is not None else "",
+            job["error"] or ""
+        ])
+    return rows, store.stats(since=time.time() - 24 * 3600)
+
+class SessionJob:
+    """Cancellation handle for the job a UI session is currently running"""
+    def __init__(self):
+        self.token: Optional[CancelToken] = None
+        # Last job rendered in this session ("Render final" upgrades it)
+        self.job_id: Optional[str] = None
+
+def create_gradio_interface(
+    defer_checks: bool = False,
+    warmup_avatar: Optional[str] = None,
+    stand_in: bool = False,
+    concurrency_count: int = 1,
+    tts_engine: Optional[str] = None,
+    lipsync_engine: Optional[str] = None
+):
+    # Initialize service (in distributed mode the models live on the workers)
+    if _job_queue is None:
+        get_avatar_service(
+            defer_checks=defer_checks,
+            warmup_avatar=warmup_avatar,
+            stand_in=stand_in,
+            tts_engine=tts_engine,
+            lipsync_engine=lipsync_engine
+        )
     
     with gr.Blocks() as demo:
         gr.Markdown("# Advanced Talking Avatar Generator")
@@ -289,6 +1224,12 @@ def create_gradio_interface():
                     label="Speech Speed"
                 )
 
+                # Apply the speed to cached natural-speed sentences instead of re-synthesizing
+                retime = gr.Checkbox(
+                    value=False,
+                    label="Fast speed changes (time-stretch cached speech)"
+                )
+
                 # Wav2Lip Options
                 nosmooth = gr.Checkbox(
                     value=True,
@@ -298,18 +1239,72 @@ def create_gradio_interface():
                 pad_down = gr.Number(value=-10, label="Pad Down")
                 pad_left = gr.Number(value=-10, label="Pad Left")
                 pad_right = gr.Number(value=-10, label="Pad Right")
+
+                # Split long scripts into ~30 s scenes rendered in parallel
+                long_form = gr.Checkbox(
+                    value=False,
+                    label="Long-form mode (split into scenes)"
+                )
+
+                # Long-form only: publish scenes to an HLS playlist as they finish
+                progressive = gr.Checkbox(
+                    value=False,
+                    label="Progressive playback (HLS playlist, long-form)"
+                )
+
+                # Sampled flame graphs per stage, attached to the job record
+                profile_job = gr.Checkbox(
+                    value=False,
+                    label="Profile this job"
+                )
+
+                # Lip-sync quality of final renders
+                quality = gr.Dropdown(
+                    choices=["Fast", "Improved", "Enhanced"],
+                    value=TalkingAvatarService.LIPSYNC_DEFAULTS["quality"],
+                    label="Quality"
+                )
+
+                # Output resolution of final renders; only the face crop is lip-synced at any tier
+                resolution = gr.Dropdown(
+                    choices=list(OUTPUT_TIERS),
+                    value=TalkingAvatarService.LIPSYNC_DEFAULTS["resolution"],
+                    label="Output resolution"
+                )
+
+                # Fewer TTS steps, half resolution, no enhancer; upgrade with "Render final"
+                draft = gr.Checkbox(
+                    value=False,
+                    label="Draft (fast preview)"
+                )
                 
                 # Generate Button
                 generate_btn = gr.Button("Generate Talking Avatar", variant="primary")
+                final_btn = gr.Button("Render final")
+                cancel_btn = gr.Button("Cancel")
         
         with gr.Row():
             # Output Components
             output_video = gr.Video(label="Generated Talking Avatar")
             error_output = gr.Textbox(label="Status/Errors", visible=True)
+
+        # Job history and throughput from the durable job store
+        with gr.Accordion("Job history", open=False):
+            refresh_btn = gr.Button("Refresh")
+            history_table = gr.Dataframe(
+                headers=["Job", "Kind", "Status", "Stage", "Created", "Seconds", "Error"],
+                interactive=False
+            )
+            stats_output = gr.JSON(label="Statistics")
         
+        # Per-session handle on the running job so it can be cancelled
+        session_job = gr.State(SessionJob())
+
         # Event Handling
-        generate_btn.click(
-            fn=lambda text, avatar, speed, ns, pu, pd, pl, pr: process_talking_avatar(
+        def on_generate(job, text, avatar, speed, ns, pu, pd, pl, pr, lf, prog, prof, rt, q, dr, res, progress=gr.Progress()):
+            job.token = CancelToken()
+            job.job_id = str(uuid.uuid4())
+            return process_talking_avatar(
                 text=text,
                 avatar_input=avatar,
                 speed=speed,
@@ -317,21 +1312,96 @@ def create_gradio_interface():
                 pad_up=pu,
                 pad_down=pd,
                 pad_left=pl,
-                pad_right=pr
-            ),
-            inputs=[
-                text_input,
-                avatar_upload,
-                speed_slider,
-                nosmooth,
-                pad_up,
-                pad_down,
-                pad_left,
-                pad_right
-            ],
-            outputs=[output_video, error_output]
+                pad_right=pr,
+                progress=progress,
+                cancel_token=job.token,
+                long_form=lf,
+                progressive=prog,
+                profile=prof,
+                retime=rt,
+                quality=q,
+                draft=dr,
+                job_id=job.job_id,
+                resolution=res
+            )
+
+        def on_final(job, text, avatar, speed, ns, pu, pd, pl, pr, lf, prog, prof, rt, q, dr, res, progress=gr.Progress()):
+            # Upgrades the session's last job, reusing its checkpoints where the settings allow
+            if job.job_id is None:
+                return None, "Generate a draft first"
+            job.token = CancelToken()
+            return process_talking_avatar(
+                text=text,
+                avatar_input=avatar,
+                speed=speed,
+                nosmooth=ns,
+                pad_up=pu,
+                pad_down=pd,
+                pad_left=pl,
+                pad_right=pr,
+                progress=progress,
+                cancel_token=job.token,
+                long_form=lf,
+                progressive=prog,
+                profile=prof,
+                retime=rt,
+                quality=q,
+                draft=False,
+                job_id=job.job_id,
+                resolution=res
+            )
+
+        def on_cancel(job):
+            # Kills the running TTS/Wav2Lip process group right away
+            if job.token is not None:
+                job.token.cancel()
+            return "Cancelled"
+
+        job_inputs = [
+            session_job,
+            text_input,
+            avatar_upload,
+            speed_slider,
+            nosmooth,
+            pad_up,
+            pad_down,
+            pad_left,
+            pad_right,
+            long_form,
+            progressive,
+            profile_job,
+            retime,
+            quality,
+            draft,
+            resolution
+        ]
+        generate_event = generate_btn.click(
+            fn=on_generate,
+            inputs=job_inputs,
+            outputs=[output_video, error_output],
+            api_name="generate"
+        )
+        final_event = final_btn.click(
+            fn=on_final,
+            inputs=job_inputs,
+            outputs=[output_video, error_output],
+            api_name="finalize"
+        )
+        cancel_btn.click(
+            fn=on_cancel,
+            inputs=[session_job],
+            outputs=[error_output],
+            cancels=[generate_event, final_event]
+        )
+        refresh_btn.click(
+            fn=job_history_view,
+            inputs=[],
+            outputs=[history_table, stats_output]
         )
     
+    # Progress tracking requires the queue; concurrency_count is the number of
+    # jobs rendered at once (size it with load_test.py)
+    demo.queue(concurrency_count=concurrency_count)
     return demo
 
 # Launch the Interface
@@ -339,12 +1409,60 @@ if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Launch the Abico Avatar Generator')
     parser.add_argument('--server_port', type=int, default=7860, help='Port to run the server on')
+    parser.add_argument('--fast-startup', action='store_true',
+                        default=os.environ.get('ABICO_FAST_STARTUP', '0') == '1',
+                        help='Serve the UI first and run installation checks in the background')
+    parser.add_argument('--warmup', action='store_true',
+                        default=os.environ.get('ABICO_WARMUP', '0') == '1',
+                        help='Run a short synthetic job through both models before signalling readiness')
+    parser.add_argument('--warmup-avatar', default=os.environ.get('ABICO_WARMUP_AVATAR', 'demo/demo.mp4'),
+                        help='Avatar video used for the warm-up job')
+    parser.add_argument('--stand-in', action='store_true',
+                        default=os.environ.get('ABICO_STAND_IN', '0') == '1',
+                        help='Use model-free stand-in backends (for load tests)')
+    parser.add_argument('--tts-engine', choices=TTS_ENGINES, default=None,
+                        help='TTS engine (default: ABICO_TTS_ENGINE or subprocess)')
+    parser.add_argument('--lipsync-engine', choices=LIPSYNC_ENGINES, default=None,
+                        help='Lip-sync engine (default: ABICO_LIPSYNC_ENGINE or subprocess)')
+    parser.add_argument('--concurrency-count', type=int,
+                        default=int(os.environ.get('ABICO_CONCURRENCY', 1)),
+                        help='Number of UI jobs processed at the same time')
+    parser.add_argument('--queue', default=os.environ.get('ABICO_QUEUE'),
+                        help='Put jobs on this queue (e.g. sqlite:///shared/queue.db) for worker.py processes')
+    parser.add_argument('--artifacts', default=os.environ.get('ABICO_ARTIFACTS', 'temp/shared'),
+                        help='Shared artifact directory used with --queue')
     args = parser.parse_args()
+
+    if args.queue:
+        configure_job_queue(args.queue, args.artifacts)
     
     # Create and launch the interface
-    demo = create_gradio_interface()
+    demo = create_gradio_interface(
+        defer_checks=args.fast_startup,
+        warmup_avatar=args.warmup_avatar if args.warmup else None,
+        stand_in=args.stand_in,
+        concurrency_count=args.concurrency_count,
+        tts_engine=args.tts_engine,
+        lipsync_engine=args.lipsync_engine
+    )
+    startup_profile.mark("ui_built")
     demo.launch(
         server_name="127.0.0.1",  
         server_port=args.server_port,       
-        share=False             
-    )
\ No newline at end of file
+        share=False,
+        prevent_thread_lock=True
+    )
+    startup_profile.mark("ui_ready")
+    startup_profile.report(output_path="temp/startup_profile.json")
+    
+    # Resume jobs interrupted by a crash or restart (workers handle this in distributed mode)
+    if _job_queue is None:
+        run_in_background(get_avatar_service().recover_unfinished_jobs, name="recovery")
+
+    # Deferred checks and warm-up run while the UI is already serving
+    if args.fast_startup and _job_queue is None:
+        service = get_avatar_service()
+        service.start_background_startup()
+        service.ready.wait()
+        startup_profile.report(output_path="temp/startup_profile.json")
+    demo.block_thread()
\ No newline at end of file
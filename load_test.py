@@ -0,0 +1,147 @@
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+# Mongolian sample scripts of increasing length
+TEXTS = {
+    "short": "Сайн байна уу. Манай компанид тавтай морилно уу.",
+    "medium": (
+        "Сайн байна уу. Манай компани танд шинэ бүтээгдэхүүнээ танилцуулж байна. "
+        "Энэ бүтээгдэхүүн таны ажлыг хялбар, хурдан болгоно. "
+        "Дэлгэрэнгүй мэдээллийг манай цахим хуудаснаас аваарай."
+    ),
+    "long": " ".join([
+        "Сайн байна уу. Өнөөдөр бид шинэ үйлчилгээнийхээ талаар ярих болно.",
+        "Манай баг олон жилийн туршлагатай бөгөөд харилцагч бүрт анхаарал хандуулдаг.",
+        "Бид таны хэрэгцээнд тохирсон шийдлийг санал болгоно.",
+        "Үйлчилгээ маань хурдан, найдвартай, хямд юм.",
+        "Асуулт байвал бидэнтэй холбогдоорой.",
+        "Баярлалаа, сайхан өдөр өнгөрүүлээрэй.",
+    ] * 2),
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """"short=5,medium=3,long=1" -> weights per text length"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in TEXTS:
+            raise ValueError(f"Unknown text length '{name}' (choose from {', '.join(TEXTS)})")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def run_request(client, text: str, avatar: str, api_name: str) -> dict:
+    """Submit one job and time its queue wait and end-to-end latency"""
+    from gradio_client.utils import Status
+
+    submitted = time.perf_counter()
+    started = None
+    record = {"ok": False, "queue_wait": None, "latency": None, "error": None}
+    try:
+        job = client.submit(
+            text, avatar, 1.0,           # text, avatar, speed
+            True, -10, -10, -10, -10,    # nosmooth, pads
+            False, False, False,         # long-form, profile, re-time
+            "Enhanced", False, "Full",   # quality, draft, resolution
+            api_name=api_name
+        )
+        while not job.done():
+            if started is None and job.status().code in (Status.PROCESSING, Status.PROGRESS):
+                started = time.perf_counter()
+            time.sleep(0.05)
+        video, message = job.result()
+        finished = time.perf_counter()
+        record["latency"] = finished - submitted
+        record["queue_wait"] = (started or finished) - submitted
+        record["ok"] = bool(video) and not str(message).startswith("Error")
+        if not record["ok"]:
+            record["error"] = str(message)
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    array = np.array(values)
+    return {
+        "p50": round(float(np.percentile(array, 50)), 2),
+        "p90": round(float(np.percentile(array, 90)), 2),
+        "p99": round(float(np.percentile(array, 99)), 2),
+        "max": round(float(array.max()), 2),
+    }
+
+
+def run_level(url: str, concurrency: int, requests_per_user: int, weights: Dict[str, float],
+              avatars: List[str], api_name: str, seed: int) -> dict:
+    """Run `concurrency` users, each submitting `requests_per_user` jobs back to back"""
+    from gradio_client import Client
+
+    rng = random.Random(seed)
+    plan = [
+        (TEXTS[rng.choices(list(weights), weights=list(weights.values()))[0]], rng.choice(avatars))
+        for _ in range(concurrency * requests_per_user)
+    ]
+    local = threading.local()
+
+    def user(index: int) -> List[dict]:
+        # One client (and websocket session) per simulated user
+        if not hasattr(local, "client"):
+            local.client = Client(url, verbose=False)
+        jobs = plan[index * requests_per_user:(index + 1) * requests_per_user]
+        return [run_request(local.client, text, avatar, api_name) for text, avatar in jobs]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        records = [r for rs in executor.map(user, range(concurrency)) for r in rs]
+    wall = time.perf_counter() - start
+
+    ok = [r for r in records if r["ok"]]
+    errors = [r["error"] for r in records if not r["ok"]]
+    return {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / max(len(records), 1), 3),
+        "throughput_per_min": round(len(ok) / wall * 60, 2),
+        "queue_wait": percentiles([r["queue_wait"] for r in ok]),
+        "latency": percentiles([r["latency"] for r in ok]),
+        "sample_errors": errors[:3],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test the Abico Gradio app')
+    parser.add_argument('--url', default='http://127.0.0.1:7860', help='App URL')
+    parser.add_argument('--concurrency', default='1,2,5,10,20', help='Comma-separated user counts to ramp through')
+    parser.add_argument('--requests-per-user', type=int, default=2, help='Jobs each user submits per level')
+    parser.add_argument('--mix', default='short=5,medium=3,long=1', help='Weighted mix of text lengths')
+    parser.add_argument('--avatars', nargs='+', default=['demo/demo.mp4'], help='Avatar files to draw from')
+    parser.add_argument('--api-name', default='/generate', help='Gradio endpoint to call')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the request mix')
+    parser.add_argument('--output', default='temp/load_test.json', help='Where to write the JSON report')
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    results = []
+    for level in [int(c) for c in args.concurrency.split(",")]:
+        print(f"\nRunning {level} concurrent users...")
+        result = run_level(args.url, level, args.requests_per_user, weights,
+                           args.avatars, args.api_name, args.seed + level)
+        results.append(result)
+        print(f"  requests={result['requests']} errors={result['errors']} "
+              f"throughput={result['throughput_per_min']}/min "
+              f"wait={result['queue_wait']} latency={result['latency']}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"url": args.url, "mix": weights, "levels": results}, f, indent=2, ensure_ascii=False)
+    print(f"\nReport written to {args.output}")
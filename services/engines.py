@@ -0,0 +1,125 @@
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from utils.process_runner import CancelToken
+from utils.startup import lazy_import
+
+soundfile = lazy_import("soundfile")
+
+
+class TTSEngine(ABC):
+    """Text-to-speech stage: text in, one WAV per job out"""
+
+    def verify_installation(self) -> bool:
+        return True
+
+    @abstractmethod
+    def generate_audio(
+        self,
+        text: str,
+        output_path: str,
+        speed: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        retime: bool = False,
+        nfe_step: Optional[int] = None
+    ) -> str:
+        """
+        Synthesize `text` into output_path/generated_audio.wav and return its path.
+        With `retime`, `speed` may be applied by time-stretching natural-speed
+        (cached) audio instead of synthesizing at that speed. `nfe_step` lowers
+        the number of flow-matching steps (None: the model default).
+        """
+
+    def load(self):
+        """Load models ahead of the first request (engines that load lazily)"""
+
+    def get_waveform(self, audio_path: str) -> Tuple[np.ndarray, int]:
+        """(samples, sample_rate) of generated audio; engines may serve it from memory"""
+        samples, sample_rate = soundfile.read(str(Path(audio_path).absolute()), dtype="float32")
+        return samples, sample_rate
+
+    def close(self):
+        """Release processes or models held by the engine"""
+
+
+class LipSyncEngine(ABC):
+    """Lip-sync stage: avatar video + audio in, lip-synced video out"""
+
+    # Engines that consume precomputed frame-aligned mel windows set this;
+    # for the others the job's mel stage is skipped
+    uses_mel_windows = False
+
+    def verify_installation(self) -> bool:
+        return True
+
+    @abstractmethod
+    def generate_talking_avatar(
+        self,
+        video_path: str,
+        audio_path: str,
+        output_path: str,
+        mel_windows=None,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        **kwargs
+    ) -> str:
+        """Lip-sync `video_path` to `audio_path`, write `output_path` and return it"""
+
+    def close(self):
+        """Release processes or models held by the engine"""
+
+
+# Engine names accepted by create_tts_engine / create_lipsync_engine
+TTS_ENGINES = ("subprocess", "inprocess", "persistent", "pool", "fake")
+LIPSYNC_ENGINES = ("subprocess", "fake")
+
+
+def create_tts_engine(name: Optional[str] = None) -> TTSEngine:
+    """
+    Build the TTS engine named by `name` or ABICO_TTS_ENGINE:
+
+    - subprocess: one F5-TTS CLI run per sentence (default)
+    - inprocess: F5-TTS model loaded once in this process
+    - persistent: F5-TTS model loaded once in a long-lived worker process
+    - pool: warm worker processes synthesizing sentences in parallel (CPU hosts)
+    - fake: fast deterministic stand-in, no model
+    """
+    name = name or os.environ.get("ABICO_TTS_ENGINE", "subprocess")
+    if name == "subprocess":
+        from services.f5tts_service import F5TTSService
+        return F5TTSService()
+    if name == "inprocess":
+        from services.f5tts_service import F5TTSInProcessService
+        return F5TTSInProcessService()
+    if name == "persistent":
+        from services.persistent_engine import PersistentTTSService
+        return PersistentTTSService()
+    if name == "pool":
+        from services.persistent_engine import PooledTTSService
+        return PooledTTSService()
+    if name == "fake":
+        from services.stand_in_service import StandInTTSService
+        return StandInTTSService()
+    raise ValueError(f"Unknown TTS engine '{name}' (choose from {', '.join(TTS_ENGINES)})")
+
+
+def create_lipsync_engine(name: Optional[str] = None) -> LipSyncEngine:
+    """
+    Build the lip-sync engine named by `name` or ABICO_LIPSYNC_ENGINE:
+
+    - subprocess: Easy-Wav2Lip CLI (default)
+    - fake: returns the avatar video unchanged after a simulated delay
+    """
+    name = name or os.environ.get("ABICO_LIPSYNC_ENGINE", "subprocess")
+    if name == "subprocess":
+        from services.wav2lip_service import Wav2LipService
+        return Wav2LipService()
+    if name == "fake":
+        from services.stand_in_service import StandInWav2LipService
+        return StandInWav2LipService()
+    raise ValueError(f"Unknown lip-sync engine '{name}' (choose from {', '.join(LIPSYNC_ENGINES)})")
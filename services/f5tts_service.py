@@ -1,13 +1,24 @@
 # services/f5tts_service.py
 import os
+import hashlib
+import shutil
 from pathlib import Path
 import subprocess
 import sys
 import json
 import re
-from pydub import AudioSegment
+import threading
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from services.engines import TTSEngine
+from utils.process_runner import CancelToken, run_process
+from utils.startup import lazy_import
+from utils.time_stretch import time_stretch
 
-class F5TTSService:
+pydub = lazy_import("pydub")
+soundfile = lazy_import("soundfile")
+
+class F5TTSService(TTSEngine):
     def __init__(self):
         # Set UTF-8 encoding for Windows
         if os.name == 'nt':
@@ -41,6 +52,18 @@ class F5TTSService:
         self.output_dir = self.project_root / "temp" / "generated_audio"
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
+        # Recently generated waveforms, keyed by output path
+        self._waveforms = {}
+        self._waveforms_lock = threading.Lock()
+
+        # Deadline for a single sentence synthesis (seconds)
+        self.sentence_timeout = float(os.environ.get("ABICO_TTS_TIMEOUT", 300))
+
+        # Synthesized sentences, reused across jobs (and re-timed for speed changes)
+        self.sentence_cache_dir = self.project_root / "temp" / "sentence_cache"
+        self.sentence_cache_dir.mkdir(parents=True, exist_ok=True)
+        self.sentence_cache_size = int(os.environ.get("ABICO_SENTENCE_CACHE_SIZE", 1000))
+
     def verify_installation(self):
         """Verify F5TTS installation"""
         try:
@@ -54,6 +77,30 @@ class F5TTSService:
             print(f"F5TTS verification failed: {e}")
             return False
 
+    def _remember_waveform(self, output_file: Path, audio):
+        """Cache the float32 samples of a generated AudioSegment by output path"""
+        samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+        samples /= float(1 << (8 * audio.sample_width - 1))
+        if audio.channels > 1:
+            samples = samples.reshape(-1, audio.channels)
+        with self._waveforms_lock:
+            self._waveforms[str(Path(output_file).absolute())] = (samples, audio.frame_rate)
+            while len(self._waveforms) > 4:
+                self._waveforms.pop(next(iter(self._waveforms)))
+
+    def get_waveform(self, audio_path: str) -> Tuple[np.ndarray, int]:
+        """
+        Return (samples, sample_rate) of generated audio, straight from memory
+        when it was produced by this service, otherwise read from disk
+        """
+        key = str(Path(audio_path).absolute())
+        with self._waveforms_lock:
+            cached = self._waveforms.get(key)
+        if cached is not None:
+            return cached
+        samples, sample_rate = soundfile.read(key, dtype="float32")
+        return samples, sample_rate
+
     def get_best_reference(self, sentence: str) -> dict:
         word_count = len(sentence.split())
         
@@ -82,7 +129,166 @@ class F5TTSService:
             'audio_path': str(ref_path)
         }
 
-    def generate_audio(self, text: str, output_path: str, speed: float = 1.0) -> str:
+    def _synthesize_sentence(
+        self,
+        sentence: str,
+        output_file: Path,
+        speed: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        nfe_step: Optional[int] = None
+    ):
+        """Synthesize one sentence to a WAV file with the F5-TTS CLI"""
+        temp_dir = output_file.parent
+
+        # Get best reference for this sentence
+        ref = self.get_best_reference(sentence)
+        
+        # Build command for this sentence
+        cmd = [
+            self.f5tts_cli,
+            '--model', 'F5-TTS',
+            '--ckpt_file', str(self.custom_model),
+            '--vocab_file', str(self.custom_vocab),
+            '--gen_text', sentence.lower().strip(),
+            '--ref_text', ref['text'].lower().strip(),
+            '--ref_audio', str(ref['audio_path']),
+            '--vocoder_name', 'vocos',
+            '--remove_silence', 'false',
+            '--output_dir', str(temp_dir),
+            '--speed', str(speed)
+        ]
+        if nfe_step:
+            # Fewer flow-matching steps: faster, rougher speech (draft renders)
+            cmd += ['--nfe_step', str(nfe_step)]
+
+        print(f"Running command: {' '.join(cmd)}")
+        
+        # Run command with proper environment
+        env = os.environ.copy()
+        env['PYTHONIOENCODING'] = 'utf-8'
+        
+        # Stream output instead of buffering it; enforce the per-sentence deadline
+        result = run_process(
+            cmd,
+            env=env,
+            timeout=self.sentence_timeout,
+            cancel_token=cancel_token
+        )
+        
+        if result.returncode != 0:
+            print(f"Command STDOUT: {result.stdout}")
+            print(f"Command STDERR: {result.stderr}")
+            raise Exception(f"F5TTS command failed with return code {result.returncode}")
+
+        # Check if the output file exists
+        expected_output = temp_dir / "infer_cli_out.wav"
+        if not expected_output.exists():
+            raise Exception(f"Output file not found at {expected_output}")
+
+        # Rename to our temp file name
+        expected_output.rename(output_file)
+
+    def _sentence_cache_path(self, sentence: str, speed: float, nfe_step: Optional[int] = None) -> Path:
+        ref = self.get_best_reference(sentence)
+        key = "\n".join([str(self.custom_model), ref['audio_path'], sentence.lower().strip(), f"{speed:g}"])
+        if nfe_step:
+            key += f"\nnfe={nfe_step}"
+        return self.sentence_cache_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.wav"
+
+    def _cached_sentence(
+        self,
+        sentence: str,
+        output_file: Path,
+        speed: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        nfe_step: Optional[int] = None
+    ):
+        """Synthesize a sentence, or copy it from the sentence cache when it was synthesized before"""
+        cached = self._sentence_cache_path(sentence, speed, nfe_step)
+        if cached.exists():
+            print(f"Sentence cache hit: {sentence}")
+            shutil.copyfile(cached, output_file)
+            os.utime(cached)
+            return
+
+        self._synthesize_sentence(sentence, output_file, speed=speed, cancel_token=cancel_token, nfe_step=nfe_step)
+        # Write-then-rename, so concurrent jobs never see a partial file
+        partial = cached.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(output_file, partial)
+        os.replace(partial, cached)
+        self._prune_sentence_cache()
+
+    def _prune_sentence_cache(self):
+        """Keep the most recently used sentence_cache_size sentences"""
+        files = sorted(self.sentence_cache_dir.glob("*.wav"), key=lambda f: f.stat().st_mtime)
+        for file in files[:max(0, len(files) - self.sentence_cache_size)]:
+            file.unlink(missing_ok=True)
+
+    def _retimed_sentence(
+        self,
+        sentence: str,
+        output_file: Path,
+        speed: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        nfe_step: Optional[int] = None
+    ):
+        """Natural-speed sentence (cached) time-stretched to `speed`, without re-synthesis"""
+        self._cached_sentence(sentence, output_file, speed=1.0, cancel_token=cancel_token, nfe_step=nfe_step)
+        if abs(speed - 1.0) < 1e-3:
+            return
+        samples, sample_rate = soundfile.read(str(output_file), dtype="float32")
+        soundfile.write(str(output_file), time_stretch(samples, sample_rate, speed), sample_rate, subtype="PCM_16")
+
+    def _render_sentence(
+        self,
+        index: int,
+        sentences: List[str],
+        temp_dir: Path,
+        speed: float = 1.0,
+        retime: bool = False,
+        cancel_token: Optional[CancelToken] = None,
+        nfe_step: Optional[int] = None
+    ) -> Path:
+        """Produce temp_sentence_<n>.wav for sentence `index` (from the cache when possible)"""
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        sentence = sentences[index]
+        print(f"\nProcessing sentence {index + 1}/{len(sentences)}: {sentence}")
+        temp_path = temp_dir / f"temp_sentence_{index + 1}.wav"
+
+        # Re-timing applies the speed to natural-speed audio instead of re-synthesizing
+        synthesize = self._retimed_sentence if retime else self._cached_sentence
+        synthesize(sentence, temp_path, speed=speed, cancel_token=cancel_token, nfe_step=nfe_step)
+        return temp_path
+
+    def _render_sentences(
+        self,
+        sentences: List[str],
+        temp_dir: Path,
+        speed: float = 1.0,
+        retime: bool = False,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        nfe_step: Optional[int] = None
+    ) -> List[Path]:
+        """Sentence WAVs in sentence order; one sentence at a time here"""
+        files = []
+        for i in range(len(sentences)):
+            if progress_callback is not None:
+                progress_callback(i, len(sentences))
+            files.append(self._render_sentence(i, sentences, temp_dir, speed, retime, cancel_token, nfe_step))
+        return files
+
+    def generate_audio(
+        self,
+        text: str,
+        output_path: str,
+        speed: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        retime: bool = False,
+        nfe_step: Optional[int] = None
+    ) -> str:
         try:
             # Create temp directory if it doesn't exist
             temp_dir = Path(output_path) / "temp"
@@ -92,67 +298,21 @@ class F5TTSService:
             sentences = re.split(r'(?<=[.!?]) +', text)
             sentences = [s.strip() for s in sentences if s.strip()]
             
-            audio_segments = []
+            sentence_files = self._render_sentences(
+                sentences, temp_dir, speed=speed, retime=retime,
+                cancel_token=cancel_token, progress_callback=progress_callback, nfe_step=nfe_step
+            )
             
-            for i, sentence in enumerate(sentences, 1):
-                print(f"\nProcessing sentence {i}/{len(sentences)}: {sentence}")
-                temp_path = temp_dir / f"temp_sentence_{i}.wav"
-                
-                # Get best reference for this sentence
-                ref = self.get_best_reference(sentence)
-                
-                # Build command for this sentence
-                cmd = [
-                    self.f5tts_cli,
-                    '--model', 'F5-TTS',
-                    '--ckpt_file', str(self.custom_model),
-                    '--vocab_file', str(self.custom_vocab),
-                    '--gen_text', sentence.lower().strip(),
-                    '--ref_text', ref['text'].lower().strip(),
-                    '--ref_audio', str(ref['audio_path']),
-                    '--vocoder_name', 'vocos',
-                    '--remove_silence', 'false',
-                    '--output_dir', str(temp_dir),
-                    '--speed', str(speed)
-                ]
-
-                print(f"Running command: {' '.join(cmd)}")
-                
-                # Run command with proper environment
-                env = os.environ.copy()
-                env['PYTHONIOENCODING'] = 'utf-8'
-                
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    encoding='utf-8',
-                    env=env
-                )
-                
-                if result.returncode != 0:
-                    print(f"Command STDOUT: {result.stdout}")
-                    print(f"Command STDERR: {result.stderr}")
-                    raise Exception(f"F5TTS command failed with return code {result.returncode}")
-
-                # Check if the output file exists
-                expected_output = temp_dir / "infer_cli_out.wav"
-                if not expected_output.exists():
-                    raise Exception(f"Output file not found at {expected_output}")
-
-                # Rename to our temp file name
-                expected_output.rename(temp_path)
-                
-                # Add to audio segments
-                audio_segments.append(AudioSegment.from_wav(str(temp_path)))
-            
-            # Combine all segments
-            combined_audio = sum(audio_segments)
+            # Combine all segments, in sentence order
+            combined_audio = sum(pydub.AudioSegment.from_wav(str(f)) for f in sentence_files)
             
             # Save final output
             output_file = Path(output_path) / "generated_audio.wav"
             combined_audio.export(str(output_file), format="wav")
             
+            # Keep the waveform in memory for the feature stages downstream
+            self._remember_waveform(output_file, combined_audio)
+            
             # Cleanup
             for file in temp_dir.glob("temp_sentence_*.wav"):
                 file.unlink()
@@ -162,4 +322,63 @@ class F5TTSService:
 
         except Exception as e:
             print(f"F5-TTS generation failed: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+
+class F5TTSInProcessService(F5TTSService):
+    """
+    F5-TTS with the model loaded once in this process (f5_tts.api) instead of
+    one CLI process per sentence, so model load and CUDA init are paid once.
+    Sentences are synthesized one at a time; cancellation takes effect
+    between sentences.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            from f5_tts.api import F5TTS
+            try:
+                self._model = F5TTS(model_type="F5-TTS", ckpt_file=str(self.custom_model),
+                                    vocab_file=str(self.custom_vocab), vocoder_name="vocos")
+            except TypeError:
+                # Newer f5-tts releases name the architecture with `model`
+                self._model = F5TTS(model="F5TTS_Base", ckpt_file=str(self.custom_model),
+                                    vocab_file=str(self.custom_vocab), vocoder_name="vocos")
+        return self._model
+
+    def load(self):
+        with self._model_lock:
+            self._get_model()
+
+    def verify_installation(self):
+        try:
+            import f5_tts.api  # noqa: F401
+            return True
+        except Exception as e:
+            print(f"F5TTS in-process verification failed: {e}")
+            return False
+
+    def _synthesize_sentence(
+        self,
+        sentence: str,
+        output_file: Path,
+        speed: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        nfe_step: Optional[int] = None
+    ):
+        ref = self.get_best_reference(sentence)
+        options = {"nfe_step": nfe_step} if nfe_step else {}
+        with self._model_lock:
+            self._get_model().infer(
+                ref_file=str(ref['audio_path']),
+                ref_text=ref['text'].lower().strip(),
+                gen_text=sentence.lower().strip(),
+                speed=speed,
+                remove_silence=False,
+                file_wave=str(output_file),
+                **options
+            )
@@ -0,0 +1,331 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.engines import TTSEngine, create_tts_engine
+from services.f5tts_service import F5TTSService
+from utils.job_manifest import RetryableStageError
+from utils.process_runner import CancelToken, ProcessCancelled, ProcessTimeout
+from utils.shared_buffers import JobBuffers, current_buffers
+
+# Worker pool sizing; 0 means tuned for the host (see tune_pool)
+POOL_SIZE = int(os.environ.get("ABICO_TTS_POOL_SIZE", 0))
+POOL_THREADS = int(os.environ.get("ABICO_TTS_POOL_THREADS", 0))
+# Resident memory of one worker with the F5-TTS model loaded
+WORKER_MEMORY_MB = float(os.environ.get("ABICO_TTS_WORKER_MB", 2500))
+
+
+def available_cpus() -> List[int]:
+    """CPUs this process may run on (respects affinity masks and cgroup cpusets)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def available_memory_mb() -> Optional[float]:
+    try:
+        import psutil
+        return psutil.virtual_memory().available / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def tune_pool(size: Optional[int] = None, threads: Optional[int] = None) -> Tuple[int, int]:
+    """
+    (workers, threads per worker) for this host.
+
+    CPU inference of one sentence stops scaling after a few threads, so the
+    cores are split into workers of up to 4 threads; the worker count is also
+    capped by the memory each loaded model needs.
+    """
+    cpus = len(available_cpus())
+    threads = threads or POOL_THREADS or min(4, max(1, cpus // 2))
+    if size or POOL_SIZE:
+        return size or POOL_SIZE, threads
+    size = max(1, cpus // threads)
+    memory = available_memory_mb()
+    if memory is not None:
+        size = max(1, min(size, int(memory // WORKER_MEMORY_MB)))
+    return size, threads
+
+
+def _pin(threads: Optional[int], cpus: Optional[Sequence[int]]):
+    """Limit math-library threads and CPU affinity of this process (before torch is imported)"""
+    if threads:
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[var] = str(threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
+def _serve(conn, engine_name: str, threads: Optional[int] = None, cpus: Optional[Sequence[int]] = None):
+    """Worker process loop: build the engine once, then answer requests until told to stop"""
+    _pin(threads, cpus)
+    engine = create_tts_engine(engine_name)
+    try:
+        engine.load()
+    except Exception as e:
+        # The same error reaches the caller with the first request
+        print(f"TTS worker could not preload its model: {e}")
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        method, kwargs = request
+        try:
+            buffer_root = kwargs.pop("buffer_root", None)
+            if method == "generate_audio":
+                kwargs["progress_callback"] = lambda i, n: conn.send(("progress", (i, n)))
+            result = getattr(engine, method)(**kwargs)
+            if buffer_root is not None:
+                # Hand the waveform back through the job's shared arena instead of the pipe
+                samples, sample_rate = engine.get_waveform(result)
+                result = (result, JobBuffers.attach(buffer_root).put("tts_waveform", samples), sample_rate)
+            conn.send(("result", result))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+    engine.close()
+
+
+class PersistentTTSService(TTSEngine):
+    """
+    TTS engine running in a long-lived worker process.
+
+    The worker loads the model once (an in-process engine) and then serves
+    requests over a pipe, so the model stays warm across jobs while crashes
+    and GPU memory stay out of the UI process. Requests are handled one at a
+    time. Cancellation or a stalled worker kills the process; the next request
+    starts a fresh one. Inside a job, the generated waveform comes back as a
+    shared-memory BufferRef, so get_waveform maps it instead of decoding the WAV.
+    """
+
+    def __init__(
+        self,
+        engine: str = "inprocess",
+        threads: Optional[int] = None,
+        cpus: Optional[Sequence[int]] = None,
+        name: str = "tts-worker"
+    ):
+        self.engine_name = engine
+        self.threads = threads
+        self.cpus = list(cpus) if cpus else None
+        self.name = name
+        # Seconds without any progress from the worker before it is considered stuck
+        self.timeout = float(os.environ.get("ABICO_TTS_TIMEOUT", 300))
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._waveforms = {}
+
+    def _ensure_started(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        self._conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_serve, args=(child_conn, self.engine_name, self.threads, self.cpus), name=self.name, daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        print(f"Started {self.name} (pid {self._process.pid}, engine '{self.engine_name}')")
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+        self._process = None
+        self._conn = None
+
+    def _call(self, method: str, cancel_token: Optional[CancelToken] = None,
+              progress_callback: Optional[Callable[[int, int], None]] = None, **kwargs):
+        with self._lock:
+            self._ensure_started()
+            try:
+                return self._exchange(method, kwargs, cancel_token, progress_callback)
+            except (EOFError, OSError) as e:
+                # The worker went away mid-request; the next call starts a new one
+                self._kill()
+                raise RetryableStageError(f"TTS worker process died: {e}") from e
+
+    def _exchange(self, method: str, kwargs: dict, cancel_token: Optional[CancelToken],
+                  progress_callback: Optional[Callable[[int, int], None]]):
+        self._conn.send((method, kwargs))
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if cancel_token is not None and cancel_token.cancelled:
+                self._kill()
+                raise ProcessCancelled("Job was cancelled")
+            if time.monotonic() > deadline:
+                self._kill()
+                raise ProcessTimeout(f"TTS worker made no progress for {self.timeout:g}s")
+            if not self._conn.poll(0.1):
+                if not self._process.is_alive():
+                    self._kill()
+                    raise RetryableStageError("TTS worker process died")
+                continue
+
+            kind, value = self._conn.recv()
+            if kind == "progress":
+                deadline = time.monotonic() + self.timeout
+                if progress_callback is not None:
+                    progress_callback(*value)
+            elif kind == "result":
+                return value
+            else:
+                raise Exception(value)
+
+    def verify_installation(self) -> bool:
+        try:
+            return bool(self._call("verify_installation"))
+        except Exception as e:
+            print(f"Persistent TTS worker verification failed: {e}")
+            return False
+
+    def generate_audio(
+        self,
+        text: str,
+        output_path: str,
+        speed: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        retime: bool = False,
+        nfe_step: Optional[int] = None
+    ) -> str:
+        buffers = current_buffers()
+        result = self._call(
+            "generate_audio",
+            cancel_token=cancel_token,
+            progress_callback=progress_callback,
+            text=text,
+            output_path=str(output_path),
+            speed=speed,
+            retime=retime,
+            nfe_step=nfe_step,
+            buffer_root=str(buffers.root) if buffers is not None else None
+        )
+        if buffers is None:
+            # A stale mapping must not shadow the newly written file
+            self._waveforms.pop(str(Path(result).absolute()), None)
+            return result
+        audio_path, ref, sample_rate = result
+        # The mapping stays valid after the job's arena is removed, until it is evicted here
+        with self._lock:
+            self._waveforms[str(Path(audio_path).absolute())] = (ref.open(), sample_rate)
+            while len(self._waveforms) > 4:
+                self._waveforms.pop(next(iter(self._waveforms)))
+        return audio_path
+
+    def get_waveform(self, audio_path: str) -> Tuple[np.ndarray, int]:
+        cached = self._waveforms.get(str(Path(audio_path).absolute()))
+        if cached is not None:
+            return cached
+        return super().get_waveform(audio_path)
+
+    def close(self):
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                self._conn.send(None)
+                self._process.join(timeout=10)
+            self._kill()
+
+
+class PooledTTSService(F5TTSService):
+    """
+    F5-TTS on a pool of warm worker processes, for hosts without a GPU.
+
+    Each worker loads the model once, with its own thread count and pinned
+    cores; the sentences of a job are synthesized in parallel across the pool
+    and reassembled in order. Sentence caching and re-timing work as in
+    F5TTSService. Concurrent jobs share the pool.
+    """
+
+    def __init__(self, size: Optional[int] = None, threads: Optional[int] = None, engine: str = "inprocess"):
+        super().__init__()
+        self.size, self.threads = tune_pool(size, threads)
+        cpus = available_cpus()
+        # Pin only when every worker gets cores of its own
+        pinned = len(cpus) >= self.size * self.threads
+        self.workers = [
+            PersistentTTSService(
+                engine,
+                threads=self.threads,
+                cpus=cpus[i * self.threads:(i + 1) * self.threads] if pinned else None,
+                name=f"tts-worker-{i}"
+            )
+            for i in range(self.size)
+        ]
+        self._idle: "queue.Queue[PersistentTTSService]" = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+        print(f"TTS worker pool: {self.size} workers x {self.threads} threads{' (pinned)' if pinned else ''}")
+
+    def verify_installation(self) -> bool:
+        # Starts every worker (each loads its model) in parallel
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return all(executor.map(lambda worker: worker.verify_installation(), self.workers))
+
+    def _synthesize_sentence(
+        self,
+        sentence: str,
+        output_file: Path,
+        speed: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        nfe_step: Optional[int] = None
+    ):
+        worker = self._idle.get()
+        try:
+            worker._call(
+                "_synthesize_sentence",
+                cancel_token=cancel_token,
+                sentence=sentence,
+                output_file=Path(output_file),
+                speed=speed,
+                nfe_step=nfe_step
+            )
+        finally:
+            self._idle.put(worker)
+
+    def _render_sentences(
+        self,
+        sentences: List[str],
+        temp_dir: Path,
+        speed: float = 1.0,
+        retime: bool = False,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        nfe_step: Optional[int] = None
+    ) -> List[Path]:
+        done = []
+        done_lock = threading.Lock()
+
+        def render(index: int) -> Path:
+            path = self._render_sentence(index, sentences, temp_dir, speed, retime, cancel_token, nfe_step)
+            with done_lock:
+                done.append(index)
+                if progress_callback is not None:
+                    progress_callback(len(done), len(sentences))
+            return path
+
+        if progress_callback is not None:
+            progress_callback(0, len(sentences))
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(render, range(len(sentences))))
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
@@ -0,0 +1,133 @@
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from services.engines import LipSyncEngine, TTSEngine
+from utils.long_form import estimate_duration
+from utils.media_info import probe_media
+from utils.process_runner import CancelToken
+from utils.still_image import STILL_FPS, is_still_image, write_still_video
+from utils.startup import lazy_import
+
+soundfile = lazy_import("soundfile")
+
+# Seconds of processing per second of output (real-time factors of the stand-ins)
+TTS_RTF = float(os.environ.get("ABICO_STAND_IN_TTS_RTF", 0.3))
+LIPSYNC_RTF = float(os.environ.get("ABICO_STAND_IN_LIPSYNC_RTF", 1.0))
+
+
+def _sleep(seconds: float, cancel_token: Optional[CancelToken]):
+    """Sleep in small steps so cancellation is honoured like a killed subprocess"""
+    deadline = time.perf_counter() + seconds
+    while True:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, 0.05))
+
+
+class StandInTTSService(TTSEngine):
+    """
+    Model-free stand-in for F5TTSService, for load tests and orchestration work.
+
+    Produces a quiet tone of the estimated speaking length per sentence (with
+    short pauses between sentences) after sleeping TTS_RTF times that length.
+    """
+
+    sample_rate = 24000
+
+    def __init__(self):
+        self._waveforms = {}
+        self._waveforms_lock = threading.Lock()
+
+    def generate_audio(
+        self,
+        text: str,
+        output_path: str,
+        speed: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        retime: bool = False,
+        nfe_step: Optional[int] = None
+    ) -> str:
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?]) +', text) if s.strip()]
+        pause = np.zeros(int(0.3 * self.sample_rate), dtype=np.float32)
+        pieces = []
+        for i, sentence in enumerate(sentences, 1):
+            if progress_callback is not None:
+                progress_callback(i - 1, len(sentences))
+            seconds = max(estimate_duration(sentence) / speed, 0.5)
+            _sleep(seconds * TTS_RTF, cancel_token)
+            t = np.arange(int(seconds * self.sample_rate)) / self.sample_rate
+            pieces.extend([(0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), pause])
+
+        samples = np.concatenate(pieces) if pieces else pause
+        output_file = Path(output_path) / "generated_audio.wav"
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        soundfile.write(str(output_file), samples, self.sample_rate, subtype="PCM_16")
+        with self._waveforms_lock:
+            self._waveforms[str(output_file.absolute())] = (samples, self.sample_rate)
+            while len(self._waveforms) > 4:
+                self._waveforms.pop(next(iter(self._waveforms)))
+        return str(output_file)
+
+    def get_waveform(self, audio_path: str) -> Tuple[np.ndarray, int]:
+        key = str(Path(audio_path).absolute())
+        with self._waveforms_lock:
+            cached = self._waveforms.get(key)
+        if cached is not None:
+            return cached
+        samples, sample_rate = soundfile.read(key, dtype="float32")
+        return samples, sample_rate
+
+
+class StandInWav2LipService(LipSyncEngine):
+    """
+    Model-free stand-in for Wav2LipService: returns the input video unchanged
+    (a still image as a video of the audio's length) after LIPSYNC_RTF times
+    its duration, reporting frame progress. Runs are serialized like the real
+    Easy-Wav2Lip CLI.
+    """
+
+    def __init__(self):
+        self._run_lock = threading.Lock()
+
+    def generate_talking_avatar(
+        self,
+        video_path: str,
+        audio_path: str,
+        output_path: str,
+        mel_windows=None,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        **kwargs
+    ) -> str:
+        if is_still_image(video_path):
+            duration = probe_media(audio_path).duration or 1.0
+            total = int(duration * STILL_FPS)
+        else:
+            info = probe_media(video_path)
+            duration = info.duration or 1.0
+            total = info.frame_count or int(duration * float(info.fps or 25))
+        seconds = duration * LIPSYNC_RTF
+        with self._run_lock:
+            steps = 10
+            for step in range(1, steps + 1):
+                _sleep(seconds / steps, cancel_token)
+                if progress_callback is not None:
+                    progress_callback(total * step // steps, total, "")
+            output_path = Path(output_path)
+            output_path.parent.mkdir(exist_ok=True, parents=True)
+            if is_still_image(video_path):
+                write_still_video(video_path, total, str(output_path))
+            else:
+                shutil.copy2(video_path, output_path)
+        return str(output_path)
@@ -1,14 +1,34 @@
 import os
 import configparser
-import subprocess
+import pickle
 from pathlib import Path
 import shutil
 import uuid
 import sys
 import platform
-import ffmpeg
+import threading
+from collections import deque
+from typing import Callable, Optional
+from services.engines import LipSyncEngine
+from utils.media_info import probe_media
+from utils.process_runner import CancelToken, parse_progress, run_process
+from utils.startup import lazy_import
 
-class Wav2LipService:
+ffmpeg = lazy_import("ffmpeg")
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
+# How faces are found: "sparse" pre-writes Easy-Wav2Lip's tracking data from
+# keyframe detection and tracking, "full" lets Easy-Wav2Lip detect every frame
+FACE_DETECTION = os.environ.get("ABICO_FACE_DETECTION", "sparse")
+# Easy-Wav2Lip's face tracking cache, and the input it belongs to (run.py
+# drops the cache when last_file.txt names another input)
+TRACKING_FILE = "last_detected_face.pkl"
+TRACKED_INPUT_FILE = "last_file.txt"
+# Easy-Wav2Lip's box smoothing window (used when nosmooth is off)
+SMOOTH_FRAMES = 5
+
+class Wav2LipService(LipSyncEngine):
     def __init__(self):
         # Find the project root directory
         self.project_root = Path(os.path.dirname(os.path.abspath(__file__))).parent
@@ -24,14 +44,28 @@ class Wav2LipService:
         self.wrapper_script = self.wav2lip_dir / ("run_wav2lip.bat" if platform.system() == "Windows" else "run_wav2lip.sh")
         if not self.wrapper_script.exists():
             self._create_wrapper_script()
-            
-        # Verify ffmpeg is available
+
+        # Serializes runs of the shared Easy-Wav2Lip working directory
+        self._run_lock = threading.Lock()
+        
+        # Deadline for a whole Wav2Lip run (seconds)
+        self.timeout = float(os.environ.get("ABICO_LIPSYNC_TIMEOUT", 1800))
+
+    def verify_installation(self):
+        """Verify ffmpeg is available (can run in the background after startup)"""
         try:
             # Try to run a simple ffmpeg command
             ffmpeg.input('dummy').output('dummy.mp4').overwrite_output().run(capture_stdout=True, capture_stderr=True)
             print("Python ffmpeg library is available")
         except Exception as e:
             print(f"Warning: Python ffmpeg library error: {str(e)}")
+        return True
+
+    @staticmethod
+    def _log_line(stream: str, line: str):
+        """Print Wav2Lip output as it arrives, skipping progress-bar redraws"""
+        if parse_progress(line) is None:
+            print(f"Wav2Lip {stream.upper()}: {line}")
 
     def _create_wrapper_script(self):
         """Create a wrapper script for Wav2Lip that sets the PATH correctly"""
@@ -50,55 +84,152 @@ class Wav2LipService:
         # Make sure the script is executable
         os.chmod(self.wrapper_script, 0o755)
 
-    def generate_talking_avatar(self, video_path: str, audio_path: str, output_path: str, **kwargs) -> str:
+    def generate_talking_avatar(
+        self,
+        video_path: str,
+        audio_path: str,
+        output_path: str,
+        mel_windows=None,
+        cancel_token: Optional[CancelToken] = None,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        **kwargs
+    ) -> str:
+        # `mel_windows` ((frames, 80, 16) array) is accepted so all lip-sync
+        # backends share one signature; the Easy-Wav2Lip CLI recomputes its own
         try:
-            # Create config.ini with our parameters
-            config_path = self.wav2lip_dir / "config.ini"
-            self._create_config(config_path, video_path=video_path, audio_path=audio_path, **kwargs)
+            # Easy-Wav2Lip reads one config.ini and writes one temp/output.mp4 in its
+            # own directory, so concurrent jobs take turns on the CLI
+            with self._run_lock:
+                # Create config.ini with our parameters
+                config_path = self.wav2lip_dir / "config.ini"
+                self._create_config(config_path, video_path=video_path, audio_path=audio_path, **kwargs)
+                self._write_tracking_data(video_path, **kwargs)
             
-            # Use the wrapper script instead of running Python directly
-            cmd = [str(self.wrapper_script)]
+                # Use the wrapper script instead of running Python directly
+                cmd = [str(self.wrapper_script)]
             
-            print(f"Running command: {' '.join(cmd)}")
+                print(f"Running command: {' '.join(cmd)}")
             
-            # Check if the input video exists and get its details using python-ffmpeg
-            try:
-                # Use ffmpeg.probe to get video info
-                probe = ffmpeg.probe(video_path)
-                video_info = next(s for s in probe['streams'] if s['codec_type'] == 'video')
-                print(f"Video info: {video_info}")
-            except Exception as e:
-                print(f"Warning: Could not probe video with python-ffmpeg: {str(e)}")
+                # Check if the input video exists and get its details (cached per file)
+                try:
+                    video_info = probe_media(video_path)
+                    print(f"Video info: {video_info}")
+                except Exception as e:
+                    print(f"Warning: Could not probe video: {str(e)}")
             
-            result = subprocess.run(cmd, 
-                                  cwd=str(self.wav2lip_dir),
-                                  capture_output=True, 
-                                  text=True, 
-                                  encoding='utf-8')
-
-            print(f"Wav2Lip STDOUT: {result.stdout}")
-            print(f"Wav2Lip STDERR: {result.stderr}")
+                # Stream Wav2Lip's output (tqdm frame counters become progress updates)
+                # and kill its process group on timeout or cancellation
+                result = run_process(cmd,
+                                     cwd=str(self.wav2lip_dir),
+                                     timeout=self.timeout,
+                                     cancel_token=cancel_token,
+                                     on_line=self._log_line,
+                                     on_progress=progress_callback)
 
-            if result.returncode != 0:
-                raise Exception(f"Wav2Lip failed with code {result.returncode}")
+                if result.returncode != 0:
+                    print(f"Wav2Lip STDOUT (tail): {result.stdout}")
+                    print(f"Wav2Lip STDERR (tail): {result.stderr}")
+                    # Include the last error line so failures can be classified (e.g. no face found)
+                    last_error = result.stderr_tail[-1] if result.stderr_tail else ""
+                    raise Exception(f"Wav2Lip failed with code {result.returncode}: {last_error}")
                 
-            # Find the output file from Wav2Lip's temp directory
-            temp_output = self.temp_dir / "output.mp4"
-            if not temp_output.exists():
-                raise FileNotFoundError(f"Wav2Lip output not found at {temp_output}")
+                # Find the output file from Wav2Lip's temp directory
+                temp_output = self.temp_dir / "output.mp4"
+                if not temp_output.exists():
+                    raise FileNotFoundError(f"Wav2Lip output not found at {temp_output}")
 
-            # Copy the file to the specified output path
-            output_path = Path(output_path)
-            output_path.parent.mkdir(exist_ok=True, parents=True)
-            shutil.copy2(temp_output, output_path)
-            print(f"Copied Wav2Lip output to: {output_path}")
+                # Copy the file to the specified output path
+                output_path = Path(output_path)
+                output_path.parent.mkdir(exist_ok=True, parents=True)
+                shutil.copy2(temp_output, output_path)
+                print(f"Copied Wav2Lip output to: {output_path}")
 
-            return str(output_path)
+                return str(output_path)
 
         except Exception as e:
             print(f"Wav2Lip generation failed: {str(e)}")
             raise
 
+    def _write_tracking_data(self, video_path: str, face_box=None, **kwargs) -> bool:
+        """
+        Pre-write Easy-Wav2Lip's face tracking cache, so its CLI skips the
+        per-frame detector: boxes come from sparse keyframe detection and
+        tracking, or from `face_box` (a box already found on a still image).
+
+        The cache holds what Easy-Wav2Lip's own detection would: face crops of
+        the frames scaled to `output_height`, with its pads and (unless
+        nosmooth) box smoothing applied. Frames are streamed; only the crops
+        are kept.
+
+        Returns False when Easy-Wav2Lip has to detect faces itself (full
+        detection mode, or no dlib installed); a stale cache of another
+        input is removed either way.
+        """
+        from utils.face_tracker import create_tracker, track_video
+        from utils.still_image import StillFrameSource, is_still_image
+
+        tracking_file = self.wav2lip_dir / TRACKING_FILE
+        tracking_file.unlink(missing_ok=True)
+        if FACE_DETECTION != "sparse":
+            return False
+
+        tracker = None
+        if face_box is not None and is_still_image(video_path):
+            tracked = [(StillFrameSource(video_path).frame, face_box)]
+        else:
+            try:
+                tracker = create_tracker(self.wav2lip_dir / "checkpoints")
+            except ImportError:
+                print("dlib is not installed; Easy-Wav2Lip detects faces on every frame")
+                return False
+            tracked = ((frame, track.box) for frame, track in track_video(video_path, tracker))
+
+        # Easy-Wav2Lip scales every frame to output_height before detection
+        output_height = str(kwargs.get('output_height', 'full resolution'))
+        out_height = int(output_height) if output_height.isdigit() else None
+        pads = np.array([-kwargs.get('pad_left', 0), -kwargs.get('pad_up', 0),
+                         kwargs.get('pad_right', 0), kwargs.get('pad_down', 0)], dtype=int)
+        window = 1 if kwargs.get('nosmooth', True) else SMOOTH_FRAMES
+
+        # Frames wait here until the boxes of their smoothing window are known
+        pending = deque()
+        boxes = []
+        results = []
+
+        def crop(index: int, window_boxes):
+            # Smoothed in place on integer boxes, like Easy-Wav2Lip's get_smoothened_boxes
+            boxes[index] = np.mean(window_boxes, axis=0).astype(int)
+            x1, y1, x2, y2 = boxes[index].tolist()
+            results.append([pending.popleft()[y1:y2, x1:x2].copy(), (y1, y2, x1, x2)])
+
+        for index, (frame, box) in enumerate(tracked):
+            if box is None:
+                raise ValueError(f"Face not detected in frame {index} of {video_path}")
+            h, w = frame.shape[:2]
+            box = np.array(box, dtype=np.float64)
+            if out_height is not None and out_height != h:
+                size = (int(out_height * w / h), out_height)
+                box *= [size[0] / w, size[1] / h] * 2
+                frame = cv2.resize(frame, size)
+                h, w = frame.shape[:2]
+            # Pads are clipped to the frame before smoothing, as Easy-Wav2Lip does
+            boxes.append(np.clip(box.astype(int) + pads, 0, [w, h, w, h]))
+            pending.append(frame)
+            if len(pending) == window:
+                crop(len(boxes) - window, boxes[-window:])
+
+        # The last frames are smoothed over the final window
+        for index in range(len(boxes) - len(pending), len(boxes)):
+            crop(index, boxes[-window:])
+        if tracker is not None:
+            print(f"Face tracking: {tracker.stats.detections} detections for {tracker.stats.frames} frames")
+
+        with open(tracking_file, "wb") as f:
+            pickle.dump(results, f)
+        with open(self.wav2lip_dir / TRACKED_INPUT_FILE, "w", encoding="utf-8") as f:
+            f.write(str(video_path))
+        return True
+
     def _create_config(self, config_path: Path, **kwargs):
         """Create config.ini file for Wav2Lip"""
         # Map quality values to correct format
@@ -117,7 +248,7 @@ class Wav2LipService:
             'video_file': kwargs['video_path'],
             'vocal_file': kwargs['audio_path'],
             'quality': mapped_quality,  # Use mapped quality value
-            'output_height': 'full resolution',
+            'output_height': str(kwargs.get('output_height', 'full resolution')),
             'wav2lip_version': kwargs.get('wav2lip_version', 'Wav2Lip'),
             'use_previous_tracking_data': 'True',
             'nosmooth': str(kwargs.get('nosmooth', True)).lower(),
@@ -6,6 +6,7 @@ import dlib
 import gdown
 import pickle
 import re
+from fractions import Fraction
 from models import Wav2Lip
 from base64 import b64encode
 from urllib.parse import urlparse
@@ -15,34 +16,36 @@ from IPython.display import HTML, display
 device = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
 
 
+# This file runs from the Easy-Wav2Lip directory, so it cannot use the app's
+# utils.media_info; one ffprobe per file is cached here instead
+_probe_cache = {}
+
+
+def _probe(filename):
+    st = os.stat(filename)
+    key = (os.path.abspath(filename), st.st_mtime_ns, st.st_size)
+    if key not in _probe_cache:
+        cmd = ["ffprobe", "-v", "error", "-show_format", "-show_streams", "-of", "json", filename]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _probe_cache[key] = json.loads(result.stdout)
+    return _probe_cache[key]
+
+
 def get_video_details(filename):
-    cmd = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-show_format",
-        "-show_streams",
-        "-of",
-        "json",
-        filename,
-    ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    info = json.loads(result.stdout)
-
-    # Get video stream
+    info = _probe(filename)
     video_stream = next(
-        stream for stream in info["streams"] if stream["codec_type"] == "video"
+        (stream for stream in info["streams"] if stream["codec_type"] == "video"), None
     )
+    if video_stream is None:
+        raise ValueError(f"No video stream found in {filename}")
 
-    # Get resolution
     width = int(video_stream["width"])
     height = int(video_stream["height"])
-    resolution = width * height
 
-    # Get fps
-    fps = eval(video_stream["avg_frame_rate"])
+    # "30000/1001" style rate, parsed without eval(); callers expect a float
+    num, _, den = video_stream["avg_frame_rate"].partition("/")
+    fps = float(Fraction(int(num), int(den or 1))) if int(den or 1) else 0.0
 
-    # Get length
     length = float(info["format"]["duration"])
 
     return width, height, fps, length
@@ -115,21 +118,7 @@ def load_model(path):
 
 
 def get_input_length(filename):
-    result = subprocess.run(
-        [
-            "ffprobe",
-            "-v",
-            "error",
-            "-show_entries",
-            "format=duration",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
-            filename,
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
-    return float(result.stdout)
+    return float(_probe(filename)["format"]["duration"])
 
 
 def is_url(string):
@@ -0,0 +1,305 @@
+"""Tests for the job queue and job store, and the pure helpers of the render pipeline"""
+import time
+from fractions import Fraction
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import TalkingAvatarService
+from utils import job_queue, job_store
+from utils.frame_pipeline import loop_index
+from utils.job_manifest import JobManifest
+from utils.job_queue import SQLiteJobQueue
+from utils.job_store import JobStore
+from utils.long_form import estimate_duration, segment_script
+from utils.media_info import parse_frame_rate
+from utils.silence import BLEND_FRAMES, silent_frames, speech_spans
+from utils.time_stretch import time_stretch
+
+# Lease short enough to expire within a test
+SHORT_LEASE = 0.05
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(tmp_path / "queue.db", max_attempts=3)
+
+
+def expire():
+    time.sleep(SHORT_LEASE * 2)
+
+
+# Job queue
+
+def test_lease_is_exclusive_until_it_expires(queue):
+    job_id = queue.put({"text": "hi"})
+    job = queue.lease("a", SHORT_LEASE)
+    assert job.job_id == job_id and job.worker_id == "a" and job.attempts == 1
+    assert job.payload == {"text": "hi"}
+    assert queue.lease("b", 60) is None
+
+    expire()
+    job = queue.lease("b", 60)
+    assert job.job_id == job_id and job.worker_id == "b" and job.attempts == 2
+
+
+def test_stale_worker_is_rejected_after_redelivery(queue):
+    job_id = queue.put({})
+    queue.lease("a", SHORT_LEASE)
+    expire()
+    queue.lease("b", 60)
+
+    assert not queue.heartbeat(job_id, "a", 60)
+    queue.complete(job_id, "a", {"video_path": "stale.mp4"})
+    assert queue.get(job_id).status == job_queue.LEASED
+
+    assert queue.heartbeat(job_id, "b", 60, progress=0.5)
+    assert queue.get(job_id).progress == 0.5
+    queue.complete(job_id, "b", {"video_path": "out.mp4"})
+    job = queue.get(job_id)
+    assert job.status == job_queue.DONE and job.result == {"video_path": "out.mp4"}
+
+
+def test_lost_leases_stop_at_max_attempts(queue):
+    job_id = queue.put({})
+    for worker in ("a", "b", "c"):
+        assert queue.lease(worker, SHORT_LEASE) is not None
+        expire()
+    assert queue.lease("d", 60) is None
+    job = queue.get(job_id)
+    assert job.status == job_queue.FAILED and job.error == "Worker lost too many times"
+
+
+def test_failures_are_retried_until_max_attempts(queue):
+    job_id = queue.put({})
+    for attempt in range(1, 3):
+        queue.lease("a", 60)
+        queue.fail(job_id, "a", f"error {attempt}")
+        assert queue.get(job_id).status == job_queue.QUEUED
+    queue.lease("a", 60)
+    queue.fail(job_id, "a", "error 3")
+    job = queue.get(job_id)
+    assert job.status == job_queue.FAILED and job.error == "error 3"
+
+
+def test_fatal_failure_is_not_retried(queue):
+    job_id = queue.put({})
+    queue.lease("a", 60)
+    queue.fail(job_id, "a", "no face", retryable=False)
+    assert queue.get(job_id).status == job_queue.FAILED
+
+
+def test_cancel_queued_job(queue):
+    job_id = queue.put({})
+    queue.cancel(job_id)
+    assert queue.get(job_id).status == job_queue.CANCELLED
+    assert queue.lease("a", 60) is None
+
+
+def test_cancel_leased_job(queue):
+    job_id = queue.put({})
+    queue.lease("a", 60)
+    queue.cancel(job_id)
+    job = queue.get(job_id)
+    assert job.status == job_queue.LEASED and job.cancel_requested
+
+    # The worker learns about it at its next heartbeat and gives the job up
+    assert not queue.heartbeat(job_id, "a", 60)
+    queue.fail(job_id, "a", "Cancelled")
+    assert queue.get(job_id).status == job_queue.CANCELLED
+
+
+def test_cancelled_job_of_a_lost_worker_is_not_redelivered(queue):
+    job_id = queue.put({})
+    queue.lease("a", SHORT_LEASE)
+    queue.cancel(job_id)
+    expire()
+    assert queue.lease("b", 60) is None
+    assert queue.get(job_id).status == job_queue.CANCELLED
+
+
+# Job store and recovery
+
+def test_unfinished_jobs(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    store.start_job("done", "generate_talking_avatar", {"text": "a"}, {"arguments": {}})
+    store.start_job("crashed", "generate_talking_avatar", {"text": "b"}, {"arguments": {}})
+    store.record_stage("crashed", "lipsync", {"status": "running", "attempts": 1})
+    store.finish_job("done", job_store.DONE, result="out.mp4")
+
+    unfinished = store.unfinished()
+    assert [job["job_id"] for job in unfinished] == ["crashed"]
+    assert unfinished[0]["stage"] == "lipsync"
+
+    # A resumed run is a new run of the same job
+    store.start_job("crashed", "generate_talking_avatar", {"text": "b"}, {"arguments": {}})
+    assert store.get("crashed")["runs"] == 2
+
+
+def test_recover_unfinished_jobs(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    avatar = tmp_path / "avatar.mp4"
+    avatar.write_bytes(b"")
+    store.start_job("resumable", "generate_talking_avatar",
+                    {"text": "hello", "avatar_image": str(avatar)}, {"arguments": {"speed": 1.5}})
+    store.start_job("orphaned", "generate_talking_avatar",
+                    {"text": "hello", "avatar_image": str(tmp_path / "gone.mp4")}, {"arguments": {}})
+
+    calls = []
+    service = SimpleNamespace(job_store=store, generate_talking_avatar=lambda **kwargs: calls.append(kwargs))
+    recovered = TalkingAvatarService.recover_unfinished_jobs(service)
+
+    assert recovered == ["resumable"]
+    assert calls == [{"text": "hello", "avatar_image": str(avatar), "speed": 1.5, "job_id": "resumable"}]
+    assert store.get("orphaned")["status"] == job_store.FAILED
+
+
+# Job manifest checkpoints
+
+def test_manifest_checkpoint_keys(tmp_path):
+    output = tmp_path / "audio.wav"
+    runs = []
+
+    def stage():
+        runs.append(1)
+        output.write_bytes(b"")
+        return {"audio_path": str(output), "sample_rate": 24000}
+
+    manifest = JobManifest(tmp_path / "job", "job")
+    manifest.run_stage("tts", stage, key="a")
+    manifest.run_stage("tts", stage, key="a")
+    assert len(runs) == 1
+
+    # Checkpoints survive a restart
+    assert JobManifest(tmp_path / "job", "job").is_done("tts", "a")
+
+    # Other settings, or a deleted output, re-run the stage
+    manifest.run_stage("tts", stage, key="b")
+    assert len(runs) == 2
+    output.unlink()
+    assert not manifest.is_done("tts", "b")
+    manifest.run_stage("tts", stage, key="b")
+    assert len(runs) == 3
+    assert manifest.first_incomplete_stage(["tts", "lipsync"]) == "lipsync"
+
+
+def test_failed_stage_is_not_done(tmp_path):
+    manifest = JobManifest(tmp_path / "job", "job")
+
+    def stage():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        manifest.run_stage("tts", stage)
+    assert manifest.stages["tts"]["status"] == "failed"
+    assert manifest.first_incomplete_stage(["tts"]) == "tts"
+
+
+# Avatar loop
+
+def test_loop_index_ping_pongs():
+    assert [loop_index(i, 4) for i in range(10)] == [0, 1, 2, 3, 2, 1, 0, 1, 2, 3]
+    assert [loop_index(i, 2) for i in range(4)] == [0, 1, 0, 1]
+    assert [loop_index(i, 1) for i in range(3)] == [0, 0, 0]
+
+
+# Silence detection
+
+def _speech_and_silence(pattern, sample_rate=16000):
+    """One second of tone (1) or silence (0) per entry"""
+    t = np.arange(sample_rate) / sample_rate
+    tone = 0.5 * np.sin(2 * np.pi * 220 * t)
+    return np.concatenate([tone if speech else np.zeros(sample_rate) for speech in pattern])
+
+
+def test_silent_span_is_padded_towards_speech():
+    mask = silent_frames(_speech_and_silence([1, 0, 1]), 16000, 25, 75)
+    silent = np.flatnonzero(mask)
+    assert silent[0] == 25 + BLEND_FRAMES and silent[-1] == 50 - BLEND_FRAMES - 1
+    assert speech_spans(mask) == [(0, 25 + BLEND_FRAMES), (50 - BLEND_FRAMES, 75)]
+
+
+def test_short_silence_is_merged_into_speech():
+    wav = _speech_and_silence([1, 1])
+    wav[16000:16000 + 3200] = 0  # 0.2 s pause
+    mask = silent_frames(wav, 16000, 25, 50)
+    assert not mask.any()
+    assert speech_spans(mask) == [(0, 50)]
+
+
+def test_silence_at_the_edges_is_not_padded():
+    # Frames past the end of the audio are silent too
+    mask = silent_frames(_speech_and_silence([0, 1]), 16000, 25, 75)
+    assert speech_spans(mask) == [(25 - BLEND_FRAMES, 50 + BLEND_FRAMES)]
+
+
+def test_all_silent_audio():
+    assert silent_frames(np.zeros(16000), 16000, 25, 25).all()
+    assert speech_spans(np.ones(25, dtype=bool)) == []
+
+
+# Long-form scenes
+
+def test_segment_script_packs_sentences():
+    sentence = "This sentence has exactly seven words in it."
+    text = " ".join([sentence] * 20)
+    scenes = segment_script(text, target_seconds=10)
+    assert len(scenes) > 1
+    assert " ".join(scenes) == text
+    assert all(estimate_duration(scene) <= 10 for scene in scenes)
+
+
+def test_segment_script_paragraphs_and_long_sentences():
+    short = "One two three four five six seven eight nine ten."
+    long = " ".join(["word"] * 60) + "."
+    scenes = segment_script(f"{short} {short} {short}\n\n{short}\n\n{long}", target_seconds=20)
+    # A paragraph break closes a scene of at least half the target
+    assert scenes[0] == f"{short} {short} {short}"
+    # A sentence over the target is a scene of its own, never split
+    assert scenes[-1] == long
+    assert segment_script("  \n\n ") == []
+
+
+# Media info
+
+@pytest.mark.parametrize("value, expected", [
+    ("30000/1001", Fraction(30000, 1001)),
+    ("25", Fraction(25)),
+    ("25/1", Fraction(25)),
+    (29.97, Fraction(2997, 100)),
+    (24, Fraction(24)),
+    ("0/0", None),
+    ("-25", None),
+    ("n/a", None),
+    (None, None),
+])
+def test_parse_frame_rate(value, expected):
+    assert parse_frame_rate(value) == expected
+
+
+# Time stretch
+
+def _dominant_frequency(wav, sample_rate):
+    spectrum = np.abs(np.fft.rfft(wav * np.hanning(len(wav))))
+    return np.fft.rfftfreq(len(wav), 1 / sample_rate)[np.argmax(spectrum)]
+
+
+@pytest.mark.parametrize("speed", [0.75, 1.5, 2.0])
+def test_time_stretch_changes_length_not_pitch(speed):
+    sample_rate = 16000
+    t = np.arange(2 * sample_rate) / sample_rate
+    wav = 0.5 * np.sin(2 * np.pi * 220 * t).astype(np.float32)
+
+    stretched = time_stretch(wav, sample_rate, speed)
+    assert stretched.dtype == np.float32
+    assert abs(len(stretched) - len(wav) / speed) <= 1
+    assert abs(_dominant_frequency(stretched, sample_rate) - 220) < 5
+
+
+def test_time_stretch_edge_cases():
+    wav = np.random.default_rng(0).standard_normal((8000, 2)).astype(np.float32)
+    np.testing.assert_array_equal(time_stretch(wav, 16000, 1.0), wav)
+    assert time_stretch(wav, 16000, 2.0).shape == (4000, 2)
+    with pytest.raises(ValueError):
+        time_stretch(wav, 16000, 0)
@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from fractions import Fraction
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+from utils.startup import lazy_import
+
+signal = lazy_import("scipy.signal")
+soundfile = lazy_import("soundfile")
+
+# Wav2Lip's audio front end works at 16 kHz
+LIPSYNC_RATE = 16000
+
+
+@dataclass
+class ConditionedAudio:
+    """TTS audio at its native rate (for the final mux) and at the lip-sync rate (for mel features)"""
+    tts_wav: np.ndarray
+    tts_rate: int
+    lipsync_wav: np.ndarray
+    lipsync_rate: int = LIPSYNC_RATE
+
+    @property
+    def duration(self) -> float:
+        return len(self.tts_wav) / float(self.tts_rate)
+
+    def save_lipsync(self, path: Path) -> str:
+        """Write the lip-sync rate version as a 16-bit WAV (for file-based lip-sync backends)"""
+        soundfile.write(str(path), self.lipsync_wav, self.lipsync_rate, subtype="PCM_16")
+        return str(Path(path).absolute())
+
+
+def load_lipsync_audio(path: str) -> Tuple[np.ndarray, int]:
+    """Read back a WAV written by ConditionedAudio.save_lipsync"""
+    wav, rate = soundfile.read(str(path), dtype="float32")
+    return wav, rate
+
+
+def resample(wav: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """
+    Polyphase resampling with a long Kaiser-windowed anti-aliasing FIR
+    (24 kHz -> 16 kHz is a 2/3 ratio; aliasing is suppressed well below -90 dB)
+    """
+    if source_rate == target_rate:
+        return wav
+    ratio = Fraction(target_rate, source_rate)
+    up, down = ratio.numerator, ratio.denominator
+    taps = 2 * 32 * max(up, down) + 1
+    fir = signal.firwin(taps, 0.95 / max(up, down), window=("kaiser", 10.0)) * up
+    return signal.resample_poly(wav, up, down, window=fir).astype(np.float32)
+
+
+def condition_audio(wav: np.ndarray, sample_rate: int, lipsync_rate: int = LIPSYNC_RATE) -> ConditionedAudio:
+    """
+    Audio-conditioning stage: downmix to mono and resample once, in memory.
+
+    Args:
+        wav: TTS waveform (mono or channels-last), float samples in [-1, 1]
+        sample_rate: TTS output rate (24 kHz for F5-TTS with vocos)
+        lipsync_rate: Rate of the lip-sync audio front end
+
+    Returns:
+        ConditionedAudio: Both versions, ready for the mux and mel stages
+    """
+    wav = np.asarray(wav, dtype=np.float32)
+    if wav.ndim > 1:
+        wav = wav.mean(axis=1)
+    wav = np.clip(wav, -1.0, 1.0)
+    lipsync_wav = np.clip(resample(wav, sample_rate, lipsync_rate), -1.0, 1.0)
+    return ConditionedAudio(wav, sample_rate, lipsync_wav, lipsync_rate)
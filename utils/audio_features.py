@@ -0,0 +1,191 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from fractions import Fraction
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.audio_conditioning import resample
+from utils.startup import lazy_import
+
+librosa = lazy_import("librosa")
+
+# Wav2Lip audio front end (hparams.py in Wav2Lip / Easy-Wav2Lip)
+SAMPLE_RATE = 16000
+N_FFT = 800
+HOP_SIZE = 200
+WIN_SIZE = 800
+NUM_MELS = 80
+FMIN = 55
+FMAX = 7600
+PREEMPHASIS = 0.97
+REF_LEVEL_DB = 20
+MIN_LEVEL_DB = -100
+MAX_ABS_VALUE = 4.0
+
+# Mel frames per second and mel frames per video-frame window
+MEL_FPS = SAMPLE_RATE / HOP_SIZE
+MEL_STEP_SIZE = 16
+
+_mel_basis: Optional[np.ndarray] = None
+_window: Optional[np.ndarray] = None
+
+
+def _get_mel_basis() -> np.ndarray:
+    global _mel_basis
+    if _mel_basis is None:
+        _mel_basis = librosa.filters.mel(
+            sr=SAMPLE_RATE, n_fft=N_FFT, n_mels=NUM_MELS, fmin=FMIN, fmax=FMAX
+        ).astype(np.float32)
+    return _mel_basis
+
+
+def _get_window() -> np.ndarray:
+    global _window
+    if _window is None:
+        # Periodic Hann window, as used by librosa.stft
+        n = np.arange(WIN_SIZE)
+        _window = (0.5 - 0.5 * np.cos(2 * np.pi * n / WIN_SIZE)).astype(np.float32)
+    return _window
+
+
+def melspectrogram(wav: np.ndarray) -> np.ndarray:
+    """
+    Normalized log-mel spectrogram of 16 kHz mono audio, matching Wav2Lip's
+    audio.melspectrogram, computed with strided framing and one batched FFT.
+
+    Returns:
+        np.ndarray: (80, T) float32 spectrogram
+    """
+    wav = np.asarray(wav, dtype=np.float32)
+    # Pre-emphasis
+    emphasized = np.empty_like(wav)
+    emphasized[0] = wav[0]
+    emphasized[1:] = wav[1:] - PREEMPHASIS * wav[:-1]
+
+    # Centered, zero-padded framing (librosa.stft defaults) without copying
+    padded = np.pad(emphasized, N_FFT // 2, mode="constant")
+    frames = sliding_window_view(padded, N_FFT)[::HOP_SIZE]
+    spectrum = np.abs(np.fft.rfft(frames * _get_window(), axis=1)).astype(np.float32)
+
+    mel = _get_mel_basis() @ spectrum.T
+    db = 20 * np.log10(np.maximum(1e-5, mel)) - REF_LEVEL_DB
+    normalized = (2 * MAX_ABS_VALUE) * ((db - MIN_LEVEL_DB) / -MIN_LEVEL_DB) - MAX_ABS_VALUE
+    return np.clip(normalized, -MAX_ABS_VALUE, MAX_ABS_VALUE).astype(np.float32)
+
+
+def mel_windows(mel: np.ndarray, fps: Union[float, Fraction]) -> np.ndarray:
+    """
+    Frame-aligned mel windows for lip-sync, same indexing as Wav2Lip's
+    inference loop (last window clamped to the end of the spectrogram).
+
+    Returns:
+        np.ndarray: Contiguous (num_frames, 80, 16) array
+    """
+    total = mel.shape[1]
+    if total < MEL_STEP_SIZE:
+        mel = np.pad(mel, ((0, 0), (0, MEL_STEP_SIZE - total)), mode="edge")
+        total = MEL_STEP_SIZE
+
+    multiplier = MEL_FPS / float(fps)
+    # Windows that fit, plus one final window aligned to the end
+    count = int(np.floor((total - MEL_STEP_SIZE) / multiplier)) + 1
+    starts = (np.arange(count + 1) * multiplier).astype(np.int64)
+    starts = starts[starts + MEL_STEP_SIZE <= total]
+    starts = np.append(starts, total - MEL_STEP_SIZE)
+
+    views = sliding_window_view(mel, MEL_STEP_SIZE, axis=1)  # (80, T-15, 16)
+    return np.ascontiguousarray(views[:, starts, :].transpose(1, 0, 2))
+
+
+def to_lipsync_rate(wav: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Downmix to mono and resample to the lip-sync rate if needed (fallback when
+    the audio did not go through the conditioning stage)"""
+    wav = np.asarray(wav, dtype=np.float32)
+    if wav.ndim > 1:
+        wav = wav.mean(axis=1)
+    return resample(wav, sample_rate, SAMPLE_RATE)
+
+
+# Cache of mel windows keyed by (audio hash, fps)
+_CACHE_SIZE = 8
+_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def audio_hash(wav: np.ndarray, sample_rate: int) -> str:
+    digest = hashlib.sha1(np.ascontiguousarray(wav).tobytes())
+    digest.update(str(sample_rate).encode())
+    return digest.hexdigest()
+
+
+def _cache_key(wav: np.ndarray, sample_rate: int, fps) -> tuple:
+    return (audio_hash(wav, sample_rate), str(Fraction(fps).limit_denominator(1001)))
+
+
+def _cache_file(key: tuple, cache_dir: Path) -> Path:
+    digest, rate = key
+    return Path(cache_dir) / f"{digest}_{rate.replace('/', '-')}.npy"
+
+
+def mel_cache_path(wav: np.ndarray, sample_rate: int, fps, cache_dir: Path) -> Path:
+    """On-disk location of the cached mel windows for (audio, fps)"""
+    return _cache_file(_cache_key(wav, sample_rate, fps), cache_dir)
+
+
+def compute_mel_windows(
+    wav: np.ndarray,
+    sample_rate: int,
+    fps: Union[float, Fraction],
+    cache_dir: Optional[Path] = None,
+) -> np.ndarray:
+    """
+    Mel windows for every video frame, computed once per (audio, fps).
+
+    Args:
+        wav: In-memory waveform (any rate, mono or channels-last)
+        sample_rate: Rate of `wav`
+        fps: Video frame rate the windows are aligned to
+        cache_dir: Optional directory for an on-disk .npy cache
+
+    Returns:
+        np.ndarray: Contiguous (num_frames, 80, 16) float32 array
+    """
+    return cached_mel_windows(wav, sample_rate, fps, cache_dir)[0]
+
+
+def cached_mel_windows(
+    wav: np.ndarray,
+    sample_rate: int,
+    fps: Union[float, Fraction],
+    cache_dir: Optional[Path] = None,
+) -> Tuple[np.ndarray, Optional[Path]]:
+    """compute_mel_windows that also returns the .npy cache file (audio hashed once)"""
+    key = _cache_key(wav, sample_rate, fps)
+    cache_file = _cache_file(key, cache_dir) if cache_dir is not None else None
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+    if cached is not None:
+        if cache_file is not None and not cache_file.exists():
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            np.save(cache_file, cached)
+        return cached, cache_file
+
+    if cache_file is not None and cache_file.exists():
+        windows = np.load(cache_file)
+    else:
+        windows = mel_windows(melspectrogram(to_lipsync_rate(wav, sample_rate)), fps)
+        if cache_file is not None:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            np.save(cache_file, windows)
+
+    with _cache_lock:
+        _cache[key] = windows
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return windows, cache_file
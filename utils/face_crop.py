@@ -0,0 +1,145 @@
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from utils.still_image import StillFrameSource, avatar_size, is_still_image
+from utils.startup import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Lip-sync only a crop around the face and paste it back (ABICO_FACE_CROP=0 turns it off)
+FACE_CROP = os.environ.get("ABICO_FACE_CROP", "1") == "1"
+# Context kept around the detected face, as a fraction of the face size on each side
+CROP_MARGIN = 0.5
+# Crops covering more of the frame than this save too little; the full frame is used
+MAX_CROP_AREA = 0.6
+# Width of the feathered border of the pasted crop, as a fraction of its shorter side
+FEATHER = 0.12
+# Frames sampled (evenly over the clip) to find the region the face moves in
+DETECT_SAMPLES = 12
+
+# Output resolution tiers: Easy-Wav2Lip's output_height for each
+OUTPUT_TIERS = {
+    "Full": "full resolution",
+    "1080p": 1080,
+    "720p": 720,
+    "480p": 480,
+    "Half": "half resolution",
+}
+
+Box = Tuple[int, int, int, int]
+
+
+def output_size(resolution: str, size: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Frame size of a resolution tier for a (width, height) source; sources
+    are never upscaled and both sides stay even for the encoder.
+    """
+    width, height = size
+    tier = OUTPUT_TIERS.get(resolution, "full resolution")
+    if tier == "full resolution":
+        return width, height
+    target = height // 2 if tier == "half resolution" else min(int(tier), height)
+    scale = target / height
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(target / 2)) * 2)
+
+
+def _sample_frames(path: str, samples: int) -> List[np.ndarray]:
+    if is_still_image(path):
+        return [StillFrameSource(path).frame]
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {path}")
+    try:
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 1
+        frames = []
+        for index in np.linspace(0, count - 1, min(samples, count)).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ret, frame = cap.read()
+            if ret:
+                frames.append(frame)
+        return frames
+    finally:
+        cap.release()
+
+
+def face_region(
+    path: str,
+    tracker=None,
+    samples: int = DETECT_SAMPLES,
+    face_box: Optional[Box] = None
+) -> Optional[Box]:
+    """
+    Fixed crop window that contains the face throughout a clip.
+
+    The face is detected on a few frames spread over the clip (or given as
+    `face_box`, e.g. found once on a still image); the union of the boxes
+    plus CROP_MARGIN is the crop. Returns None when no detector is
+    available, no face is found, or the crop would be most of the frame
+    (the caller then processes full frames).
+    """
+    if face_box is not None:
+        boxes = [tuple(face_box)]
+        width, height = avatar_size(path)
+    else:
+        if tracker is None:
+            try:
+                from utils.face_tracker import create_tracker
+                tracker = create_tracker(keyframe_interval=1)
+            except ImportError:
+                print("Face crop: no face detector installed, processing full frames")
+                return None
+
+        frames = _sample_frames(path, samples)
+        boxes = [track.box for track in tracker.track(frames) if track.box is not None]
+        if not boxes:
+            print("Face crop: no face found in the sampled frames, processing full frames")
+            return None
+        height, width = frames[0].shape[:2]
+
+    x1, y1 = min(b[0] for b in boxes), min(b[1] for b in boxes)
+    x2, y2 = max(b[2] for b in boxes), max(b[3] for b in boxes)
+    pad_x, pad_y = int((x2 - x1) * CROP_MARGIN), int((y2 - y1) * CROP_MARGIN)
+    x1, y1 = max(0, x1 - pad_x) // 2 * 2, max(0, y1 - pad_y) // 2 * 2
+    x2, y2 = min(width, x2 + pad_x) // 2 * 2, min(height, y2 + pad_y) // 2 * 2
+
+    if (x2 - x1) * (y2 - y1) > MAX_CROP_AREA * width * height:
+        print("Face crop: the face fills most of the frame, processing full frames")
+        return None
+    return x1, y1, x2, y2
+
+
+def crop_still(image_path: str, box: Box, output_path: str) -> str:
+    """
+    Crop a still-image avatar to a still image (same extension), so the
+    crop keeps the single-detection fast path
+    """
+    x1, y1, x2, y2 = box
+    output_path = Path(output_path).with_suffix(Path(image_path).suffix)
+    cv2.imwrite(str(output_path), StillFrameSource(image_path).frame[y1:y2, x1:x2])
+    return str(output_path.absolute())
+
+
+def feather_mask(height: int, width: int, feather: float = FEATHER) -> np.ndarray:
+    """(height, width, 1) float mask: 1 inside, fading linearly to 0 over the border"""
+    ramp = max(1.0, feather * min(height, width))
+    ys = np.minimum(np.arange(height), np.arange(height)[::-1]) + 0.5
+    xs = np.minimum(np.arange(width), np.arange(width)[::-1]) + 0.5
+    mask = np.minimum(np.minimum.outer(ys, xs) / ramp, 1.0)
+    return mask[:, :, None].astype(np.float32)
+
+
+def paste_face(frame: np.ndarray, face: np.ndarray, box: Box, mask: np.ndarray) -> np.ndarray:
+    """
+    Composite a (lip-synced) face crop onto a copy of `frame` at `box`,
+    weighted by `mask` (e.g. feather_mask, scaled down for a seam blend)
+    """
+    x1, y1, x2, y2 = box
+    if face.shape[:2] != (y2 - y1, x2 - x1):
+        face = cv2.resize(face, (x2 - x1, y2 - y1), interpolation=cv2.INTER_LINEAR)
+    frame = frame.copy()
+    region = frame[y1:y2, x1:x2].astype(np.float32)
+    frame[y1:y2, x1:x2] = (region + mask * (face.astype(np.float32) - region)).astype(np.uint8)
+    return frame
@@ -0,0 +1,274 @@
+import pickle
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from utils.still_image import avatar_frames, is_still_image
+
+# Face boxes are (x1, y1, x2, y2) in full-resolution pixel coordinates
+Box = Tuple[int, int, int, int]
+
+
+@dataclass
+class FaceTrack:
+    """Face box and (optional) 68-point landmarks for a single frame"""
+    box: Optional[Box]
+    landmarks: Optional[np.ndarray] = None
+    detected: bool = False  # True if the box came from the detector, False if tracked
+
+
+@dataclass
+class TrackerStats:
+    detections: int = 0
+    tracked: int = 0
+    fallbacks: int = 0
+    frames: int = 0
+    fallback_frames: List[int] = field(default_factory=list)
+
+
+def box_iou(a: Optional[Box], b: Optional[Box]) -> float:
+    """Intersection over union of two boxes, 0.0 if either is missing"""
+    if a is None or b is None:
+        return 0.0
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    area_a = max(0, a[2] - a[0]) * max(0, a[3] - a[1])
+    area_b = max(0, b[2] - b[0]) * max(0, b[3] - b[1])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _to_gray(frame: np.ndarray) -> np.ndarray:
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+class SparseFaceTracker:
+    """
+    Run the dlib face detector on keyframes only and track faces in between.
+
+    Keyframes are every `keyframe_interval`-th frame plus the last one. The
+    frames between two keyframes get:
+    - no face, when neither keyframe has one;
+    - otherwise, when the keyframe boxes disagree (IoU below `iou_threshold`,
+      or a face at one end only), the middle frame is detected and both halves
+      are filled the same way;
+    - otherwise boxes (and landmarks, when both keyframes have them) linearly
+      interpolated. Each interpolated frame is compared with the nearer
+      keyframe, first by a motion check on downscaled frames, then by a patch
+      correlation inside the box, and is detected in full if either fails.
+    """
+
+    def __init__(
+        self,
+        detector=None,
+        predictor=None,
+        keyframe_interval: int = 25,
+        iou_threshold: float = 0.7,
+        motion_threshold: float = 12.0,
+        min_correlation: float = 0.6,
+        detect_scale: float = 0.5,
+    ):
+        if detector is None:
+            import dlib
+            detector = dlib.get_frontal_face_detector()
+        self.detector = detector
+        self.predictor = predictor
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.iou_threshold = iou_threshold
+        self.motion_threshold = motion_threshold
+        self.min_correlation = min_correlation
+        self.detect_scale = detect_scale
+        self.stats = TrackerStats()
+
+    @classmethod
+    def from_checkpoints(cls, checkpoint_dir: str = "checkpoints", **kwargs) -> "SparseFaceTracker":
+        """
+        Build a tracker from the detector and landmark predictor pickled by
+        `load_predictor` in Easy-Wav2Lip's easy_functions
+        """
+        checkpoint_dir = Path(checkpoint_dir)
+        with open(checkpoint_dir / "mouth_detector.pkl", "rb") as f:
+            detector = pickle.load(f)
+        predictor = None
+        predictor_path = checkpoint_dir / "predictor.pkl"
+        if predictor_path.exists():
+            with open(predictor_path, "rb") as f:
+                predictor = pickle.load(f)
+        return cls(detector=detector, predictor=predictor, **kwargs)
+
+    def track(self, frames: Sequence[np.ndarray]) -> List[FaceTrack]:
+        """
+        Track the face through a sequence of BGR frames.
+
+        Args:
+            frames: Any indexable sequence of frames (list, array, lazy reader)
+
+        Returns:
+            List[FaceTrack]: One track per frame; `box` is None where no face was found
+        """
+        n = len(frames)
+        self.stats.frames += n
+        if n == 0:
+            return []
+
+        tracks: List[Optional[FaceTrack]] = [None] * n
+        keyframes = sorted(set(range(0, n, self.keyframe_interval)) | {n - 1})
+        for k in keyframes:
+            tracks[k] = self._detect(frames[k])
+
+        for a, b in zip(keyframes, keyframes[1:]):
+            self._fill_span(frames, tracks, a, b)
+
+        return tracks
+
+    def _fill_span(self, frames, tracks, a: int, b: int):
+        """Fill frames strictly between keyframes a and b"""
+        if b - a <= 1:
+            return
+
+        # No face at either end: nothing to interpolate or bisect towards
+        if tracks[a].box is None and tracks[b].box is None:
+            for i in range(a + 1, b):
+                self.stats.tracked += 1
+                tracks[i] = FaceTrack(box=None, detected=False)
+            return
+
+        # Keyframes disagree (face moved, appeared or vanished): bisect
+        if box_iou(tracks[a].box, tracks[b].box) < self.iou_threshold:
+            m = (a + b) // 2
+            tracks[m] = self._detect(frames[m])
+            self._fill_span(frames, tracks, a, m)
+            self._fill_span(frames, tracks, m, b)
+            return
+
+        gray_a = _to_gray(frames[a])
+        gray_b = _to_gray(frames[b])
+        template_a = self._patch(gray_a, tracks[a].box)
+        template_b = self._patch(gray_b, tracks[b].box)
+
+        for i in range(a + 1, b):
+            t = (i - a) / (b - a)
+            box = self._lerp_box(tracks[a].box, tracks[b].box, t)
+            landmarks = None
+            if tracks[a].landmarks is not None and tracks[b].landmarks is not None:
+                landmarks = (1 - t) * tracks[a].landmarks + t * tracks[b].landmarks
+
+            gray = _to_gray(frames[i])
+            reference, template = (gray_a, template_a) if t <= 0.5 else (gray_b, template_b)
+            if not self._is_consistent(gray, reference, box, template):
+                self.stats.fallbacks += 1
+                self.stats.fallback_frames.append(i)
+                tracks[i] = self._detect(frames[i])
+                continue
+
+            self.stats.tracked += 1
+            tracks[i] = FaceTrack(box=box, landmarks=landmarks, detected=False)
+
+    def _is_consistent(self, gray, reference, box, template) -> bool:
+        """Cheap motion check followed by a patch-correlation drift check"""
+        # Motion check on a heavily downscaled frame (catches cuts and big moves)
+        small = cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA).astype(np.float32)
+        small_ref = cv2.resize(reference, (64, 36), interpolation=cv2.INTER_AREA).astype(np.float32)
+        if float(np.mean(np.abs(small - small_ref))) > self.motion_threshold:
+            return False
+
+        # Drift check: does the tracked box still look like the keyframe face?
+        patch = self._patch(gray, box)
+        if patch is None or template is None:
+            return False
+        return self._correlation(patch, template) >= self.min_correlation
+
+    def _detect(self, frame: np.ndarray) -> FaceTrack:
+        """Full detection (and landmark prediction) on a single frame"""
+        self.stats.detections += 1
+        gray = _to_gray(frame)
+        scale = self.detect_scale
+        small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        rects = self.detector(small, 0)
+        if len(rects) == 0 and scale != 1.0:
+            # Small faces can vanish after downscaling; retry at full size
+            rects = self.detector(gray, 0)
+            scale = 1.0
+        if len(rects) == 0:
+            return FaceTrack(box=None, detected=True)
+
+        # Keep the largest face
+        rect = max(rects, key=lambda r: r.width() * r.height())
+        h, w = gray.shape[:2]
+        box = (
+            max(0, int(rect.left() / scale)),
+            max(0, int(rect.top() / scale)),
+            min(w, int(rect.right() / scale)),
+            min(h, int(rect.bottom() / scale)),
+        )
+
+        landmarks = None
+        if self.predictor is not None:
+            import dlib
+            shape = self.predictor(gray, dlib.rectangle(*box))
+            landmarks = np.array([(p.x, p.y) for p in shape.parts()], dtype=np.float32)
+
+        return FaceTrack(box=box, landmarks=landmarks, detected=True)
+
+    @staticmethod
+    def _lerp_box(a: Box, b: Box, t: float) -> Box:
+        return tuple(int(round((1 - t) * pa + t * pb)) for pa, pb in zip(a, b))
+
+    @staticmethod
+    def _patch(gray: np.ndarray, box: Optional[Box], size: int = 32) -> Optional[np.ndarray]:
+        if box is None:
+            return None
+        x1, y1, x2, y2 = box
+        crop = gray[max(0, y1):y2, max(0, x1):x2]
+        if crop.size == 0:
+            return None
+        return cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    @staticmethod
+    def _correlation(a: np.ndarray, b: np.ndarray) -> float:
+        """Normalized cross-correlation of two equally sized patches"""
+        a = a - a.mean()
+        b = b - b.mean()
+        denom = float(np.sqrt((a * a).sum() * (b * b).sum()))
+        if denom == 0.0:
+            return 1.0 if np.allclose(a, b) else 0.0
+        return float((a * b).sum() / denom)
+
+
+def create_tracker(checkpoint_dir: Optional[str] = None, **kwargs) -> SparseFaceTracker:
+    """
+    Tracker using Easy-Wav2Lip's pickled detector when `checkpoint_dir` has
+    it, dlib's frontal detector otherwise. Raises ImportError without dlib.
+    """
+    if checkpoint_dir is not None and (Path(checkpoint_dir) / "mouth_detector.pkl").exists():
+        return SparseFaceTracker.from_checkpoints(checkpoint_dir, **kwargs)
+    return SparseFaceTracker(**kwargs)
+
+
+def track_video(
+    video_path: str,
+    tracker: SparseFaceTracker,
+    chunk_keyframes: int = 8
+) -> Iterator[Tuple[np.ndarray, FaceTrack]]:
+    """
+    Stream (frame, track) pairs of a video (a still image is one frame).
+
+    Frames are tracked in chunks of `chunk_keyframes` keyframe intervals, so
+    only one chunk of decoded frames is held at a time.
+    """
+    chunk_size = tracker.keyframe_interval * max(1, chunk_keyframes) + 1
+    chunk = []
+    for frame in avatar_frames(video_path, 1 if is_still_image(video_path) else None):
+        chunk.append(frame)
+        if len(chunk) == chunk_size:
+            yield from zip(chunk, tracker.track(chunk))
+            chunk = []
+    if chunk:
+        yield from zip(chunk, tracker.track(chunk))
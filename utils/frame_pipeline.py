@@ -0,0 +1,393 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+import uuid
+from fractions import Fraction
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from utils.media_info import probe_media
+from utils.process_runner import CancelToken
+from utils.shared_buffers import JobBuffers, current_buffers
+from utils.startup import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# x264 settings: intermediate clips (read back by the next step, e.g. Wav2Lip's
+# input) are lossless but cheap to write; outputs are compact yuv420p, which
+# browsers and HLS clients play
+INTERMEDIATE_X264 = {"preset": "ultrafast", "qp": "0"}
+OUTPUT_X264 = {"preset": "superfast", "crf": "18"}
+
+# Avatars up to this size (decoded) are decoded once per job into the job's
+# shared-memory arena; larger ones are streamed (ABICO_FRAME_CACHE_MB=0 turns it off)
+FRAME_CACHE_MB = float(os.environ.get("ABICO_FRAME_CACHE_MB", 1024))
+
+# Marks the end of a stream between pipeline stages
+_END = object()
+
+# Infer stage: (frames, index of first frame) -> processed frames
+InferFn = Callable[[List["np.ndarray"], int], List["np.ndarray"]]
+
+
+def loop_index(i: int, n: int) -> int:
+    """
+    Source frame for output frame i of a ping-pong loop over n frames:
+    0..n-1, n-2..1, 0..n-1, ... (first and last frame are not repeated)
+    """
+    if n <= 1:
+        return 0
+    period = 2 * n - 2
+    p = i % period
+    return p if p < n else period - p
+
+
+class AvatarFrameSource:
+    """
+    Avatar frames that can be looped to any length.
+
+    Once `cache_in` has decoded the clip into a job arena, both directions of
+    the loop are served from that array. Otherwise frames are decoded as they
+    are needed: forward runs sequentially, backward runs in chunks of
+    `chunk_frames` (seek, read forward, reverse), so at most one chunk of
+    decoded frames is held in memory, however large the avatar.
+    """
+
+    def __init__(self, video_path: str, chunk_frames: int = 16):
+        self.video_path = str(Path(video_path).absolute())
+        self.info = probe_media(self.video_path)
+        self.chunk_frames = max(1, int(chunk_frames))
+        cap = self._open()
+        try:
+            self.frame_count = self.info.frame_count or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            ret, frame = cap.read()
+        finally:
+            cap.release()
+        if not ret or self.frame_count < 1:
+            raise ValueError(f"Could not read any frames from: {self.video_path}")
+        h, w = frame.shape[:2]
+        self._size = (w, h)
+        self._frames: Optional[np.ndarray] = None
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file: {self.video_path}")
+        return cap
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    @property
+    def fps(self) -> float:
+        return float(self.info.fps or 25)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the whole clip decoded"""
+        w, h = self._size
+        return self.frame_count * h * w * 3
+
+    def cache_in(self, buffers: JobBuffers) -> bool:
+        """
+        Serve the loop from a decoded copy of the clip in `buffers`, decoding it
+        unless another source in the same job already has.
+
+        Returns:
+            bool: False if the clip is over the FRAME_CACHE_MB budget (frames stay streamed)
+        """
+        if self.nbytes > FRAME_CACHE_MB * 1024 * 1024:
+            return False
+        stat = os.stat(self.video_path)
+        name = "frames_" + hashlib.sha1(
+            f"{self.video_path}:{stat.st_mtime_ns}:{stat.st_size}".encode()
+        ).hexdigest()[:16]
+        frames = buffers.get(name)
+        if frames is None:
+            w, h = self._size
+            # Decoded under a private name and renamed when complete, so a
+            # concurrent reader never maps a half-written clip
+            partial_name = f"{name}.{uuid.uuid4().hex[:8]}.partial"
+            array, ref = buffers.allocate(partial_name, (self.frame_count, h, w, 3), "uint8")
+            cap = self._open()
+            try:
+                for index, frame in enumerate(self._read(cap, 0, self.frame_count, None)):
+                    array[index] = frame
+            finally:
+                cap.release()
+            array.flush()
+            del array
+            Path(ref.path).replace(Path(ref.path).with_name(f"{name}.npy"))
+            frames = buffers.get(name)
+        self._frames = frames
+        return True
+
+    def _read(self, cap, start: int, stop: int, last) -> Iterator:
+        """Frames start..stop-1; a frame count that was an overestimate repeats the last frame"""
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for _ in range(start, stop):
+            ret, frame = cap.read()
+            if ret:
+                last = frame
+            yield last
+
+    def looped(self, count: int, start: int = 0) -> Iterator:
+        """Yield `count` ping-pong looped frames starting at loop phase `start`"""
+        n = self.frame_count
+        if self._frames is not None:
+            for i in range(start, start + count):
+                yield self._frames[loop_index(i, n)]
+            return
+        cap = self._open()
+        last = None
+        try:
+            i, end = start, start + count
+            while i < end:
+                index = loop_index(i, n)
+                # Length of the run that keeps the current direction
+                forward = n == 1 or (i % (2 * n - 2)) < n - 1
+                remaining = (n - 1 - index) if forward else index
+                run = min(max(1, remaining), end - i)
+                if forward:
+                    for frame in self._read(cap, index, index + run, last):
+                        last = frame
+                        yield frame
+                else:
+                    # index, index-1, ..., index-run+1, a chunk at a time
+                    top = index + 1
+                    while top > index + 1 - run:
+                        low = max(index + 1 - run, top - self.chunk_frames)
+                        chunk = list(self._read(cap, low, top, last))
+                        last = chunk[-1]
+                        yield from reversed(chunk)
+                        top = low
+                i += run
+        finally:
+            cap.release()
+
+
+def get_avatar_source(video_path: str) -> AvatarFrameSource:
+    """
+    AvatarFrameSource for the given avatar: decoded once into the running
+    job's arena when it fits the budget, streamed otherwise
+    """
+    source = AvatarFrameSource(str(Path(video_path).absolute()))
+    buffers = current_buffers()
+    if buffers is not None and not source.cache_in(buffers):
+        print(f"Avatar ({source.nbytes / 1024 / 1024:.0f} MB decoded) is over the frame cache budget, streaming it")
+    return source
+
+
+class VideoEncoder:
+    """
+    Frame sink writing H.264 from BGR frames: in-process through PyAV when it
+    is installed (optional dependency), otherwise through an ffmpeg pipe.
+
+    `intermediate` clips are lossless (qp 0, full chroma); outputs are
+    yuv420p, so odd frame sizes lose their last row/column.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        fps: Union[float, Fraction],
+        size: Tuple[int, int],
+        intermediate: bool = False
+    ):
+        self.output_path = str(output_path)
+        width, height = size
+        if not intermediate:
+            width, height = width // 2 * 2, height // 2 * 2
+        self.size = (width, height)
+        self.pix_fmt = "yuv444p" if intermediate else "yuv420p"
+        self.options = dict(INTERMEDIATE_X264 if intermediate else OUTPUT_X264)
+        self.rate = Fraction(fps).limit_denominator(1001)
+        self._process = None
+        try:
+            self._open_pyav()
+        except ImportError:
+            self._open_ffmpeg()
+
+    def _open_pyav(self):
+        import av
+        if "libx264" not in av.codecs_available:
+            raise ImportError("PyAV was built without libx264")
+        self._container = av.open(self.output_path, "w")
+        self._stream = self._container.add_stream("libx264", rate=self.rate)
+        self._stream.width, self._stream.height = self.size
+        self._stream.pix_fmt = self.pix_fmt
+        self._stream.options = self.options
+        self._video_frame = av.VideoFrame
+
+    def _open_ffmpeg(self):
+        import ffmpeg
+        width, height = self.size
+        self._process = (
+            ffmpeg
+            .input("pipe:", format="rawvideo", pix_fmt="bgr24", s=f"{width}x{height}", framerate=str(self.rate))
+            .output(self.output_path, vcodec="libx264", pix_fmt=self.pix_fmt, **self.options)
+            .global_args("-loglevel", "error")
+            .overwrite_output()
+            .run_async(pipe_stdin=True)
+        )
+
+    def write(self, frame):
+        width, height = self.size
+        frame = np.ascontiguousarray(frame[:height, :width])
+        if self._process is not None:
+            self._process.stdin.write(frame.tobytes())
+            return
+        for packet in self._stream.encode(self._video_frame.from_ndarray(frame, format="bgr24")):
+            self._container.mux(packet)
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            if self._process.wait() != 0:
+                raise RuntimeError(f"ffmpeg could not encode: {self.output_path}")
+            return
+        for packet in self._stream.encode(None):
+            self._container.mux(packet)
+        self._container.close()
+
+
+class FramePipeline:
+    """
+    Three-stage decode -> infer -> encode pipeline.
+
+    Decoding and encoding run on their own threads and overlap with the
+    (batched) infer stage. Stages are connected by bounded queues, so at most
+    a few batches are in flight whatever the clip length; a slow stage
+    applies backpressure to the stages before it.
+    """
+
+    def __init__(self, batch_size: int = 16, max_batches: int = 2):
+        self.batch_size = max(1, int(batch_size))
+        self.max_batches = max(1, int(max_batches))
+        self.stats = {}
+
+    def run(
+        self,
+        frames: Iterable,
+        write: Callable,
+        infer: Optional[InferFn] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> dict:
+        """
+        Push frames through the pipeline.
+
+        Args:
+            frames: Frame iterable (decoding happens lazily as it is consumed)
+            write: Encode stage, called once per output frame in order
+            infer: Batched inference; identity when None
+            cancel_token: Aborts the pipeline when cancelled
+
+        Returns:
+            dict: Frame count and time spent in each stage
+        """
+        decoded: queue.Queue = queue.Queue(maxsize=self.max_batches)
+        inferred: queue.Queue = queue.Queue(maxsize=self.max_batches)
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        stats = {"frames": 0, "decode": 0.0, "infer": 0.0, "encode": 0.0}
+
+        def stopping() -> bool:
+            return stop.is_set() or (cancel_token is not None and cancel_token.cancelled)
+
+        def put(q: queue.Queue, item) -> bool:
+            # Bounded put that gives up when the pipeline is stopping
+            while not stopping():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q: queue.Queue):
+            while not stopping():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _END
+
+        def decode_worker():
+            try:
+                batch, start_index = [], 0
+                iterator = iter(frames)
+                while True:
+                    t0 = time.perf_counter()
+                    frame = next(iterator, _END)
+                    stats["decode"] += time.perf_counter() - t0
+                    if frame is _END:
+                        break
+                    batch.append(frame)
+                    if len(batch) == self.batch_size:
+                        if not put(decoded, (start_index, batch)):
+                            return
+                        start_index += len(batch)
+                        batch = []
+                if batch:
+                    put(decoded, (start_index, batch))
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(decoded, _END)
+
+        def encode_worker():
+            try:
+                while True:
+                    item = get(inferred)
+                    if item is _END:
+                        break
+                    t0 = time.perf_counter()
+                    for frame in item:
+                        write(frame)
+                    stats["encode"] += time.perf_counter() - t0
+                    stats["frames"] += len(item)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+
+        decoder = threading.Thread(target=decode_worker, name="pipeline-decode", daemon=True)
+        encoder = threading.Thread(target=encode_worker, name="pipeline-encode", daemon=True)
+        decoder.start()
+        encoder.start()
+
+        # Infer stage runs on the calling thread (where the model usually lives)
+        try:
+            while True:
+                item = get(decoded)
+                if item is _END:
+                    break
+                start_index, batch = item
+                t0 = time.perf_counter()
+                output = infer(batch, start_index) if infer is not None else batch
+                stats["infer"] += time.perf_counter() - t0
+                if not put(inferred, output):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(inferred, _END)
+            decoder.join()
+            encoder.join()
+
+        if errors:
+            raise errors[0]
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+        self.stats = stats
+        return stats
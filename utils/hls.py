@@ -0,0 +1,104 @@
+import math
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from utils.frame_pipeline import OUTPUT_X264
+from utils.media_info import probe_media
+from utils.startup import lazy_import
+
+ffmpeg = lazy_import("ffmpeg")
+
+
+class HlsPlaylist:
+    """
+    Progressive HLS output: an EVENT playlist that grows as segments finish.
+
+    Segments may be added out of order (e.g. scenes rendered in parallel) but
+    are published strictly in order, so a player can start on the first
+    segment while later ones are still rendering. Segments are stream-copied
+    to MPEG-TS and separated by discontinuity tags, so each one keeps its own
+    timestamps.
+
+    The target duration may not change once the playlist is live (RFC 8216),
+    so it is fixed up front from the longest expected segment.
+    """
+
+    def __init__(self, output_dir: Path, target_duration: float, name: str = "index"):
+        self.output_dir = Path(output_dir).absolute()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.output_dir / f"{name}.m3u8"
+        self.target_duration = max(1, math.ceil(target_duration))
+        self._pending: Dict[int, Tuple[str, float]] = {}
+        self._segments: List[Tuple[str, float]] = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._write()
+
+    @property
+    def published(self) -> int:
+        """Number of segments currently listed in the playlist"""
+        return len(self._segments)
+
+    def add(self, index: int, video_path: str) -> int:
+        """
+        Remux a finished video into segment `index` and publish every segment
+        that is now contiguous from the start.
+
+        Returns:
+            int: Number of segments published so far
+        """
+        segment = self.output_dir / f"segment_{index:03d}.ts"
+        if probe_media(str(video_path)).video_codec == "h264":
+            video_args = {"vcodec": "copy"}
+        else:
+            video_args = {"vcodec": "libx264", "pix_fmt": "yuv420p", **OUTPUT_X264}
+        try:
+            (
+                ffmpeg
+                .input(str(video_path))
+                .output(str(segment), acodec='copy', f='mpegts', **video_args)
+                .overwrite_output()
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+        except Exception as e:
+            print(f"Error writing HLS segment {index}: {str(e)}")
+            raise
+        duration = probe_media(str(segment)).duration or 0.0
+        if round(duration) > self.target_duration:
+            print(f"Warning: HLS segment {index} ({duration:.3f}s) exceeds the target duration")
+
+        with self._lock:
+            self._pending[index] = (segment.name, duration)
+            while len(self._segments) in self._pending:
+                self._segments.append(self._pending.pop(len(self._segments)))
+            self._write()
+            return len(self._segments)
+
+    def close(self):
+        """Mark the playlist complete (players stop polling for new segments)"""
+        with self._lock:
+            self._closed = True
+            self._write()
+
+    def _write(self):
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for i, (name, duration) in enumerate(self._segments):
+            if i > 0:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(name)
+        if self._closed:
+            lines.append("#EXT-X-ENDLIST")
+
+        # Replace atomically so players never read a half-written playlist
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        tmp_path.replace(self.path)
@@ -0,0 +1,176 @@
+import json
+import re
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from utils.process_runner import ProcessCancelled, ProcessTimeout
+
+
+class FatalStageError(Exception):
+    """A stage failure that will fail again with the same inputs (do not retry)"""
+
+
+class RetryableStageError(Exception):
+    """A transient stage failure (worth retrying)"""
+
+
+# Failures that are deterministic for a given input
+_FATAL_PATTERNS = re.compile(
+    r"face not detected|no face|could not open video|not found|unsupported|invalid data",
+    re.IGNORECASE,
+)
+# Failures that usually go away on a second try
+_RETRYABLE_PATTERNS = re.compile(
+    r"out of memory|cuda error|resource temporarily unavailable|broken pipe|timed? ?out",
+    re.IGNORECASE,
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Classify a stage failure as retryable (True) or fatal (False)"""
+    if isinstance(error, (ProcessCancelled, FatalStageError, FileNotFoundError, ValueError)):
+        return False
+    if isinstance(error, (ProcessTimeout, RetryableStageError, TimeoutError)):
+        return True
+    message = str(error)
+    if _RETRYABLE_PATTERNS.search(message):
+        return True
+    if _FATAL_PATTERNS.search(message):
+        return False
+    return True
+
+
+class JobManifest:
+    """
+    Per-job JSON manifest of stage checkpoints.
+
+    Each stage records its status, output artifacts, attempts and timing. A
+    stage whose outputs are still on disk is skipped on the next attempt, so
+    retries resume from the first stage that failed.
+    """
+
+    def __init__(
+        self,
+        job_dir: Path,
+        job_id: str,
+        store=None,
+        parent_job_id: Optional[str] = None,
+        label: Optional[str] = None
+    ):
+        self.job_dir = Path(job_dir)
+        # Optional JobStore mirroring stage records into the durable job table.
+        # Sub-jobs (long-form scenes, fan-out avatars) have no row of their own:
+        # their stages are recorded on the parent job as "<label>/<stage>"
+        self.store = store
+        self.store_job_id = parent_job_id or job_id
+        self.label = label
+        # Objects with a stage(name) context manager wrapped around every stage that runs
+        self.observers = []
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.job_dir / "manifest.json"
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        else:
+            self.data = {"job_id": job_id, "created": time.time(), "stages": {}}
+            self.save()
+
+    @property
+    def job_id(self) -> str:
+        return self.data["job_id"]
+
+    @property
+    def stages(self) -> Dict[str, dict]:
+        return self.data["stages"]
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            tmp_path.replace(self.path)
+
+    def is_done(self, stage: str, key: Optional[str] = None) -> bool:
+        """
+        True if the stage completed and all of its file outputs still exist
+        (and, when `key` is given, it ran with the same settings key)
+        """
+        record = self.stages.get(stage)
+        if not record or record.get("status") != "done":
+            return False
+        if key is not None and record.get("key") != key:
+            return False
+        for value in record.get("outputs", {}).values():
+            if isinstance(value, str) and Path(value).is_absolute() and not Path(value).exists():
+                return False
+        return True
+
+    def outputs(self, stage: str) -> Dict[str, Any]:
+        return dict(self.stages.get(stage, {}).get("outputs", {}))
+
+    def run_stage(self, stage: str, fn: Callable[[], Dict[str, Any]], key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run a stage unless its checkpoint is still valid.
+
+        Args:
+            stage: Stage name
+            fn: Callable producing the stage's outputs as a dict (absolute paths for files)
+            key: Settings the outputs depend on; a checkpoint made with another key
+                is re-run (e.g. when a draft job is upgraded to a final render)
+
+        Returns:
+            Dict[str, Any]: The stage outputs, fresh or from the checkpoint
+        """
+        if self.is_done(stage, key):
+            print(f"Job {self.job_id}: reusing checkpoint for stage '{stage}'")
+            return self.outputs(stage)
+
+        record = self.stages.setdefault(stage, {"attempts": 0})
+        record.update(status="running", started=time.time(), error=None)
+        record["attempts"] += 1
+        self._save_stage(stage)
+
+        try:
+            with ExitStack() as stack:
+                for observer in self.observers:
+                    stack.enter_context(observer.stage(stage))
+                outputs = fn() or {}
+        except BaseException as e:
+            record.update(
+                status="failed",
+                finished=time.time(),
+                error=str(e),
+                retryable=is_retryable(e),
+            )
+            self._save_stage(stage)
+            raise
+
+        record.update(
+            status="done",
+            finished=time.time(),
+            duration=time.time() - record["started"],
+            outputs=outputs,
+            key=key,
+        )
+        self._save_stage(stage)
+        return outputs
+
+    def _save_stage(self, stage: str):
+        self.save()
+        if self.store is not None:
+            try:
+                name = f"{self.label}/{stage}" if self.label else stage
+                self.store.record_stage(self.store_job_id, name, self.stages[stage])
+            except Exception as e:
+                # The manifest is the source of truth for resuming; the store is bookkeeping
+                print(f"Warning: could not record stage '{stage}' of job {self.job_id}: {e}")
+
+    def first_incomplete_stage(self, order) -> Optional[str]:
+        for stage in order:
+            if not self.is_done(stage):
+                return stage
+        return None
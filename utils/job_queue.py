@@ -0,0 +1,270 @@
+import json
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from utils.process_runner import CancelToken, ProcessCancelled
+
+# Job states in the queue
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class QueuedJob:
+    job_id: str
+    payload: Dict[str, Any]
+    status: str = QUEUED
+    attempts: int = 0
+    worker_id: Optional[str] = None
+    lease_expires: Optional[float] = None
+    progress: float = 0.0
+    cancel_requested: bool = False
+    result: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    created: float = 0.0
+    updated: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+
+class JobQueue(ABC):
+    """
+    Work queue between the UI/API node and render workers.
+
+    Workers take a time-limited lease on a job and extend it with heartbeats.
+    A job whose lease runs out (the worker died or hung) is delivered again to
+    the next worker, up to `max_attempts` deliveries.
+    """
+
+    @abstractmethod
+    def put(self, payload: Dict[str, Any], job_id: Optional[str] = None) -> str:
+        """Enqueue a job and return its id"""
+
+    @abstractmethod
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[QueuedJob]:
+        """Take the oldest available job (queued or with an expired lease), if any"""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float,
+                  progress: Optional[float] = None) -> bool:
+        """Extend a lease; False if the lease was lost or the job should be cancelled"""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]):
+        """Mark a leased job done with its result"""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str, retryable: bool = True):
+        """Release a leased job after a failure; retryable jobs go back to the queue"""
+
+    @abstractmethod
+    def cancel(self, job_id: str):
+        """Cancel a queued job, or ask the worker holding it to stop"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[QueuedJob]:
+        """Current state of a job"""
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    JobQueue on a SQLite database, for single-host deployments and testing.
+
+    Every call opens its own connection and leases are taken inside an
+    IMMEDIATE transaction, so any number of worker processes can share the
+    database file (keep it on a local disk; SQLite locking is unreliable on
+    network filesystems).
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = str(path)
+        self.max_attempts = max_attempts
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS queue (
+                    job_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS queue_status ON queue (status, created)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit connection; multi-statement updates use explicit transactions
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> QueuedJob:
+        return QueuedJob(
+            job_id=row["job_id"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            attempts=row["attempts"],
+            worker_id=row["worker_id"],
+            lease_expires=row["lease_expires"],
+            progress=row["progress"],
+            cancel_requested=bool(row["cancel_requested"]),
+            result=json.loads(row["result"]) if row["result"] else {},
+            error=row["error"],
+            created=row["created"],
+            updated=row["updated"],
+        )
+
+    def put(self, payload: Dict[str, Any], job_id: Optional[str] = None) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO queue (job_id, payload, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (job_id, json.dumps(payload, ensure_ascii=False), QUEUED, now, now),
+            )
+        return job_id
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[QueuedJob]:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Abandoned jobs that were cancelled, or lost too many times, are not re-delivered
+                conn.execute(
+                    "UPDATE queue SET status = CASE WHEN cancel_requested = 1 THEN ? ELSE ? END, "
+                    "error = COALESCE(error, ?), worker_id = NULL, updated = ? "
+                    "WHERE status = ? AND lease_expires < ? AND (cancel_requested = 1 OR attempts >= ?)",
+                    (CANCELLED, FAILED, "Worker lost too many times", now, LEASED, now, self.max_attempts),
+                )
+                row = conn.execute(
+                    "SELECT * FROM queue WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                    "ORDER BY created LIMIT 1",
+                    (QUEUED, LEASED, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row["status"] == LEASED:
+                    print(f"Re-delivering job {row['job_id']} (lease of {row['worker_id']} expired)")
+                conn.execute(
+                    "UPDATE queue SET status = ?, worker_id = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE job_id = ?",
+                    (LEASED, worker_id, now + lease_seconds, now, row["job_id"]),
+                )
+                leased = conn.execute("SELECT * FROM queue WHERE job_id = ?", (row["job_id"],)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._to_job(leased)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float,
+                  progress: Optional[float] = None) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE queue SET lease_expires = ?, progress = COALESCE(?, progress), updated = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = ? AND cancel_requested = 0",
+                (now + lease_seconds, progress, now, job_id, worker_id, LEASED),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE queue SET status = ?, result = ?, progress = 1, lease_expires = NULL, updated = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id, worker_id, LEASED),
+            )
+
+    def fail(self, job_id: str, worker_id: str, error: str, retryable: bool = True):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE queue SET status = CASE "
+                "  WHEN cancel_requested = 1 THEN ? "
+                "  WHEN ? AND attempts < ? THEN ? ELSE ? END, "
+                "error = ?, worker_id = NULL, lease_expires = NULL, updated = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (CANCELLED, int(retryable), self.max_attempts, QUEUED, FAILED,
+                 error, time.time(), job_id, worker_id, LEASED),
+            )
+
+    def cancel(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE queue SET status = CASE WHEN status = ? THEN ? ELSE status END, "
+                "cancel_requested = 1, updated = ? WHERE job_id = ? AND status IN (?, ?)",
+                (QUEUED, CANCELLED, time.time(), job_id, QUEUED, LEASED),
+            )
+
+    def get(self, job_id: str) -> Optional[QueuedJob]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM queue WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+
+def open_queue(url: str) -> JobQueue:
+    """
+    Open a queue backend from a URL.
+
+    Supported: "sqlite:///path/to/queue.db" (or a bare path to a .db file)
+    """
+    if url.startswith("sqlite:///"):
+        return SQLiteJobQueue(url[len("sqlite:///"):])
+    if url.endswith(".db"):
+        return SQLiteJobQueue(url)
+    raise ValueError(f"Unsupported job queue URL: {url}")
+
+
+def wait_for_job(
+    queue: JobQueue,
+    job_id: str,
+    poll_interval: float = 1.0,
+    cancel_token: Optional[CancelToken] = None,
+    on_progress: Optional[Callable[[QueuedJob], None]] = None,
+) -> QueuedJob:
+    """
+    Block until a queued job finishes.
+
+    Cancelling the token cancels the job on the queue (the worker holding it
+    stops at its next heartbeat).
+
+    Returns:
+        QueuedJob: The job in its final state
+    """
+    while True:
+        job = queue.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        if job.finished:
+            return job
+        if cancel_token is not None and cancel_token.cancelled:
+            queue.cancel(job_id)
+            raise ProcessCancelled("Job was cancelled")
+        if on_progress is not None:
+            on_progress(job)
+        time.sleep(poll_interval)
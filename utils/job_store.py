@@ -0,0 +1,200 @@
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Job states in the store
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobStore:
+    """
+    Durable SQLite table of jobs: inputs, settings, current stage, per-stage
+    timings and artifacts, and the final result.
+
+    Jobs still marked running when the service starts were interrupted by a
+    crash or restart and can be resumed from their manifest checkpoints.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    inputs TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    result TEXT,
+                    error TEXT,
+                    runs INTEGER NOT NULL DEFAULT 0,
+                    artifacts TEXT,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stages (
+                    job_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    started REAL,
+                    finished REAL,
+                    duration REAL,
+                    outputs TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, stage)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            # Stores created before the artifacts column existed
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "artifacts" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN artifacts TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def start_job(self, job_id: str, kind: str, inputs: Dict[str, Any], settings: Dict[str, Any]):
+        """
+        Record a job (or a new run of an existing one, e.g. a draft upgraded to
+        a final render) as running, with the settings of this run
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, kind, inputs, settings, status, runs, created, started) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (job_id) DO UPDATE SET status = excluded.status, runs = runs + 1, "
+                "inputs = excluded.inputs, settings = excluded.settings, "
+                "started = excluded.started, finished = NULL, error = NULL",
+                (job_id, kind, json.dumps(inputs, ensure_ascii=False),
+                 json.dumps(settings, ensure_ascii=False), RUNNING, now, now),
+            )
+
+    def record_stage(self, job_id: str, stage: str, record: Dict[str, Any]):
+        """Mirror a manifest stage record (status, attempts, timings, outputs)"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO stages "
+                "(job_id, stage, status, attempts, started, finished, duration, outputs, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, stage, record.get("status"), record.get("attempts", 0),
+                 record.get("started"), record.get("finished"), record.get("duration"),
+                 json.dumps(record.get("outputs", {}), ensure_ascii=False), record.get("error")),
+            )
+            conn.execute("UPDATE jobs SET stage = ? WHERE job_id = ?", (stage, job_id))
+
+    def finish_job(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE job_id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id),
+            )
+
+    def attach_artifacts(self, job_id: str, artifacts: Dict[str, Any]):
+        """Merge extra files (profiles, reports) into a job's artifacts"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT artifacts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is not None:
+                merged = json.loads(row["artifacts"] or "{}")
+                merged.update(artifacts)
+                conn.execute("UPDATE jobs SET artifacts = ? WHERE job_id = ?",
+                             (json.dumps(merged, ensure_ascii=False), job_id))
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for key in ("inputs", "settings", "result", "artifacts"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job with its per-stage records"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            stages = conn.execute(
+                "SELECT * FROM stages WHERE job_id = ? ORDER BY started", (job_id,)
+            ).fetchall()
+        job = self._to_dict(row)
+        job["stages"] = [dict(s, outputs=json.loads(s["outputs"] or "{}")) for s in stages]
+        return job
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Jobs that were running when the process stopped, oldest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created", (RUNNING,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def history(self, limit: int = 50, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent jobs first"""
+        query, params = "SELECT * FROM jobs", []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def stats(self, since: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Throughput and latency over jobs created since `since` (default: all).
+
+        Returns:
+            dict: Job counts per status, completed jobs per hour, end-to-end
+                  latency percentiles of completed jobs and mean stage durations
+        """
+        since = since or 0.0
+        with self._connect() as conn:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE created >= ? GROUP BY status", (since,)
+            ).fetchall())
+            done = conn.execute(
+                "SELECT created, finished FROM jobs WHERE status = ? AND created >= ?", (DONE, since)
+            ).fetchall()
+            stage_rows = conn.execute(
+                "SELECT s.stage, AVG(s.duration), COUNT(*) FROM stages s JOIN jobs j USING (job_id) "
+                "WHERE s.status = ? AND j.created >= ? GROUP BY s.stage", (DONE, since)
+            ).fetchall()
+
+        latencies = np.array([finished - created for created, finished in done]) if done else np.array([])
+        stats: Dict[str, Any] = {"jobs": sum(counts.values()), "by_status": counts}
+        if len(latencies):
+            window = max(row[1] for row in done) - min(row[0] for row in done)
+            stats["jobs_per_hour"] = len(latencies) / max(window / 3600.0, 1e-9)
+            stats["latency"] = {
+                "mean": float(latencies.mean()),
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "max": float(latencies.max()),
+            }
+        stats["stage_mean_seconds"] = {stage: mean for stage, mean, _ in stage_rows}
+        return stats
@@ -0,0 +1,64 @@
+import re
+from typing import List
+
+# Same sentence boundary rule as F5TTSService.generate_audio
+_SENTENCE_RE = re.compile(r'(?<=[.!?]) +')
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+
+# Rough Mongolian speaking rate used to estimate scene durations before synthesis
+WORDS_PER_SECOND = 2.3
+
+
+def estimate_duration(text: str, words_per_second: float = WORDS_PER_SECOND) -> float:
+    """Estimated spoken duration of a text in seconds"""
+    return len(text.split()) / words_per_second
+
+
+def segment_script(
+    text: str,
+    target_seconds: float = 30.0,
+    words_per_second: float = WORDS_PER_SECOND
+) -> List[str]:
+    """
+    Split a long script into scenes at paragraph or sentence boundaries.
+
+    Sentences are packed greedily until a scene would exceed `target_seconds`
+    (estimated from the word count). A paragraph break closes the current
+    scene once it is at least half the target. A single sentence longer than
+    the target becomes its own scene; sentences are never split.
+
+    Args:
+        text: Full script
+        target_seconds: Target scene duration
+        words_per_second: Speaking rate used for the estimate
+
+    Returns:
+        List[str]: Scene texts in order
+    """
+    scenes: List[str] = []
+    current: List[str] = []
+    current_seconds = 0.0
+
+    def flush():
+        nonlocal current, current_seconds
+        if current:
+            scenes.append(" ".join(current))
+        current, current_seconds = [], 0.0
+
+    for paragraph in _PARAGRAPH_RE.split(text.strip()):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if current_seconds >= target_seconds / 2:
+            flush()
+        for sentence in _SENTENCE_RE.split(paragraph):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            seconds = estimate_duration(sentence, words_per_second)
+            if current and current_seconds + seconds > target_seconds:
+                flush()
+            current.append(sentence)
+            current_seconds += seconds
+    flush()
+    return scenes
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from fractions import Fraction
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """Typed metadata record for an audio or video file"""
+    path: str
+    duration: float
+    width: int = 0
+    height: int = 0
+    fps: Optional[Fraction] = None
+    frame_count: int = 0
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+
+    @property
+    def has_video(self) -> bool:
+        return self.video_codec is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+
+def parse_frame_rate(value) -> Optional[Fraction]:
+    """
+    Parse an ffprobe style frame rate ("30000/1001", "25", 29.97) into a Fraction.
+    Returns None for unknown rates such as "0/0".
+    """
+    if value is None:
+        return None
+    try:
+        if isinstance(value, str) and "/" in value:
+            num, den = value.split("/", 1)
+            if int(den) == 0:
+                return None
+            rate = Fraction(int(num), int(den))
+        else:
+            rate = Fraction(value).limit_denominator(1001)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+
+# Cache keyed by (path, mtime, size) or ("sha1", digest)
+_CACHE_SIZE = 256
+_cache: "OrderedDict[tuple, MediaInfo]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _file_key(path: str) -> tuple:
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def _content_key(path: str) -> tuple:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return ("sha1", digest.hexdigest())
+
+
+def probe_media(path: str, by_content: bool = False) -> MediaInfo:
+    """
+    Probe a media file, reusing cached results.
+
+    Args:
+        path: Path to an audio or video file
+        by_content: Key the cache on a content hash instead of path + mtime + size,
+            so identical uploads under different temp names share one probe
+
+    Returns:
+        MediaInfo: Typed metadata record
+    """
+    path = str(Path(path).absolute())
+    key = _content_key(path) if by_content else _file_key(path)
+
+    with _cache_lock:
+        info = _cache.get(key)
+        if info is not None:
+            _cache.move_to_end(key)
+            return info
+
+    info = None
+    errors = []
+    for backend in (_probe_pyav, _probe_soundfile, _probe_ffprobe):
+        try:
+            info = backend(path)
+            break
+        except Exception as e:
+            errors.append(f"{backend.__name__}: {e}")
+    if info is None:
+        raise ValueError(f"Could not probe media file {path}: {'; '.join(errors)}")
+
+    with _cache_lock:
+        _cache[key] = info
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return info
+
+
+def clear_media_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _probe_pyav(path: str) -> MediaInfo:
+    """In-process probe through PyAV (optional dependency)"""
+    import av
+
+    with av.open(path) as container:
+        video = next((s for s in container.streams if s.type == "video"), None)
+        audio = next((s for s in container.streams if s.type == "audio"), None)
+
+        duration = 0.0
+        if container.duration is not None:
+            duration = container.duration / av.time_base
+        elif video is not None and video.duration is not None:
+            duration = float(video.duration * video.time_base)
+
+        fps = None
+        frame_count = 0
+        width = height = 0
+        if video is not None:
+            fps = parse_frame_rate(video.average_rate or video.guessed_rate)
+            frame_count = int(video.frames or 0)
+            if not frame_count and fps:
+                frame_count = int(round(duration * fps))
+            width = video.codec_context.width
+            height = video.codec_context.height
+
+        return MediaInfo(
+            path=path,
+            duration=duration,
+            width=width,
+            height=height,
+            fps=fps,
+            frame_count=frame_count,
+            video_codec=video.codec_context.name if video is not None else None,
+            audio_codec=audio.codec_context.name if audio is not None else None,
+            sample_rate=audio.codec_context.sample_rate if audio is not None else None,
+            channels=audio.codec_context.channels if audio is not None else None,
+        )
+
+
+def _probe_soundfile(path: str) -> MediaInfo:
+    """In-process probe for plain audio files (wav, flac, ogg)"""
+    import soundfile as sf
+
+    sf_info = sf.info(path)
+    return MediaInfo(
+        path=path,
+        duration=float(sf_info.duration),
+        audio_codec=sf_info.subtype.lower() if sf_info.subtype else sf_info.format.lower(),
+        sample_rate=int(sf_info.samplerate),
+        channels=int(sf_info.channels),
+    )
+
+
+def _probe_ffprobe(path: str) -> MediaInfo:
+    """Fallback: one ffprobe call through ffmpeg-python"""
+    import ffmpeg
+
+    probe = ffmpeg.probe(path)
+    video = next((s for s in probe["streams"] if s.get("codec_type") == "video"), None)
+    audio = next((s for s in probe["streams"] if s.get("codec_type") == "audio"), None)
+
+    duration = float(probe.get("format", {}).get("duration") or 0.0)
+    fps = None
+    frame_count = 0
+    width = height = 0
+    if video is not None:
+        fps = parse_frame_rate(video.get("avg_frame_rate")) or parse_frame_rate(video.get("r_frame_rate"))
+        frame_count = int(video.get("nb_frames") or 0)
+        if not duration:
+            duration = float(video.get("duration") or 0.0)
+        if not frame_count and fps:
+            frame_count = int(round(duration * fps))
+        width = int(video.get("width") or 0)
+        height = int(video.get("height") or 0)
+
+    return MediaInfo(
+        path=path,
+        duration=duration,
+        width=width,
+        height=height,
+        fps=fps,
+        frame_count=frame_count,
+        video_codec=video.get("codec_name") if video is not None else None,
+        audio_codec=audio.get("codec_name") if audio is not None else None,
+        sample_rate=int(audio["sample_rate"]) if audio is not None and audio.get("sample_rate") else None,
+        channels=int(audio["channels"]) if audio is not None and audio.get("channels") else None,
+    )
@@ -0,0 +1,211 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+try:
+    import psutil
+except ImportError:  # /proc fallback (Linux only)
+    psutil = None
+
+# "1": per-stage RSS accounting; "alloc": also tracemalloc snapshot diffs between jobs
+MEMORY_PROFILE = os.environ.get("ABICO_MEMORY_PROFILE", "0")
+
+# Growth left behind by a stage that counts as not returning to baseline
+LEAK_THRESHOLD_MB = float(os.environ.get("ABICO_MEMORY_LEAK_MB", 64))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+# Child processes started by the stage being profiled in this context
+_stage_children: contextvars.ContextVar[Optional[Set[int]]] = contextvars.ContextVar(
+    "stage_children", default=None
+)
+
+
+def memory_profiling_enabled() -> bool:
+    return MEMORY_PROFILE not in ("", "0")
+
+
+def register_child(pid: int):
+    """Attribute a child process (started by the process runner) to the stage being profiled"""
+    children = _stage_children.get()
+    if children is not None:
+        children.add(pid)
+
+
+def _proc_rss(pid) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def process_rss() -> int:
+    """Resident set size of this process in bytes"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return _proc_rss("self")
+
+
+def children_rss(roots: Iterable[int]) -> int:
+    """
+    Summed resident set size of the given child processes and their
+    descendants (e.g. the Python behind a wrapper script) in bytes
+    """
+    roots = set(roots)
+    if not roots:
+        return 0
+    if psutil is not None:
+        total = 0
+        for pid in roots:
+            try:
+                process = psutil.Process(pid)
+                processes = [process] + process.children(recursive=True)
+            except psutil.Error:
+                continue
+            for child in processes:
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    continue
+        return total
+
+    # Walk /proc for the roots and their descendants
+    parents = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid is the 2nd field after it
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    processes, frontier = set(), {pid for pid in roots if pid in parents}
+    while frontier:
+        processes |= frontier
+        frontier = {pid for pid, ppid in parents.items() if ppid in frontier} - processes
+    return sum(_proc_rss(pid) for pid in processes)
+
+
+def _mb(value: int) -> float:
+    return round(value / (1024 * 1024), 1)
+
+
+class _PeakSampler:
+    """Background thread tracking peak RSS of this process and of a stage's children"""
+
+    def __init__(self, interval: float, children: Set[int]):
+        self.interval = interval
+        self.children = children
+        self.peak_rss = process_rss()
+        self.peak_children = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, process_rss())
+            self.peak_children = max(self.peak_children, children_rss(list(self.children)))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, process_rss())
+
+
+# Allocation snapshot at the end of the previous job, for job-to-job diffs
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+class JobMemoryProfile:
+    """
+    Opt-in memory accounting for one job (ABICO_MEMORY_PROFILE=1 or "alloc").
+
+    Used as a JobManifest observer: for every stage that runs it records RSS
+    before and after, the peak RSS during the stage and the peak memory of
+    the child processes the stage started through the process runner (not
+    long-lived engine workers or other jobs' children), and flags stages that leave more than
+    ABICO_MEMORY_LEAK_MB behind. With "alloc", tracemalloc snapshots taken at
+    the end of each job are diffed against the previous job's.
+
+    RSS is per process, so stages of jobs running in parallel are attributed
+    each other's memory; profile with one job at a time for exact numbers.
+    """
+
+    def __init__(self, job_id: str, interval: float = 0.1):
+        self.job_id = job_id
+        self.interval = interval
+        self.trace_allocations = MEMORY_PROFILE == "alloc"
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        self.baseline_rss = process_rss()
+        self.stages: Dict[str, dict] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        before = process_rss()
+        children: Set[int] = set()
+        token = _stage_children.set(children)
+        try:
+            with _PeakSampler(self.interval, children) as sampler:
+                yield
+        finally:
+            _stage_children.reset(token)
+        after = process_rss()
+        growth = after - before
+        self.stages[name] = {
+            "rss_before_mb": _mb(before),
+            "rss_after_mb": _mb(after),
+            "peak_rss_mb": _mb(sampler.peak_rss),
+            "peak_children_mb": _mb(sampler.peak_children),
+            "retained_mb": _mb(growth),
+            "returned_to_baseline": growth < LEAK_THRESHOLD_MB * 1024 * 1024,
+        }
+        if not self.stages[name]["returned_to_baseline"]:
+            print(f"Memory: stage '{name}' of job {self.job_id} retained {_mb(growth)} MB")
+
+    def _allocation_diff(self, limit: int = 10) -> List[str]:
+        global _last_snapshot
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        with _snapshot_lock:
+            previous, _last_snapshot = _last_snapshot, snapshot
+        if previous is None:
+            return []
+        return [str(stat) for stat in snapshot.compare_to(previous, "lineno")[:limit] if stat.size_diff > 0]
+
+    def finish(self, output_dir: Optional[Path] = None) -> dict:
+        """Summarize the job and optionally write memory.json to `output_dir`"""
+        report = {
+            "job_id": self.job_id,
+            "baseline_rss_mb": _mb(self.baseline_rss),
+            "final_rss_mb": _mb(process_rss()),
+            "stages": self.stages,
+            "leaky_stages": [name for name, s in self.stages.items() if not s["returned_to_baseline"]],
+        }
+        if self.trace_allocations:
+            report["allocation_growth_since_last_job"] = self._allocation_diff()
+
+        peak = max([s["peak_rss_mb"] for s in self.stages.values()] or [report["final_rss_mb"]])
+        print(f"Memory: job {self.job_id} baseline {report['baseline_rss_mb']} MB, "
+              f"peak {peak} MB, final {report['final_rss_mb']} MB")
+
+        if output_dir is not None:
+            with open(Path(output_dir) / "memory.json", "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        return report
@@ -0,0 +1,210 @@
+import asyncio
+import codecs
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, List, Optional, Sequence, Tuple
+
+from utils.memory_profile import register_child
+from utils.profiling import profiled_command
+
+# tqdm-style "45/100" counters (not parts of paths or dates)
+_PROGRESS_RE = re.compile(r"(?<![\w/.:-])(\d+)\s*/\s*(\d+)(?![\w/.:-])")
+_LINE_SPLIT_RE = re.compile(r"[\r\n]")
+
+
+class ProcessCancelled(Exception):
+    """The process was killed because the job was cancelled or abandoned"""
+
+
+class ProcessTimeout(Exception):
+    """The process exceeded its stage deadline and was killed"""
+
+
+class CancelToken:
+    """Thread-safe cancellation flag shared between a request and its stages"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise ProcessCancelled("Job was cancelled")
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    duration: float
+    stdout_tail: List[str] = field(default_factory=list)
+    stderr_tail: List[str] = field(default_factory=list)
+
+    @property
+    def stdout(self) -> str:
+        return "\n".join(self.stdout_tail)
+
+    @property
+    def stderr(self) -> str:
+        return "\n".join(self.stderr_tail)
+
+
+def parse_progress(line: str) -> Optional[Tuple[int, int]]:
+    """Extract a (done, total) counter such as tqdm's "45/100" from a log line"""
+    match = None
+    for match in _PROGRESS_RE.finditer(line):
+        pass
+    if match is None:
+        return None
+    done, total = int(match.group(1)), int(match.group(2))
+    if total <= 0 or done > total:
+        return None
+    return done, total
+
+
+async def run_process_async(
+    cmd: Sequence[str],
+    cwd: Optional[str] = None,
+    env: Optional[dict] = None,
+    timeout: Optional[float] = None,
+    cancel_token: Optional[CancelToken] = None,
+    on_line: Optional[Callable[[str, str], None]] = None,
+    on_progress: Optional[Callable[[int, int, str], None]] = None,
+    tail_lines: int = 200,
+) -> ProcessResult:
+    """
+    Run a command, streaming stdout/stderr line by line.
+
+    Args:
+        cmd: Command and arguments
+        cwd: Working directory
+        env: Environment for the child
+        timeout: Stage deadline in seconds; the process group is killed when exceeded
+        cancel_token: Kills the process group as soon as it is cancelled
+        on_line: Called with (stream_name, line) for every non-empty line
+        on_progress: Called with (done, total, line) for lines carrying a counter
+        tail_lines: Number of trailing lines kept per stream for error reports
+
+    Returns:
+        ProcessResult: Return code, duration and the tail of each stream
+    """
+    start = time.perf_counter()
+    tails = {"stdout": deque(maxlen=tail_lines), "stderr": deque(maxlen=tail_lines)}
+
+    # Runs under py-spy when the calling stage is being profiled
+    cmd = profiled_command(cmd)
+
+    # Own process group/session so the whole tree can be killed at once
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        **kwargs,
+    )
+    # Counted towards the calling stage's child memory when it is profiled
+    register_child(proc.pid)
+
+    async def pump(stream, name: str, tail: Deque[str]):
+        # Split on \r as well as \n so tqdm progress bars arrive as they update;
+        # the incremental decoder keeps a character split across two reads intact
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = ""
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                buffer += decoder.decode(b"", final=True)
+                break
+            buffer += decoder.decode(chunk)
+            *lines, buffer = _LINE_SPLIT_RE.split(buffer)
+            for line in lines:
+                _handle_line(line, name, tail)
+        if buffer:
+            _handle_line(buffer, name, tail)
+
+    def _handle_line(line: str, name: str, tail: Deque[str]):
+        line = line.rstrip()
+        if not line:
+            return
+        tail.append(line)
+        if on_line is not None:
+            on_line(name, line)
+        if on_progress is not None:
+            progress = parse_progress(line)
+            if progress is not None:
+                on_progress(progress[0], progress[1], line)
+
+    async def watch_cancel():
+        while not (cancel_token is not None and cancel_token.cancelled):
+            await asyncio.sleep(0.1)
+
+    pumps = asyncio.gather(
+        pump(proc.stdout, "stdout", tails["stdout"]),
+        pump(proc.stderr, "stderr", tails["stderr"]),
+        proc.wait(),
+    )
+    watcher = asyncio.ensure_future(watch_cancel())
+    try:
+        done, _ = await asyncio.wait({pumps, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if pumps not in done:
+            await _kill_process_group(proc)
+            pumps.cancel()
+            if watcher in done:
+                raise ProcessCancelled(f"Cancelled: {cmd[0]}")
+            raise ProcessTimeout(f"{cmd[0]} exceeded its {timeout:g}s deadline")
+        pumps.result()
+    except asyncio.CancelledError:
+        # The awaiting task itself was abandoned: do not leave the child running
+        await _kill_process_group(proc)
+        raise
+    finally:
+        watcher.cancel()
+
+    return ProcessResult(
+        returncode=proc.returncode,
+        duration=time.perf_counter() - start,
+        stdout_tail=list(tails["stdout"]),
+        stderr_tail=list(tails["stderr"]),
+    )
+
+
+async def _kill_process_group(proc, grace: float = 5.0):
+    """Terminate the child's process group, escalating to SIGKILL after a grace period"""
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "nt":
+            # taskkill /T takes the whole tree down
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=grace)
+            except asyncio.TimeoutError:
+                os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    await proc.wait()
+
+
+def run_process(cmd: Sequence[str], **kwargs) -> ProcessResult:
+    """Blocking wrapper around run_process_async for worker threads"""
+    return asyncio.run(run_process_async(cmd, **kwargs))
@@ -0,0 +1,190 @@
+import contextvars
+import html
+import os
+import shutil
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+# Profile every job (otherwise only jobs that ask for it)
+PROFILE_ALL = os.environ.get("ABICO_PROFILE", "0") == "1"
+
+# Stage profiles directory of the stage running in this context (for child processes)
+_subprocess_profile_dir: contextvars.ContextVar[Optional[Path]] = contextvars.ContextVar(
+    "subprocess_profile_dir", default=None
+)
+
+
+def profiling_enabled(requested: bool = False) -> bool:
+    return requested or PROFILE_ALL
+
+
+def profiled_command(cmd: Sequence[str]) -> List[str]:
+    """
+    Wrap a child process in py-spy when the calling stage is being profiled.
+
+    py-spy samples the child (and its own children, e.g. the Python behind a
+    wrapper script) and writes a flame graph next to the stage profile. The
+    command is returned unchanged when profiling is off or py-spy is missing.
+    """
+    profile_dir = _subprocess_profile_dir.get()
+    if profile_dir is None or shutil.which("py-spy") is None:
+        return list(cmd)
+    output = profile_dir / f"child_{Path(cmd[0]).stem}_{int(time.time() * 1000)}.svg"
+    return ["py-spy", "record", "--subprocesses", "--format", "flamegraph",
+            "--output", str(output), "--"] + list(cmd)
+
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler for one thread: a background thread
+    samples the target thread's Python stack every `interval` seconds and
+    counts collapsed ("folded") stacks.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+def write_folded(samples: Counter, path: Path):
+    """Collapsed stacks, one "frame;frame;frame count" per line (flamegraph.pl / speedscope input)"""
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def render_flamegraph(samples: Counter, path: Path, title: str = "", width: int = 1200):
+    """Render collapsed stacks as a static SVG flame graph (root at the bottom)"""
+    # Merge stacks into a tree of {name: [count, children]}
+    root = [0, {}]
+    for stack, count in samples.items():
+        root[0] += count
+        node = root
+        for name in stack.split(";"):
+            node = node[1].setdefault(name, [0, {}])
+            node[0] += count
+
+    def depth(node) -> int:
+        return 1 + max([depth(child) for child in node[1].values()] or [0])
+
+    row_height, top = 16, 24
+    height = top + depth(root) * row_height + 4
+    total = max(root[0], 1)
+    rects = []
+
+    def layout(node, x: float, level: int):
+        for name, child in sorted(node[1].items()):
+            w = child[0] / total * width
+            if w >= 0.5:
+                y = height - (level + 1) * row_height
+                # Warm colours, varied by name so neighbours are distinguishable
+                hue = 10 + zlib.crc32(name.encode()) % 40
+                label = html.escape(name if len(name) * 7 < w else name[: max(int(w / 7) - 2, 0)] + "..")
+                rects.append(
+                    f'<g><title>{html.escape(name)} ({child[0]} samples, {child[0] / total:.1%})</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" '
+                    f'fill="hsl({hue},90%,60%)"/>'
+                    + (f'<text x="{x + 3:.1f}" y="{y + 12}">{label}</text>' if w > 21 else "")
+                    + '</g>'
+                )
+                layout(child, x, level + 1)
+            x += w
+
+    layout(root, 0.0, 0)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'font-family="monospace" font-size="11">'
+            f'<text x="4" y="16" font-size="13">{html.escape(title)} ({root[0]} samples)</text>'
+            + "".join(rects) + "</svg>"
+        )
+
+
+@contextmanager
+def _torch_op_profile(output_path: Path):
+    """Op-level table from torch.profiler, if torch is already loaded in this process"""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        yield
+        return
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    with torch.profiler.profile(activities=activities, record_shapes=True) as prof:
+        yield
+    table = prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=50)
+    if table.strip():
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(table)
+
+
+class JobProfiler:
+    """
+    Per-job profiler, attached to a JobManifest as a stage observer.
+
+    Each stage that runs gets a sampled flame graph (stage.svg plus the
+    collapsed stacks in stage.folded), a py-spy flame graph for every child
+    process it starts (when py-spy is installed) and, when torch runs in
+    process, an op table. Files go to <job_dir>/profile/.
+    """
+
+    def __init__(self, job_id: str, output_dir: Path, interval: float = 0.005):
+        self.job_id = job_id
+        self.output_dir = Path(output_dir).absolute()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self.artifacts: Dict[str, List[str]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        stage_dir = self.output_dir / name
+        stage_dir.mkdir(parents=True, exist_ok=True)
+        profiler = SamplingProfiler(interval=self.interval).start()
+        token = _subprocess_profile_dir.set(stage_dir)
+        started = time.perf_counter()
+        try:
+            with _torch_op_profile(stage_dir / "ops.txt"):
+                yield
+        finally:
+            _subprocess_profile_dir.reset(token)
+            samples = profiler.stop()
+            elapsed = time.perf_counter() - started
+            write_folded(samples, stage_dir / "stage.folded")
+            render_flamegraph(samples, stage_dir / "stage.svg",
+                              title=f"{self.job_id} / {name} ({elapsed:.1f}s)")
+            self.artifacts[name] = sorted(str(p) for p in stage_dir.iterdir())
+
+    def finish(self) -> Dict[str, List[str]]:
+        """Profile files per stage"""
+        print(f"Profile of job {self.job_id} written to {self.output_dir}")
+        return self.artifacts
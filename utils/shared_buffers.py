@@ -0,0 +1,131 @@
+import contextvars
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+def _shared_root() -> Path:
+    # tmpfs-backed when available, so the arrays never touch a disk
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    return base / "abico"
+
+
+@dataclass(frozen=True)
+class BufferRef:
+    """Small, picklable handle on a shared array; this is all that crosses process boundaries"""
+    path: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    def open(self, writable: bool = False) -> np.ndarray:
+        """Map the array into this process without copying"""
+        return np.load(self.path, mmap_mode="r+" if writable else "r")
+
+
+class JobBuffers:
+    """
+    Per-job arena of memory-mapped arrays in shared memory (/dev/shm).
+
+    Any process that knows the job id (or the arena root) can map the same
+    arrays, so waveforms, mel windows and frame batches move between
+    processes as BufferRefs instead of files or pickles. The arena and
+    everything in it is removed when the job's owner closes it.
+    """
+
+    def __init__(self, job_id: str, root: Path = None):
+        self.job_id = job_id
+        self.root = Path(root) if root is not None else _shared_root() / job_id
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def attach(cls, root: str) -> "JobBuffers":
+        """Open an arena created by another process"""
+        return cls(Path(root).name, root=Path(root))
+
+    def allocate(self, name: str, shape: Tuple[int, ...], dtype="float32") -> Tuple[np.ndarray, BufferRef]:
+        """Create a writable shared array (e.g. to decode or infer straight into it)"""
+        path = self.root / f"{name}.npy"
+        array = np.lib.format.open_memmap(str(path), mode="w+", dtype=np.dtype(dtype), shape=tuple(shape))
+        return array, BufferRef(str(path), tuple(shape), np.dtype(dtype).str)
+
+    def get(self, name: str) -> Optional[np.ndarray]:
+        """Map an array already in the arena (read-only), or None if there is none by that name"""
+        path = self.root / f"{name}.npy"
+        if not path.exists():
+            return None
+        return np.load(str(path), mmap_mode="r")
+
+    def put(self, name: str, array: np.ndarray) -> BufferRef:
+        """Copy an array into the arena once and return its handle"""
+        array = np.asarray(array)
+        shared, ref = self.allocate(name, array.shape, array.dtype)
+        shared[...] = array
+        shared.flush()
+        return ref
+
+    def close(self):
+        """Remove the arena; mappings already open stay valid until they are dropped"""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Arena of the job running in the current thread/context (set by job_buffers)
+_current_buffers: contextvars.ContextVar[Optional[JobBuffers]] = contextvars.ContextVar(
+    "current_buffers", default=None
+)
+
+
+def current_buffers() -> Optional[JobBuffers]:
+    """Arena of the running job, or None outside a job (callers fall back to files)"""
+    return _current_buffers.get()
+
+
+@contextmanager
+def job_buffers(job_id: str) -> Iterator[JobBuffers]:
+    """Give the calling job a shared-memory arena for its duration, then remove it"""
+    buffers = JobBuffers(job_id)
+    token = _current_buffers.set(buffers)
+    try:
+        yield buffers
+    finally:
+        _current_buffers.reset(token)
+        buffers.close()
+
+
+def sweep_stale_arenas(running_job_ids: Iterable[str]) -> List[str]:
+    """
+    Remove arenas left behind by jobs that are no longer running.
+
+    A worker that crashes never closes its job's arena, and /dev/shm is
+    memory, so leftovers are swept at startup. Sub-job arenas
+    (`<job_id>_scene_000`, `<job_id>_shared`, ...) belong to their parent job.
+
+    Returns:
+        List[str]: Names of the removed arenas
+    """
+    root = _shared_root()
+    if not root.is_dir():
+        return []
+    running = set(running_job_ids)
+    removed = []
+    for arena in root.iterdir():
+        name = arena.name
+        if any(name == job_id or name.startswith(f"{job_id}_") for job_id in running):
+            continue
+        shutil.rmtree(arena, ignore_errors=True)
+        removed.append(name)
+    if removed:
+        print(f"Removed {len(removed)} stale shared-memory arena(s): {', '.join(removed)}")
+    return removed
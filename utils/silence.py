@@ -0,0 +1,218 @@
+import os
+from fractions import Fraction
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from utils.face_crop import Box, crop_still, feather_mask, paste_face
+from utils.frame_pipeline import FramePipeline, VideoEncoder
+from utils.still_image import avatar_loop, avatar_size, is_still_image
+from utils.startup import lazy_import
+
+cv2 = lazy_import("cv2")
+soundfile = lazy_import("soundfile")
+
+# Pass silent spans through without lip-sync (ABICO_SKIP_SILENCE=0 turns it off)
+SKIP_SILENCE = os.environ.get("ABICO_SKIP_SILENCE", "1") == "1"
+# Frames quieter than this (dB below the loudest frame) count as silence
+SILENCE_DB = float(os.environ.get("ABICO_SILENCE_DB", -40))
+# Shorter pauses are lip-synced as usual (the mouth barely closes in them)
+MIN_SILENCE_SECONDS = float(os.environ.get("ABICO_MIN_SILENCE_SECONDS", 0.4))
+# Lip-synced frames faded into the original avatar at each speech/silence boundary
+BLEND_FRAMES = 3
+
+Span = Tuple[int, int]
+
+
+def silent_frames(
+    wav: np.ndarray,
+    sample_rate: int,
+    fps: Union[float, Fraction],
+    frame_count: int,
+    threshold_db: float = SILENCE_DB,
+    min_seconds: float = MIN_SILENCE_SECONDS,
+    pad_frames: int = BLEND_FRAMES
+) -> np.ndarray:
+    """
+    Per video frame, whether its audio is part of a silent span.
+
+    Args:
+        wav: Mono waveform
+        sample_rate: Its sample rate
+        fps: Video frame rate
+        frame_count: Number of video frames (frames past the audio are silent)
+        threshold_db: RMS level, relative to the loudest frame, below which a frame is silent
+        min_seconds: Shortest silent span that is skipped
+        pad_frames: Frames at each inner end of a silent span that are still
+            lip-synced, so the mouth closes (and opens) before the seam blend
+
+    Returns:
+        np.ndarray: (frame_count,) bool mask
+    """
+    wav = np.asarray(wav, dtype=np.float32)
+    bounds = (np.arange(frame_count + 1) * sample_rate / float(fps)).astype(np.int64)
+    bounds = np.minimum(bounds, len(wav))
+    squares = np.concatenate([[0.0], np.cumsum(wav.astype(np.float64) ** 2)])
+    lengths = np.maximum(bounds[1:] - bounds[:-1], 1)
+    rms = np.sqrt((squares[bounds[1:]] - squares[bounds[:-1]]) / lengths)
+
+    peak = rms.max() if frame_count else 0.0
+    if peak <= 0:
+        return np.ones(frame_count, dtype=bool)
+    mask = 20 * np.log10(np.maximum(rms, 1e-10) / peak) < threshold_db
+
+    # Drop silent runs too short to be worth a seam, and give the rest back
+    # `pad_frames` on each side that borders speech
+    min_frames = max(1, int(round(min_seconds * float(fps))))
+    for start, end in _runs(mask):
+        if end - start < min_frames:
+            mask[start:end] = False
+            continue
+        if start > 0:
+            mask[start:min(start + pad_frames, end)] = False
+        if end < frame_count:
+            mask[max(end - pad_frames, start):end] = False
+    return mask
+
+
+def _runs(mask: np.ndarray) -> List[Span]:
+    """[start, end) ranges of consecutive True values"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def speech_spans(mask: np.ndarray) -> List[Span]:
+    """[start, end) frame ranges that need lip-sync"""
+    return [(int(a), int(b)) for a, b in _runs(~mask)]
+
+
+def cut_audio(
+    wav: np.ndarray,
+    sample_rate: int,
+    fps: Union[float, Fraction],
+    spans: List[Span],
+    audio_output: str
+) -> str:
+    """Write the audio under the speech spans back to back"""
+    pieces = [
+        wav[int(start * sample_rate / float(fps)):int(end * sample_rate / float(fps))]
+        for start, end in spans
+    ]
+    soundfile.write(str(audio_output), np.concatenate(pieces), sample_rate, subtype="PCM_16")
+    return str(Path(audio_output).absolute())
+
+
+def cut_speech(
+    video_path: str,
+    spans: List[Span],
+    video_output: str,
+    fps: Union[float, Fraction],
+    start_frame: int = 0,
+    box: Optional[Box] = None
+) -> str:
+    """
+    Write the speech spans of the avatar loop (from loop phase `start_frame`)
+    back to back as one clip, so the lip-sync model runs once on speech frames
+    only; with `box` only that face crop is written. A still image is not
+    turned into a video: it is returned as is (or cropped).
+    """
+    if is_still_image(video_path):
+        if box is None:
+            return str(Path(video_path).absolute())
+        return crop_still(video_path, box, video_output)
+
+    wanted = np.zeros(spans[-1][1], dtype=bool)
+    for start, end in spans:
+        wanted[start:end] = True
+
+    if box is not None:
+        x1, y1, x2, y2 = box
+        size = (x2 - x1, y2 - y1)
+    else:
+        size = avatar_size(video_path)
+    out = VideoEncoder(video_output, fps, size, intermediate=True)
+    try:
+        for index, frame in enumerate(avatar_loop(video_path, len(wanted), start_frame)):
+            if wanted[index]:
+                out.write(frame if box is None else frame[y1:y2, x1:x2])
+    finally:
+        out.close()
+    return str(Path(video_output).absolute())
+
+
+def merge_speech(
+    original_path: str,
+    synced_path: Optional[str],
+    mask: np.ndarray,
+    output_path: str,
+    fps: Union[float, Fraction],
+    blend_frames: int = BLEND_FRAMES,
+    size: Optional[Tuple[int, int]] = None,
+    box: Optional[Box] = None,
+    start_frame: int = 0
+) -> str:
+    """
+    Assemble the output in one pass: silent frames are the avatar loop's
+    frames untouched, speech frames come from the lip-synced clip (in order),
+    and the last/first `blend_frames` speech frames next to a silent span
+    fade towards the original so the mouth does not jump at the seams.
+
+    The original is the avatar looped from phase `start_frame` (a still
+    image is every frame); with `box` the lip-synced clip is that face crop
+    and is pasted back with a feathered edge; with `size` (width, height)
+    every frame is scaled to it. Frames are composited in a FramePipeline's
+    infer stage while decoding and encoding run on their own threads.
+    """
+    # Distance (in frames) of every frame to the nearest silent frame
+    distance = np.full(len(mask), np.inf)
+    silent = np.flatnonzero(mask)
+    if len(silent):
+        positions = np.arange(len(mask))
+        after = np.searchsorted(silent, positions)
+        before = np.clip(after - 1, 0, len(silent) - 1)
+        after = np.clip(after, 0, len(silent) - 1)
+        distance = np.minimum(np.abs(positions - silent[before]), np.abs(silent[after] - positions))
+
+    size = tuple(size) if size is not None else avatar_size(original_path)
+    feather = feather_mask(box[3] - box[1], box[2] - box[0]) if box is not None else None
+
+    def pairs():
+        synced = cv2.VideoCapture(str(synced_path)) if synced_path else None
+        try:
+            for index, frame in enumerate(avatar_loop(original_path, len(mask), start_frame)):
+                face = None
+                if not mask[index] and synced is not None:
+                    ok, face = synced.read()
+                    # Lip-sync clips can come back a frame short; keep the original then
+                    face = face if ok else None
+                yield frame, face
+        finally:
+            if synced is not None:
+                synced.release()
+
+    def composite(batch, start_index):
+        frames = []
+        for offset, (frame, face) in enumerate(batch):
+            weight = min(1.0, distance[start_index + offset] / (blend_frames + 1))
+            if box is not None:
+                if face is not None:
+                    frame = paste_face(frame, face, box, feather * weight)
+                if (frame.shape[1], frame.shape[0]) != size:
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            else:
+                if (frame.shape[1], frame.shape[0]) != size:
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                if face is not None:
+                    if face.shape != frame.shape:
+                        face = cv2.resize(face, size, interpolation=cv2.INTER_AREA)
+                    frame = face if weight >= 1.0 else cv2.addWeighted(face, weight, frame, 1 - weight, 0)
+            frames.append(frame)
+        return frames
+
+    out = VideoEncoder(output_path, fps, size)
+    try:
+        FramePipeline().run(pairs(), write=out.write, infer=composite)
+    finally:
+        out.close()
+    return str(Path(output_path).absolute())
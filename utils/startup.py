@@ -0,0 +1,115 @@
+import importlib
+import json
+import os
+import threading
+import time
+import types
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# Default time-to-UI-ready target in seconds (override with ABICO_UI_READY_TARGET)
+DEFAULT_UI_READY_TARGET = 5.0
+
+
+class StartupProfile:
+    """
+    Records wall-clock milestones and lazy import times from process start
+    until the UI is serving.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self.imports: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name: str) -> float:
+        """Record a milestone; returns seconds since start"""
+        elapsed = time.perf_counter() - self.t0
+        with self._lock:
+            self.marks[name] = elapsed
+        return elapsed
+
+    def record_import(self, module: str, seconds: float):
+        with self._lock:
+            self.imports[module] = seconds
+
+    def ui_ready_target(self) -> float:
+        try:
+            return float(os.environ.get("ABICO_UI_READY_TARGET", DEFAULT_UI_READY_TARGET))
+        except ValueError:
+            return DEFAULT_UI_READY_TARGET
+
+    def report(self, output_path: Optional[str] = None) -> dict:
+        """Print a summary and optionally write it as JSON"""
+        with self._lock:
+            marks = dict(self.marks)
+            imports = dict(self.imports)
+
+        target = self.ui_ready_target()
+        ui_ready = marks.get("ui_ready")
+        summary = {
+            "marks": marks,
+            "lazy_imports": dict(sorted(imports.items(), key=lambda x: -x[1])),
+            "ui_ready_target": target,
+            "ui_ready_met": ui_ready is not None and ui_ready <= target,
+        }
+
+        print("\nStartup profile:")
+        for name, elapsed in sorted(marks.items(), key=lambda x: x[1]):
+            print(f"  {name:<24} {elapsed:7.2f}s")
+        for module, seconds in summary["lazy_imports"].items():
+            print(f"  import {module:<17} {seconds:7.2f}s")
+        if ui_ready is not None:
+            status = "OK" if summary["ui_ready_met"] else "MISSED"
+            print(f"Time to UI ready: {ui_ready:.2f}s (target {target:.2f}s) {status}")
+
+        if output_path:
+            Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        return summary
+
+
+startup_profile = StartupProfile()
+
+
+class _LazyModule(types.ModuleType):
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_name = name
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+
+    def _load(self):
+        if self._lazy_module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._lazy_name)
+                    startup_profile.record_import(self._lazy_name, time.perf_counter() - start)
+                    self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Return a proxy for a heavy module that is only imported when first used.
+    The import time is recorded in the startup profile.
+    """
+    return _LazyModule(name)
+
+
+def run_in_background(fn: Callable, name: str) -> threading.Thread:
+    """Run a self-check (or any callable) on a daemon thread"""
+    thread = threading.Thread(target=fn, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,127 @@
+from fractions import Fraction
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from utils.frame_pipeline import VideoEncoder, get_avatar_source
+from utils.job_manifest import FatalStageError
+from utils.media_info import probe_media
+from utils.startup import lazy_import
+
+cv2 = lazy_import("cv2")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# Frame rate of videos made from a still image (Wav2Lip's default for static input)
+STILL_FPS = Fraction(25)
+
+
+def is_still_image(path: str) -> bool:
+    return Path(str(path)).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def avatar_fps(path: str) -> Fraction:
+    """Frame rate an avatar is rendered at: the video's own, or STILL_FPS for images"""
+    if is_still_image(path):
+        return STILL_FPS
+    fps = probe_media(path).fps
+    if not fps:
+        raise ValueError(f"Could not determine frame rate of: {path}")
+    return fps
+
+
+def avatar_size(path: str) -> Tuple[int, int]:
+    """(width, height) of an avatar video or image"""
+    if is_still_image(path):
+        return StillFrameSource(path).size
+    return probe_media(path).resolution
+
+
+class StillFrameSource:
+    """
+    Virtual frame stream of a still-image avatar.
+
+    The image is decoded once and the same array is yielded for every frame,
+    so no looped video has to be written, decoded or face-detected frame by frame.
+    """
+
+    def __init__(self, image_path: str):
+        self.image_path = str(Path(image_path).absolute())
+        self.frame = cv2.imread(self.image_path)
+        if self.frame is None:
+            raise ValueError(f"Could not read image file: {self.image_path}")
+
+    def __len__(self) -> int:
+        return 1
+
+    @property
+    def fps(self) -> float:
+        return float(STILL_FPS)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        h, w = self.frame.shape[:2]
+        return w, h
+
+    def looped(self, count: int, start: int = 0) -> Iterator:
+        """Yield the image `count` times (every loop phase is the same frame)"""
+        for _ in range(count):
+            yield self.frame
+
+    def detect_face(self):
+        """
+        Detect the face once for the whole stream.
+
+        Returns the (x1, y1, x2, y2) box, or None when dlib is not installed
+        (Wav2Lip then detects it itself, also once for a static input).
+        Raises FatalStageError when the image has no face.
+        """
+        try:
+            from utils.face_tracker import create_tracker
+            tracker = create_tracker()
+        except ImportError:
+            return None
+        box = tracker.track([self.frame])[0].box
+        if box is None:
+            raise FatalStageError(f"No face detected in avatar image: {self.image_path}")
+        return box
+
+
+def avatar_frames(path: str, count: Optional[int] = None) -> Iterator:
+    """Frames of an avatar: decoded from a video, or the still image repeated `count` times"""
+    if is_still_image(path):
+        yield from StillFrameSource(path).looped(count or 0)
+        return
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {path}")
+    try:
+        index = 0
+        while count is None or index < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def avatar_loop(path: str, count: int, start: int = 0) -> Iterator:
+    """
+    `count` frames of the avatar's ping-pong loop from loop phase `start`,
+    decoded as they are consumed (a still image is decoded once and repeated)
+    """
+    source = StillFrameSource(path) if is_still_image(path) else get_avatar_source(path)
+    return source.looped(count, start=start)
+
+
+def write_still_video(image_path: str, frame_count: int, output_path: str) -> str:
+    """Encode `frame_count` frames of a still image (for outputs that must be a video)"""
+    source = StillFrameSource(image_path)
+    out = VideoEncoder(str(output_path), source.fps, source.size)
+    try:
+        for frame in source.looped(frame_count):
+            out.write(frame)
+    finally:
+        out.close()
+    return str(Path(output_path).absolute())
@@ -1,10 +1,18 @@
-import cv2
-import numpy as np
 from pathlib import Path
-from typing import Optional
-import librosa
+from typing import List, Optional
+from utils.frame_pipeline import FramePipeline, VideoEncoder, get_avatar_source
+from utils.media_info import probe_media
+from utils.still_image import StillFrameSource, avatar_fps, is_still_image
+from utils.startup import lazy_import
 
-def preprocess_video_for_audio(video_path: str, audio_path: str, output_path: Optional[str] = None) -> str:
+ffmpeg = lazy_import("ffmpeg")
+
+def preprocess_video_for_audio(
+    video_path: str,
+    audio_path: str,
+    output_path: Optional[str] = None,
+    start_frame: Optional[int] = None
+) -> str:
     """
     Preprocess video to match audio length by creating a smooth loop
     
@@ -12,13 +20,15 @@ def preprocess_video_for_audio(video_path: str, audio_path: str, output_path: Op
         video_path: Path to input video
         audio_path: Path to audio file (to get duration)
         output_path: Optional path for output video. If None, creates one in temp directory
+        start_frame: Optional loop phase to start from (continues the loop of a previous
+            scene); the output then has exactly the frames the audio needs
     
     Returns:
         str: Path to processed video
     """
     try:
         # Get audio duration
-        audio_duration = librosa.get_duration(path=audio_path)
+        audio_duration = probe_media(audio_path).duration
         
         # Convert paths to absolute paths
         video_path = str(Path(video_path).absolute())
@@ -28,61 +38,107 @@ def preprocess_video_for_audio(video_path: str, audio_path: str, output_path: Op
             output_path = str(Path(video_path).parent / f"preprocessed_{Path(video_path).stem}.mp4")
         output_path = str(Path(output_path).absolute())
         
-        # Open the video
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError(f"Could not open video file: {video_path}")
-        
-        # Get video properties
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        # Avatar frames, decoded as the loop needs them; a still image is
+        # decoded once and repeated
+        if is_still_image(video_path):
+            source = StillFrameSource(video_path)
+        else:
+            source = get_avatar_source(video_path)
         
         # Calculate required number of frames for audio duration
-        required_frames = int(audio_duration * fps)
+        required_frames = int(audio_duration * avatar_fps(video_path))
         
-        # Read all frames
-        frames = []
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frames.append(frame)
+        # Write the entire video at least once, then keep ping-pong looping
+        # (first and last frame skipped on the way back to avoid stuttering)
+        if start_frame is None:
+            start_frame, total_frames = 0, max(required_frames, len(source))
+        else:
+            total_frames = required_frames
         
-        # Set up video writer
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(str(output_path), fourcc, fps, (frame_width, frame_height))
+        # Stream the looped frames to the encoder; only a couple of batches are
+        # ever in flight, however long the audio is (lossless: it is lip-sync input)
+        out = VideoEncoder(output_path, source.fps, source.size, intermediate=True)
+        try:
+            stats = FramePipeline().run(source.looped(total_frames, start=start_frame), write=out.write)
+        finally:
+            out.close()
+        current_frames = stats["frames"]
         
-        # First, write the entire video
-        current_frames = 0
-        for frame in frames:
-            out.write(frame)
-            current_frames += 1
+        print(f"Successfully preprocessed video: {output_path}")
+        print(f"Original frames: {len(source)}, Required frames: {required_frames}, Generated frames: {current_frames}")
+        return str(output_path)
         
-        # If we need more frames, add reversed sequences
-        while current_frames < required_frames:
-            # Skip first and last frame in reverse to avoid stuttering
-            for frame in reversed(frames[1:-1]):
-                if current_frames >= required_frames:
-                    break
-                out.write(frame)
-                current_frames += 1
-            
-            # If we still need more frames, go forward again
-            if current_frames < required_frames:
-                for frame in frames:
-                    if current_frames >= required_frames:
-                        break
-                    out.write(frame)
-                    current_frames += 1
+    except Exception as e:
+        print(f"Error in video preprocessing: {str(e)}")
+        raise
+
+def mux_audio(video_path: str, audio_path: str, output_path: str) -> str:
+    """
+    Replace the audio track of a video without re-encoding the video stream
+    
+    Args:
+        video_path: Video whose picture is kept (stream copy)
+        audio_path: Audio to put on it (encoded to AAC)
+        output_path: Path for the muxed video
+    
+    Returns:
+        str: Path to the muxed video
+    """
+    try:
+        video = ffmpeg.input(str(video_path))
+        audio = ffmpeg.input(str(audio_path))
+        (
+            ffmpeg
+            .output(video.video, audio.audio, str(output_path), vcodec='copy', acodec='aac',
+                    audio_bitrate='192k', shortest=None)
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        return str(output_path)
         
-        cap.release()
-        out.release()
+    except Exception as e:
+        print(f"Error muxing audio: {str(e)}")
+        raise
+
+
+def required_frame_count(video_path: str, audio_path: str) -> int:
+    """Number of frames of the avatar loop that cover the audio"""
+    return int(probe_media(audio_path).duration * avatar_fps(video_path))
+
+
+def concat_videos(video_paths: List[str], output_path: str) -> str:
+    """
+    Join videos with the concat demuxer and stream copy (no re-encode).
+    
+    The inputs must share codecs and encoding parameters (e.g. scenes rendered by
+    the same pipeline); every input starts on a keyframe, so seams are frame-accurate.
+    
+    Args:
+        video_paths: Videos in playback order
+        output_path: Path for the joined video
+    
+    Returns:
+        str: Path to the joined video
+    """
+    list_file = Path(output_path).with_suffix(".concat.txt")
+    try:
+        with open(list_file, "w", encoding="utf-8") as f:
+            for path in video_paths:
+                # Single quotes inside paths are escaped for the concat demuxer
+                escaped = str(Path(path).absolute()).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
         
-        print(f"Successfully preprocessed video: {output_path}")
-        print(f"Original frames: {len(frames)}, Required frames: {required_frames}, Generated frames: {current_frames}")
+        (
+            ffmpeg
+            .input(str(list_file), format='concat', safe=0)
+            .output(str(output_path), c='copy')
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
         return str(output_path)
         
     except Exception as e:
-        print(f"Error in video preprocessing: {str(e)}")
-        raise
\ No newline at end of file
+        print(f"Error concatenating videos: {str(e)}")
+        raise
+    finally:
+        list_file.unlink(missing_ok=True)
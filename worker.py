@@ -0,0 +1,143 @@
+import argparse
+import os
+import platform
+import threading
+import time
+import uuid
+from functools import partial
+from typing import Optional
+
+from app import TalkingAvatarService
+from services.engines import LIPSYNC_ENGINES, TTS_ENGINES
+from utils.job_manifest import is_retryable
+from utils.job_queue import JobQueue, QueuedJob, open_queue
+from utils.process_runner import CancelToken
+
+
+class RenderWorker:
+    """
+    Stateless render worker: pulls jobs from the queue and runs them on a
+    local TalkingAvatarService whose artifacts live in the shared directory.
+
+    The lease is renewed by a heartbeat thread while the job runs. If the
+    worker dies, the lease expires and the job is delivered to another worker,
+    which resumes from the stage checkpoints in the shared job manifest.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        service: TalkingAvatarService,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = 60.0,
+        poll_interval: float = 2.0
+    ):
+        self.queue = queue
+        self.service = service
+        self.worker_id = worker_id or f"{platform.node()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def run_forever(self, stop_event: Optional[threading.Event] = None):
+        print(f"Worker {self.worker_id} polling for jobs")
+        while stop_event is None or not stop_event.is_set():
+            if not self.run_one():
+                time.sleep(self.poll_interval)
+
+    def run_one(self) -> bool:
+        """Lease and run one job; False if the queue was empty"""
+        job = self.queue.lease(self.worker_id, self.lease_seconds)
+        if job is None:
+            return False
+
+        print(f"\nWorker {self.worker_id}: job {job.job_id} (attempt {job.attempts})")
+        token = CancelToken()
+        progress = {"value": 0.0}
+        stop_heartbeat = threading.Event()
+
+        def heartbeat():
+            # Renew the lease well before it expires; stop the job if the lease
+            # was lost or the job was cancelled on the queue
+            while not stop_heartbeat.wait(self.lease_seconds / 3):
+                if not self.queue.heartbeat(job.job_id, self.worker_id, self.lease_seconds, progress["value"]):
+                    print(f"Job {job.job_id}: lease lost or cancelled, stopping")
+                    token.cancel()
+                    return
+
+        def on_progress(value, desc=None):
+            progress["value"] = float(value)
+
+        heartbeat_thread = threading.Thread(target=heartbeat, name="heartbeat", daemon=True)
+        heartbeat_thread.start()
+        try:
+            video = self._render(job, on_progress, token)
+            self.queue.complete(job.job_id, self.worker_id, {"video_path": video})
+            print(f"Job {job.job_id} done: {video}")
+        except Exception as e:
+            print(f"Job {job.job_id} failed: {str(e)}")
+            self.queue.fail(job.job_id, self.worker_id, str(e), retryable=is_retryable(e))
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+        return True
+
+    def _render(self, job: QueuedJob, on_progress, token: CancelToken) -> str:
+        payload = job.payload
+        if payload.get("long_form"):
+            # The playlist lands in the shared artifact directory, where the submitter finds it
+            generate = partial(
+                self.service.generate_long_form,
+                progressive=payload.get("progressive", False),
+                on_segment=lambda path, published: print(f"Job {job.job_id}: {published} scenes playable at {path}")
+            )
+        else:
+            generate = self.service.generate_talking_avatar
+        # The queue id doubles as the job id (unless an earlier job is being
+        # re-rendered), so a re-delivered job reuses its checkpoints
+        return generate(
+            text=payload["text"],
+            avatar_image=payload["avatar_path"],
+            progress_callback=on_progress,
+            cancel_token=token,
+            job_id=payload.get("job_id") or job.job_id,
+            profile=payload.get("profile", False),
+            speed=payload.get("speed", 1.0),
+            retime=payload.get("retime", False),
+            draft=payload.get("draft", False),
+            quality=payload.get("quality"),
+            resolution=payload.get("resolution")
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run an Abico render worker')
+    parser.add_argument('--queue', default=os.environ.get('ABICO_QUEUE', 'sqlite:///temp/queue.db'),
+                        help='Job queue URL, e.g. sqlite:///shared/queue.db')
+    parser.add_argument('--artifacts', default=os.environ.get('ABICO_ARTIFACTS', 'temp/shared'),
+                        help='Shared artifact directory (same path on every node)')
+    parser.add_argument('--worker-id', default=None, help='Worker name (default: host-pid-random)')
+    parser.add_argument('--lease-seconds', type=float, default=60.0,
+                        help='Lease length; a job is re-delivered if its worker misses heartbeats this long')
+    parser.add_argument('--stand-in', action='store_true',
+                        default=os.environ.get('ABICO_STAND_IN', '0') == '1',
+                        help='Use model-free stand-in backends (for load tests)')
+    parser.add_argument('--tts-engine', choices=TTS_ENGINES, default=None,
+                        help='TTS engine (default: ABICO_TTS_ENGINE or subprocess)')
+    parser.add_argument('--lipsync-engine', choices=LIPSYNC_ENGINES, default=None,
+                        help='Lip-sync engine (default: ABICO_LIPSYNC_ENGINE or subprocess)')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between polls of an empty queue')
+    args = parser.parse_args()
+
+    worker = RenderWorker(
+        queue=open_queue(args.queue),
+        service=TalkingAvatarService(
+            artifact_dir=args.artifacts,
+            stand_in=args.stand_in,
+            tts_engine=args.tts_engine,
+            lipsync_engine=args.lipsync_engine
+        ),
+        worker_id=args.worker_id,
+        lease_seconds=args.lease_seconds,
+        poll_interval=args.poll_interval
+    )
+    worker.run_forever()